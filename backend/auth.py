@@ -10,6 +10,14 @@ Centralne miejsce do zarządzania:
 """
 
 import os
+import sys
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from jose import jwt, JWTError #PyJWT
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
@@ -17,6 +25,11 @@ from typing import Optional, Dict, Any
 from functools import wraps
 from fastapi import HTTPException, Header
 
+from utils.logger import get_logger
+from utils.metrics import AUTH_TOKENS_REJECTED
+
+logger = get_logger("auth")
+
 
 # ============================================
 # KONFIGURACJA
@@ -37,6 +50,43 @@ MIN_PASSWORD_LENGTH = 6
 # Konfiguracja passlib dla bcrypt
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Koszt bcrypt (log2 liczby rund) ustawiony ręcznie - pusty oznacza kalibrację
+# (gdy BCRYPT_CALIBRATE=1) lub koszt domyślny BCRYPT_DEFAULT_ROUNDS
+BCRYPT_ROUNDS = os.environ.get("BCRYPT_ROUNDS", "")
+
+# Czy przy starcie aplikacji dobrać koszt bcrypt do sprzętu (kalibracja trwa kilka sekund)
+BCRYPT_CALIBRATE = os.environ.get("BCRYPT_CALIBRATE", "0") == "1"
+
+# Docelowy czas weryfikacji hasła (w milisekundach) przy kalibracji
+BCRYPT_TARGET_MS = float(os.environ.get("BCRYPT_TARGET_MS", "250"))
+
+# Zakres kosztu dopuszczalny przy kalibracji (poniżej 10 hasła są zbyt łatwe do złamania)
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 15
+BCRYPT_DEFAULT_ROUNDS = 12
+
+# Liczba wątków wykonujących bcrypt (hashowanie i weryfikacja haseł)
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Ile żądań logowania/rejestracji może być obsługiwanych jednocześnie
+AUTH_MAX_CONCURRENT = int(os.environ.get("AUTH_MAX_CONCURRENT", str(PASSWORD_HASH_WORKERS * 2)))
+
+# Ile żądań logowania/rejestracji może czekać na wolne miejsce (nadmiarowe dostają 503)
+AUTH_MAX_QUEUE = int(os.environ.get("AUTH_MAX_QUEUE", "32"))
+
+# Maksymalny czas oczekiwania w kolejce (w sekundach) zanim żądanie dostanie 503
+AUTH_QUEUE_TIMEOUT = float(os.environ.get("AUTH_QUEUE_TIMEOUT", "3"))
+
+# Wartość nagłówka Retry-After (w sekundach) przy odrzuceniu żądania
+AUTH_RETRY_AFTER = int(os.environ.get("AUTH_RETRY_AFTER", "2"))
+
+# Maksymalna liczba zweryfikowanych tokenów w pamięci podręcznej (0 = wyłączona)
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "10000"))
+
+# Maksymalny czas (w sekundach) przechowywania tokenu w pamięci podręcznej,
+# niezależnie od jego daty wygaśnięcia
+TOKEN_CACHE_TTL = float(os.environ.get("TOKEN_CACHE_TTL", "300"))
+
 
 # ============================================
 # FUNKCJE HASZOWANIA HASEŁ
@@ -68,6 +118,35 @@ def hash_password(password: str) -> str:
     return hashed
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """
+    Weryfikuje hasło i w razie potrzeby zwraca nowy hash z aktualnym kosztem.
+
+    Nowy hash powstaje tylko gdy hasło jest poprawne, a koszt zapisanego
+    hasha różni się od kosztu ustawionego przez configure_bcrypt_rounds().
+
+    Args:
+        plain_password (str): Hasło w postaci plaintext
+        hashed_password (str): Zahaszowane hasło z bazy danych
+
+    Returns:
+        tuple[bool, Optional[str]]: (czy_hasło_poprawne, nowy_hash_lub_None)
+
+    Example:
+        >>> valid, new_hash = verify_and_update_password("moje_haslo123", stary_hash)
+        >>> if valid and new_hash:
+        ...     zapisz_hash(new_hash)
+    """
+    if not plain_password or not hashed_password:
+        return False, None
+
+    try:
+        return pwd_context.verify_and_update(plain_password, hashed_password)
+    except Exception as e:
+        logger.warning("Błąd weryfikacji hasła: %s", e)
+        return False, None
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Weryfikuje czy podane hasło pasuje do zahaszowanego hasła.
@@ -93,10 +172,518 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         # Weryfikacja hasła używając passlib
         return pwd_context.verify(plain_password, hashed_password)
     except Exception as e:
-        print(f"Błąd weryfikacji hasła: {e}")
+        logger.warning("Błąd weryfikacji hasła: %s", e)
         return False
 
 
+# ============================================
+# PAMIĘĆ PODRĘCZNA TOKENÓW
+# ============================================
+
+class TokenCache:
+    """
+    Pamięć podręczna LRU/TTL zweryfikowanych tokenów JWT.
+
+    Kluczem jest skrót SHA-256 tokenu (sam token nie jest przechowywany),
+    wartością user_id i moment wygaśnięcia wpisu: exp tokenu lub TTL,
+    zależnie co nastąpi wcześniej. Trafienie pomija weryfikację podpisu
+    i parsowanie payloadu. Przechowywane są tylko poprawne tokeny.
+
+    Tokeny są sprawdzane w pętli zdarzeń (get_current_user w main.py wywołuje
+    get_current_user_id bezpośrednio), a bcrypt działa w osobnej puli
+    PasswordHasherPool, która z pamięci nie korzysta. Blokada chroni dostęp,
+    gdyby get_current_user_id został użyty jako synchroniczna zależność
+    FastAPI - ta wykonuje się w puli wątków.
+
+    Example:
+        cache = TokenCache(max_size=1000, ttl=300)
+        cache.put(token, 123, payload["exp"])
+        user_id = cache.get(token)
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE, ttl: float = TOKEN_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[int]:
+        """
+        Zwraca user_id dla tokenu z pamięci podręcznej.
+
+        Args:
+            token (str): Token JWT
+
+        Returns:
+            int | None: ID użytkownika lub None gdy tokenu nie ma albo wpis wygasł
+        """
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            user_id, expires_at = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return user_id
+
+    def put(self, token: str, user_id: int, exp: Optional[float]):
+        """
+        Zapamiętuje zweryfikowany token.
+
+        Args:
+            token (str): Token JWT
+            user_id (int): ID użytkownika z payloadu
+            exp (float, optional): Czas wygaśnięcia tokenu (timestamp)
+        """
+        if self.max_size <= 0:
+            return
+
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (user_id, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Usuwa wszystkie wpisy (np. po zmianie klucza SECRET_KEY)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Zwraca statystyki pamięci podręcznej.
+
+        Returns:
+            dict: Rozmiar, liczniki trafień, chybień, wyrzuceń i wygaśnięć
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+# Globalna pamięć podręczna zweryfikowanych tokenów
+token_cache = TokenCache()
+
+
+def get_token_cache_stats() -> dict:
+    """
+    Zwraca statystyki pamięci podręcznej tokenów.
+
+    Returns:
+        dict: Statystyki z TokenCache.stats()
+    """
+    return token_cache.stats()
+
+
+# ============================================
+# KALIBRACJA KOSZTU BCRYPT
+# ============================================
+
+# Koszt bcrypt używany przez pwd_context (ustawiany przez configure_bcrypt_rounds)
+bcrypt_rounds = BCRYPT_DEFAULT_ROUNDS
+
+
+def measure_bcrypt_ms(rounds: int, samples: int = 3) -> float:
+    """
+    Mierzy czas weryfikacji hasła bcrypt przy podanym koszcie.
+
+    Args:
+        rounds (int): Koszt bcrypt (log2 liczby rund)
+        samples (int, optional): Liczba pomiarów. Domyślnie 3.
+
+    Returns:
+        float: Mediana czasu weryfikacji w milisekundach
+    """
+    context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+    hashed = context.hash("kalibracja-bcrypt")
+
+    timings = []
+    for _ in range(samples):
+        started_at = time.perf_counter()
+        context.verify("kalibracja-bcrypt", hashed)
+        timings.append((time.perf_counter() - started_at) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+def calibrate_bcrypt_rounds(target_ms: float = BCRYPT_TARGET_MS, min_rounds: int = BCRYPT_MIN_ROUNDS,
+                            max_rounds: int = BCRYPT_MAX_ROUNDS) -> int:
+    """
+    Dobiera największy koszt bcrypt, którego weryfikacja mieści się w czasie docelowym.
+
+    Każda kolejna runda podwaja czas, więc pomiary zaczynają się od min_rounds
+    i kończą na pierwszym koszcie przekraczającym cel. Koszt nigdy nie spada
+    poniżej min_rounds, nawet na bardzo wolnym sprzęcie.
+
+    Args:
+        target_ms (float, optional): Docelowy czas weryfikacji w milisekundach
+        min_rounds (int, optional): Najmniejszy dopuszczalny koszt
+        max_rounds (int, optional): Największy dopuszczalny koszt
+
+    Returns:
+        int: Wybrany koszt bcrypt
+
+    Example:
+        >>> calibrate_bcrypt_rounds(target_ms=250)
+        Koszt 10: 62.1 ms
+        Koszt 11: 124.5 ms
+        Koszt 12: 249.0 ms
+        Koszt 13: 497.8 ms
+        12
+    """
+    chosen = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        elapsed = measure_bcrypt_ms(rounds)
+        logger.info("Koszt %s: %.1f ms", rounds, elapsed)
+        if elapsed > target_ms:
+            break
+        chosen = rounds
+    return chosen
+
+
+def configure_bcrypt_rounds(rounds: int):
+    """
+    Ustawia koszt bcrypt dla nowych hashy i politykę przehashowania.
+
+    Minimalny i maksymalny koszt są równe docelowemu, więc
+    pwd_context.needs_update (i verify_and_update) wskazuje każdy zapisany
+    hash o innym koszcie - zarówno słabszy, jak i zbyt kosztowny.
+
+    Args:
+        rounds (int): Koszt bcrypt (log2 liczby rund)
+    """
+    global bcrypt_rounds
+    pwd_context.update(bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds)
+    bcrypt_rounds = rounds
+    logger.info("Koszt bcrypt: %s", rounds)
+
+
+async def init_password_hashing() -> int:
+    """
+    Ustala koszt bcrypt przy starcie aplikacji.
+
+    Kolejność: BCRYPT_ROUNDS (ręcznie), kalibracja (BCRYPT_CALIBRATE=1,
+    wykonywana w puli bcrypt), koszt domyślny BCRYPT_DEFAULT_ROUNDS.
+
+    Returns:
+        int: Ustawiony koszt bcrypt
+    """
+    if BCRYPT_ROUNDS:
+        rounds = int(BCRYPT_ROUNDS)
+    elif BCRYPT_CALIBRATE:
+        rounds = await password_pool.run(calibrate_bcrypt_rounds)
+    else:
+        rounds = BCRYPT_DEFAULT_ROUNDS
+
+    configure_bcrypt_rounds(rounds)
+    return rounds
+
+
+# ============================================
+# PULA WĄTKÓW BCRYPT
+# ============================================
+
+class PasswordHasherPool:
+    """
+    Ograniczona pula wątków dla operacji bcrypt.
+
+    Jedno hashowanie lub weryfikacja hasła przy koszcie 12 trwa około 200 ms
+    czasu procesora. Wykonane bezpośrednio w handlerze async blokuje pętlę
+    zdarzeń i wszystkie inne żądania workera, dlatego operacje trafiają do
+    dedykowanej puli o stałym rozmiarze (bcrypt zwalnia GIL). Nadmiarowe
+    zadania czekają w kolejce puli - jej głębokość i czasy oczekiwania są
+    widoczne w stats().
+
+    Example:
+        pool = PasswordHasherPool(workers=2)
+        hashed = await pool.run(pwd_context.hash, "haslo123")
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS):
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed_total = 0
+        self.failed_total = 0
+        self.max_queue_depth = 0
+        self._wait_total = 0.0
+        self._run_total = 0.0
+        self.max_wait_ms = 0.0
+        self.max_run_ms = 0.0
+
+    def _execute(self, submitted_at: float, func, args: tuple):
+        started_at = time.perf_counter()
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            wait = started_at - submitted_at
+            self._wait_total += wait
+            self.max_wait_ms = max(self.max_wait_ms, wait * 1000)
+
+        failed = False
+        try:
+            return func(*args)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started_at
+            with self._lock:
+                self.running -= 1
+                self._run_total += elapsed
+                self.max_run_ms = max(self.max_run_ms, elapsed * 1000)
+                if failed:
+                    self.failed_total += 1
+                else:
+                    self.completed_total += 1
+
+    async def run(self, func, *args):
+        """
+        Wykonuje funkcję w puli i czeka na wynik bez blokowania pętli zdarzeń.
+
+        Args:
+            func: Funkcja synchroniczna (np. pwd_context.hash)
+            *args: Argumenty funkcji
+
+        Returns:
+            Wynik funkcji
+        """
+        with self._lock:
+            self.queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queued)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._execute, time.perf_counter(), func, args)
+
+    def stats(self) -> dict:
+        """
+        Zwraca statystyki puli bcrypt.
+
+        Returns:
+            dict: Rozmiar puli, głębokość kolejki, liczniki i czasy (średnie i maksymalne)
+        """
+        with self._lock:
+            started = self.completed_total + self.failed_total + self.running
+            finished = self.completed_total + self.failed_total
+            return {
+                "workers": self.workers,
+                "queue_depth": self.queued,
+                "running": self.running,
+                "max_queue_depth": self.max_queue_depth,
+                "completed_total": self.completed_total,
+                "failed_total": self.failed_total,
+                "avg_wait_ms": round(self._wait_total / started * 1000, 2) if started else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 2),
+                "avg_run_ms": round(self._run_total / finished * 1000, 2) if finished else 0.0,
+                "max_run_ms": round(self.max_run_ms, 2),
+            }
+
+
+# Globalna pula bcrypt
+password_pool = PasswordHasherPool()
+
+
+async def hash_password_async(password: str) -> str:
+    """
+    Haszuje hasło w puli bcrypt (nie blokuje pętli zdarzeń).
+
+    Args:
+        password (str): Hasło w postaci plaintext
+
+    Returns:
+        str: Zahaszowane hasło
+
+    Raises:
+        ValueError: Gdy hasło jest puste lub za krótkie
+    """
+    return await password_pool.run(hash_password, password)
+
+
+async def verify_and_update_password_async(plain_password: str,
+                                          hashed_password: str) -> tuple[bool, Optional[str]]:
+    """
+    Weryfikuje hasło i ewentualnie tworzy nowy hash w puli bcrypt.
+
+    Args:
+        plain_password (str): Hasło w postaci plaintext
+        hashed_password (str): Zahaszowane hasło z bazy danych
+
+    Returns:
+        tuple[bool, Optional[str]]: (czy_hasło_poprawne, nowy_hash_lub_None)
+    """
+    return await password_pool.run(verify_and_update_password, plain_password, hashed_password)
+
+
+def get_password_pool_stats() -> dict:
+    """
+    Zwraca statystyki puli bcrypt.
+
+    Returns:
+        dict: Statystyki z PasswordHasherPool.stats() i aktualny koszt bcrypt
+    """
+    return {**password_pool.stats(), "bcrypt_rounds": bcrypt_rounds}
+
+
+# ============================================
+# KONTROLA PRZYJMOWANIA ŻĄDAŃ AUTORYZACJI
+# ============================================
+
+class AdmissionRejectedError(Exception):
+    """Żądanie odrzucone przez AdmissionLimiter (pełna kolejka lub zbyt długie oczekiwanie)."""
+
+    def __init__(self, message: str, retry_after: int = AUTH_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """
+    Ogranicznik współbieżności z ograniczoną kolejką oczekujących.
+
+    Chroni endpointy obciążające procesor (bcrypt) przed zalewem żądań:
+    najwyżej max_concurrent żądań jest obsługiwanych naraz, najwyżej max_queue
+    czeka na wolne miejsce, a kolejne są od razu odrzucane. Oczekujące dłużej
+    niż queue_timeout również są odrzucane - klient i tak by się nie doczekał,
+    a czekając zajmowałby miejsce w kolejce. Tanie endpointy (nawyki, monety)
+    nie przechodzą przez ogranicznik i zachowują swoje opóźnienia.
+
+    Example:
+        limiter = AdmissionLimiter(max_concurrent=4, max_queue=16, queue_timeout=2)
+        async with limiter.admit():
+            ok, new_hash = await verify_and_update_password_async(password, password_hash)
+    """
+
+    def __init__(self, max_concurrent: int = AUTH_MAX_CONCURRENT, max_queue: int = AUTH_MAX_QUEUE,
+                 queue_timeout: float = AUTH_QUEUE_TIMEOUT, retry_after: int = AUTH_RETRY_AFTER):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.admitted_total = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    @asynccontextmanager
+    async def admit(self):
+        """
+        Wpuszcza żądanie lub odrzuca je, gdy system jest przeciążony.
+
+        Raises:
+            AdmissionRejectedError: Gdy kolejka jest pełna lub oczekiwanie
+                przekroczyło queue_timeout
+        """
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejectedError("Kolejka zadan autoryzacji jest pelna", self.retry_after)
+
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected_timeout += 1
+            raise AdmissionRejectedError(
+                f"Brak wolnego miejsca przez {self.queue_timeout}s", self.retry_after
+            ) from None
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        self.admitted_total += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        """
+        Zwraca statystyki ogranicznika.
+
+        Returns:
+            dict: Limity, bieżące obciążenie i liczniki przyjętych/odrzuconych żądań
+        """
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "admitted_total": self.admitted_total,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
+
+
+# Globalny ogranicznik dla logowania i rejestracji
+auth_limiter = AdmissionLimiter()
+
+
+async def auth_admission():
+    """
+    Dependency FastAPI przepuszczające żądanie przez auth_limiter.
+
+    Miejsce jest zajmowane na czas obsługi żądania.
+
+    Raises:
+        AdmissionRejectedError: Gdy system jest przeciążony (obsługiwane w main.py jako 503)
+
+    Example:
+        @app.post("/api/login", dependencies=[Depends(auth_admission)])
+        async def login(login_data: UserLogin):
+            ...
+    """
+    async with auth_limiter.admit():
+        yield
+
+
+def get_auth_admission_stats() -> dict:
+    """
+    Zwraca statystyki ogranicznika żądań autoryzacji.
+
+    Returns:
+        dict: Statystyki z AdmissionLimiter.stats()
+    """
+    return auth_limiter.stats()
+
+
 # ============================================
 # FUNKCJE TOKENÓW JWT
 # ============================================
@@ -141,7 +728,7 @@ def create_token(user_id: int, additional_data: Optional[Dict[str, Any]] = None)
     # Zakoduj token używając python-jose
     token = jwt.encode(payload, SECRET_KEY, algorithm=JWT_ALGORITHM)
 
-    print(f"Token utworzony dla user_id: {user_id}, wygasa: {expiration.strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.debug("Token utworzony dla user_id: %s, wygasa: %s", user_id, expiration.strftime("%Y-%m-%d %H:%M:%S"))
     return token
 
 
@@ -149,6 +736,9 @@ def verify_token(token: str) -> Optional[int]:
     """
     Weryfikuje token JWT i zwraca ID użytkownika.
 
+    Poprawne tokeny trafiają do pamięci podręcznej (token_cache), więc kolejne
+    żądania z tej samej sesji pomijają dekodowanie i weryfikację podpisu.
+
     Args:
         token (str): Token JWT do weryfikacji
 
@@ -162,9 +752,12 @@ def verify_token(token: str) -> Optional[int]:
         123
     """
     if not token:
-        print("Brak tokenu")
         return None
 
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
+
     try:
         # Dekoduj token używając python-jose
         payload = jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGORITHM])
@@ -173,20 +766,23 @@ def verify_token(token: str) -> Optional[int]:
         user_id = payload.get("user_id")
 
         if not user_id:
-            print("Brak user_id w tokenie")
+            AUTH_TOKENS_REJECTED.inc("missing_user_id")
+            logger.debug("Brak user_id w tokenie")
             return None
 
-        print(f"Token zweryfikowany dla user_id: {user_id}")
+        token_cache.put(token, user_id, payload.get("exp"))
         return user_id
 
     except jwt.ExpiredSignatureError:
-        print("Token wygasł")
+        AUTH_TOKENS_REJECTED.inc("expired")
+        logger.debug("Token wygasł")
         return None
     except JWTError as e:
-        print(f"Nieprawidłowy token: {e}")
+        AUTH_TOKENS_REJECTED.inc("invalid")
+        logger.debug("Nieprawidłowy token: %s", e)
         return None
     except Exception as e:
-        print(f"Błąd weryfikacji tokenu: {e}")
+        logger.warning("Błąd weryfikacji tokenu: %s", e)
         return None
 
 
@@ -213,13 +809,13 @@ def decode_token(token: str) -> Optional[Dict[str, Any]]:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGORITHM])
         return payload
     except jwt.ExpiredSignatureError:
-        print("Token wygasł")
+        logger.debug("Token wygasł")
         return None
     except JWTError as e:
-        print(f"Nieprawidłowy token: {e}")
+        logger.debug("Nieprawidłowy token: %s", e)
         return None
     except Exception as e:
-        print(f"Błąd dekodowania tokenu: {e}")
+        logger.warning("Błąd dekodowania tokenu: %s", e)
         return None
 
 
@@ -530,7 +1126,14 @@ if __name__ == "__main__":
     
     Użycie:
         python auth.py
+        python auth.py --calibrate   (dobór kosztu bcrypt dla tego sprzętu)
     """
+    if "--calibrate" in sys.argv:
+        print(f"\nKALIBRACJA BCRYPT (cel: {BCRYPT_TARGET_MS:.0f} ms)\n")
+        rounds = calibrate_bcrypt_rounds()
+        print(f"\nZalecany koszt: BCRYPT_ROUNDS={rounds}\n")
+        sys.exit(0)
+
     print("\nURUCHAMIANIE TESTÓW MODUŁU AUTH\n")
 
     # Testy haszowania haseł
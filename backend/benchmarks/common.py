@@ -0,0 +1,57 @@
+"""
+Funkcje wspólne dla testów wydajności (percentyle, metadane środowiska, pamięć).
+"""
+
+import os
+import math
+import sys
+import sqlite3
+import platform
+import subprocess
+from datetime import datetime
+from pathlib import Path
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """Percentyl metodą najbliższej rangi z posortowanej listy."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def environment_metadata() -> dict:
+    """Wersje i sprzęt, na których wykonano pomiar (do porównywania wyników)."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def own_peak_rss_mb():
+    """
+    Szczytowa pamięć rezydentna bieżącego procesu w MB (None poza systemami Unix).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux podaje ru_maxrss w KB, macOS w bajtach
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
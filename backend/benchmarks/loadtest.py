@@ -0,0 +1,474 @@
+"""
+============================================
+TEST OBCIĄŻENIOWY API HABI
+============================================
+Powtarzalny test obciążeniowy całego stosu HTTP:
+1. Tworzy tymczasową bazę wypełnioną realistycznymi danymi (benchmarks.seed)
+   - te same argumenty i ziarno dają zawsze te same dane
+2. Uruchamia aplikację pod uvicornem jako osobny proces (DATABASE_PATH
+   wskazuje tymczasową bazę)
+3. Wykonuje fazy obciążenia klientem asyncio (httpx):
+   - morning - poranny szczyt: wielu użytkowników naraz ładuje dashboard
+     i odhacza wszystkie swoje nawyki
+   - steady - stały ruch z mieszanką scenariuszy (dashboard, wykonanie
+     nawyku, statystyki, sklep) przez zadany czas
+4. Raportuje przepustowość oraz p50/p95/p99 dla każdego endpointu, średnią
+   liczbę zapytań SQL na żądanie (z /api/metrics serwera) i szczytowe
+   zużycie pamięci procesu serwera (VmHWM z /proc, tylko Linux)
+
+Tokeny są generowane bezpośrednio (auth.create_token), więc test nie mierzy
+bcrypt - proces serwera dziedziczy JWT_SECRET_KEY ze środowiska.
+
+Wymaga httpx (pip install -r requirements-dev.txt).
+
+Użycie (z katalogu backend):
+    python -m benchmarks.loadtest
+    python -m benchmarks.loadtest --users 1000 --years 2 --concurrency 50 --duration 60
+    python -m benchmarks.loadtest --mix dashboard=40,complete=40,stats=10,shop=10 --json wynik.json
+"""
+
+import os
+import sys
+import json
+import time
+import re
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from datetime import date
+from pathlib import Path
+
+import httpx
+
+from benchmarks.common import BACKEND_DIR, percentile, environment_metadata
+
+
+# Domyślna mieszanka scenariuszy fazy steady (wagi)
+DEFAULT_MIX = "dashboard=50,complete=25,stats=15,shop=10"
+
+
+# ============================================
+# ZBIERANIE WYNIKÓW
+# ============================================
+
+class Recorder:
+    """Czasy odpowiedzi i statusy zebrane w jednej fazie, per endpoint."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies = {}
+        self.statuses = {}
+        self.started = None
+        self.finished = None
+
+    def record(self, endpoint: str, seconds: float, status):
+        self.latencies.setdefault(endpoint, []).append(seconds)
+        counts = self.statuses.setdefault(endpoint, {})
+        counts[status] = counts.get(status, 0) + 1
+
+    def summary(self) -> dict:
+        """
+        Zwraca podsumowanie fazy.
+
+        Błędy (errors) to odpowiedzi 5xx i błędy połączenia; odpowiedzi 4xx
+        (client_errors) są w scenariuszach oczekiwane - np. ponowne wykonanie
+        nawyku tego samego dnia lub zakup bez wystarczającej liczby monet.
+        """
+        duration = (self.finished or time.perf_counter()) - (self.started or 0)
+        endpoints = {}
+        total = 0
+        for endpoint, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            statuses = self.statuses[endpoint]
+            errors = sum(count for status, count in statuses.items()
+                         if not isinstance(status, int) or status >= 500)
+            client_errors = sum(count for status, count in statuses.items()
+                                if isinstance(status, int) and 400 <= status < 500)
+            total += len(latencies)
+            endpoints[endpoint] = {
+                "count": len(latencies),
+                "errors": errors,
+                "client_errors": client_errors,
+                "rps": round(len(latencies) / duration, 2) if duration else 0.0,
+                "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+                "max_ms": round(latencies[-1] * 1000, 3),
+            }
+        return {
+            "duration_s": round(duration, 3),
+            "requests": total,
+            "throughput_rps": round(total / duration, 2) if duration else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+# ============================================
+# SCENARIUSZE
+# ============================================
+
+class VirtualUser:
+    """
+    Kontekst jednego wirtualnego użytkownika: klient HTTP, token, nawyki,
+    własny generator losowy (powtarzalny dla danego ziarna) i rejestrator.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, user_id: int, token: str,
+                 habit_ids: list, clothing_ids: list, rng: random.Random):
+        self.client = client
+        self.recorder = recorder
+        self.user_id = user_id
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.habit_ids = habit_ids
+        self.clothing_ids = clothing_ids
+        self.rng = rng
+
+    async def request(self, endpoint: str, method: str, url: str):
+        """Wykonuje żądanie i zapisuje jego czas pod nazwą endpointu (szablonem trasy)."""
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        self.recorder.record(endpoint, time.perf_counter() - started, status)
+
+
+async def scenario_dashboard(user: VirtualUser):
+    """Otwarcie aplikacji: profil, lista nawyków i ubrania (równolegle, jak frontend)."""
+    await asyncio.gather(
+        user.request("GET /api/profile", "GET", "/api/profile"),
+        user.request("GET /api/habits", "GET", "/api/habits"),
+        user.request("GET /api/clothing/owned", "GET", "/api/clothing/owned"),
+    )
+
+
+async def scenario_complete(user: VirtualUser):
+    """Odhaczenie losowego nawyku (kolejne odhaczenie tego samego dnia zwraca 400)."""
+    habit_id = user.rng.choice(user.habit_ids)
+    await user.request("POST /api/habits/{habit_id}/complete", "POST", f"/api/habits/{habit_id}/complete")
+
+
+async def scenario_stats(user: VirtualUser):
+    """Widok statystyk: podsumowanie wszystkich nawyków i kalendarz jednego z nich."""
+    today = date.today()
+    habit_id = user.rng.choice(user.habit_ids)
+    await user.request("GET /api/habits/statistics", "GET", "/api/habits/statistics")
+    await user.request(
+        "GET /api/habits/{habit_id}/calendar", "GET",
+        f"/api/habits/{habit_id}/calendar?year={today.year}&month={today.month}"
+    )
+
+
+async def scenario_shop(user: VirtualUser):
+    """Sklep: katalog ubrań i próba zakupu losowego ubrania."""
+    clothing_id = user.rng.choice(user.clothing_ids)
+    await user.request("GET /api/clothing", "GET", "/api/clothing")
+    await user.request("POST /api/clothing/purchase/{clothing_id}", "POST", f"/api/clothing/purchase/{clothing_id}")
+
+
+SCENARIOS = {
+    "dashboard": scenario_dashboard,
+    "complete": scenario_complete,
+    "stats": scenario_stats,
+    "shop": scenario_shop,
+}
+
+
+def parse_mix(spec: str) -> dict:
+    """Zamienia "dashboard=50,complete=25" na słownik scenariusz -> waga."""
+    mix = {}
+    for item in spec.split(","):
+        name, weight = item.split("=", 1)
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Nieznany scenariusz: {name} (dostepne: {', '.join(SCENARIOS)})")
+        mix[name] = float(weight)
+    return mix
+
+
+# ============================================
+# FAZY OBCIĄŻENIA
+# ============================================
+
+async def run_morning_phase(make_user, user_ids: list) -> Recorder:
+    """
+    Poranny szczyt: wszyscy wybrani użytkownicy startują jednocześnie,
+    ładują dashboard i odhaczają kolejno wszystkie swoje nawyki.
+    """
+    recorder = Recorder("morning")
+
+    async def morning(user_id: int):
+        user = make_user(user_id, recorder)
+        await scenario_dashboard(user)
+        for habit_id in user.habit_ids:
+            await user.request("POST /api/habits/{habit_id}/complete", "POST", f"/api/habits/{habit_id}/complete")
+
+    recorder.started = time.perf_counter()
+    await asyncio.gather(*(morning(user_id) for user_id in user_ids))
+    recorder.finished = time.perf_counter()
+    return recorder
+
+
+async def run_steady_phase(make_user, user_ids: list, mix: dict, concurrency: int,
+                           duration: float, think_ms: float, seed: int) -> Recorder:
+    """
+    Stały ruch: `concurrency` pętli, każda losuje użytkownika i scenariusz
+    (wg wag mieszanki) aż do upływu `duration` sekund.
+    """
+    recorder = Recorder("steady")
+    names = list(mix)
+    weights = [mix[name] for name in names]
+
+    async def loop(number: int):
+        rng = random.Random(seed * 1000 + number)
+        while time.perf_counter() < deadline:
+            user = make_user(rng.choice(user_ids), recorder, rng)
+            await SCENARIOS[rng.choices(names, weights)[0]](user)
+            if think_ms:
+                await asyncio.sleep(think_ms / 1000)
+
+    recorder.started = time.perf_counter()
+    deadline = recorder.started + duration
+    await asyncio.gather(*(loop(number) for number in range(concurrency)))
+    recorder.finished = time.perf_counter()
+    return recorder
+
+
+# ============================================
+# SERWER
+# ============================================
+
+def free_port() -> int:
+    """Zwraca wolny port TCP na localhost."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(db_path: str, port: int, workers: int) -> subprocess.Popen:
+    """Uruchamia aplikację pod uvicornem na tymczasowej bazie."""
+    env = dict(os.environ, DATABASE_PATH=db_path, LOG_LEVEL=os.environ.get("LOG_LEVEL", "WARNING"))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env
+    )
+
+
+async def wait_for_server(base_url: str, server: subprocess.Popen, timeout: float = 30.0):
+    """Czeka, aż /api/health odpowie (lub zgłasza błąd, gdy proces serwera się zakończył)."""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"Serwer zakonczyl dzialanie (kod {server.returncode})")
+            try:
+                if (await client.get("/api/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Serwer nie odpowiedzial w ciagu {timeout:.0f} s")
+
+
+# ============================================
+# POMIARY PO STRONIE SERWERA
+# ============================================
+
+QUERIES_PER_REQUEST_RE = re.compile(
+    r'^habi_db_queries_per_request_(sum|count)\{route="([^"]*)"\} (\S+)$', re.MULTILINE
+)
+
+
+async def fetch_queries_per_request(client: httpx.AsyncClient) -> dict:
+    """
+    Średnia liczba zapytań SQL na żądanie dla każdej trasy, z histogramu
+    habi_db_queries_per_request w /api/metrics (obie fazy łącznie).
+
+    Przy kilku workerach odpowiada jeden z nich - średnia jest wtedy próbką.
+    """
+    totals = {}
+    for kind, route, value in QUERIES_PER_REQUEST_RE.findall((await client.get("/api/metrics")).text):
+        totals.setdefault(route, {})[kind] = float(value)
+    return {
+        route: round(values["sum"] / values["count"], 3)
+        for route, values in sorted(totals.items())
+        if values.get("count")
+    }
+
+
+def process_peak_rss_mb(pid: int):
+    """
+    Szczytowa pamięć rezydentna (VmHWM) procesu i jego potomków (workery
+    uvicorna) w MB. Zwraca None, gdy /proc nie jest dostępny.
+    """
+    total_kb = 0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total_kb += int(line.split()[1])
+            children = Path(f"/proc/{current}/task/{current}/children")
+            if children.exists():
+                pending.extend(int(child) for child in children.read_text().split())
+    except (OSError, ValueError):
+        return None
+    return round(total_kb / 1024, 1)
+
+
+def queries_per_endpoint(phases: dict, queries: dict) -> dict:
+    """Przypisuje średnią liczbę zapytań trasy każdemu endpointowi ("GET /api/habits")."""
+    endpoints = {endpoint for summary in phases.values() for endpoint in summary["endpoints"]}
+    return {
+        endpoint: queries[endpoint.split(" ", 1)[1]]
+        for endpoint in sorted(endpoints)
+        if endpoint.split(" ", 1)[1] in queries
+    }
+
+
+# ============================================
+# RAPORT
+# ============================================
+
+def print_report(phases: dict, server: dict):
+    """Wypisuje tabelę wyników każdej fazy i pomiary serwera."""
+    for name, summary in phases.items():
+        print(f"\nFaza {name}: {summary['requests']} zadan w {summary['duration_s']:.1f} s "
+              f"({summary['throughput_rps']:.1f} zadan/s)")
+        print(f"{'endpoint':<44} {'liczba':>7} {'bledy':>6} {'4xx':>6} {'zad/s':>8} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for endpoint, stats in summary["endpoints"].items():
+            print(f"{endpoint:<44} {stats['count']:>7} {stats['errors']:>6} {stats['client_errors']:>6} "
+                  f"{stats['rps']:>8.1f} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} "
+                  f"{stats['p99_ms']:>8.2f} {stats['max_ms']:>8.2f}")
+
+    print(f"\n{'endpoint':<44} {'zapytania SQL / zadanie':>24}")
+    for endpoint, queries in server["queries_per_request"].items():
+        print(f"{endpoint:<44} {queries:>24.2f}")
+    if server["peak_rss_mb"] is not None:
+        print(f"\nSzczytowa pamiec serwera: {server['peak_rss_mb']:.1f} MB")
+
+
+# ============================================
+# URUCHOMIENIE
+# ============================================
+
+async def run(args, db_path: str, habits_by_user: dict) -> tuple:
+    """
+    Uruchamia serwer na przygotowanej bazie i wykonuje fazy.
+
+    Returns:
+        tuple: (podsumowania faz, pomiary serwera)
+    """
+    from auth import create_token
+
+    mix = parse_mix(args.mix)
+    tokens = {user_id: create_token(user_id) for user_id in habits_by_user}
+    user_ids = sorted(habits_by_user)
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(db_path, port, args.workers)
+    try:
+        await wait_for_server(base_url, server)
+
+        limits = httpx.Limits(max_connections=max(args.concurrency, args.morning_users),
+                              max_keepalive_connections=max(args.concurrency, args.morning_users))
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+            clothing_ids = [item["id"] for item in (await client.get("/api/clothing")).json()]
+
+            def make_user(user_id: int, recorder: Recorder, rng: random.Random = None) -> VirtualUser:
+                return VirtualUser(client, recorder, user_id, tokens[user_id], habits_by_user[user_id],
+                                   clothing_ids, rng or random.Random(args.seed + user_id))
+
+            phases = {}
+            if args.morning_users:
+                print(f"Faza morning: {args.morning_users} uzytkownikow jednoczesnie")
+                morning_ids = random.Random(args.seed).sample(user_ids, min(args.morning_users, len(user_ids)))
+                phases["morning"] = (await run_morning_phase(make_user, morning_ids)).summary()
+
+            print(f"Faza steady: {args.concurrency} rownoleglych klientow przez {args.duration:.0f} s")
+            steady = await run_steady_phase(make_user, user_ids, mix, args.concurrency,
+                                            args.duration, args.think_ms, args.seed)
+            phases["steady"] = steady.summary()
+
+            server_stats = {
+                "queries_per_request": queries_per_endpoint(phases, await fetch_queries_per_request(client)),
+                "peak_rss_mb": process_peak_rss_mb(server.pid),
+            }
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    return phases, server_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test obciazeniowy API Habi na tymczasowej bazie")
+    parser.add_argument("--users", type=int, default=200, help="liczba uzytkownikow w bazie")
+    parser.add_argument("--habits", type=float, default=5, help="srednia liczba nawykow na uzytkownika")
+    parser.add_argument("--years", type=float, default=1.0, help="dlugosc historii wykonan (lata)")
+    parser.add_argument("--seed", type=int, default=42, help="ziarno danych i scenariuszy")
+    parser.add_argument("--morning-users", type=int, default=100,
+                        help="uzytkownicy porannego szczytu (0 - bez tej fazy)")
+    parser.add_argument("--concurrency", type=int, default=20, help="rownolegli klienci fazy steady")
+    parser.add_argument("--duration", type=float, default=30.0, help="czas fazy steady (s)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="wagi scenariuszy fazy steady")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="przerwa miedzy scenariuszami (ms)")
+    parser.add_argument("--workers", type=int, default=1, help="liczba workerow uvicorna")
+    parser.add_argument("--timeout", type=float, default=30.0, help="limit czasu zadania (s)")
+    parser.add_argument("--keep-db", action="store_true", help="nie usuwaj tymczasowej bazy")
+    parser.add_argument("--json", help="zapisz wyniki do pliku JSON")
+    args = parser.parse_args()
+    parse_mix(args.mix)
+
+    from benchmarks.seed import seed_database
+
+    workdir = tempfile.mkdtemp(prefix="habi-loadtest-")
+    db_path = os.path.join(workdir, "loadtest.db")
+    try:
+        print(f"Przygotowanie bazy: {args.users} uzytkownikow, srednio {args.habits} nawykow, {args.years} lat historii")
+        seeded = seed_database(db_path, users=args.users, habits_per_user=args.habits,
+                               years=args.years, seed=args.seed)
+        # Scenariusze wybierają aktywne nawyki - pomijamy użytkowników, którzy ich nie mają
+        habits_by_user = {user_id: habit_ids for user_id, habit_ids in seeded.pop("habits_by_user").items()
+                          if habit_ids}
+        print(f"Baza gotowa: {seeded}")
+
+        phases, server_stats = asyncio.run(run(args, db_path, habits_by_user))
+    finally:
+        if args.keep_db:
+            print(f"Baza zachowana: {db_path}")
+        else:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+            os.rmdir(workdir)
+
+    results = {
+        "environment": environment_metadata(),
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "dataset": seeded,
+        "phases": phases,
+        "server": server_stats,
+    }
+    print_report(phases, server_stats)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWyniki zapisane: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
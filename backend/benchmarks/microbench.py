@@ -0,0 +1,223 @@
+"""
+============================================
+MIKROBENCHMARKI WARSTWY DANYCH
+============================================
+Mierzy pojedyncze funkcje i zapytania z database.py na bazach różnej
+wielkości, aby było widać, jak każde z nich skaluje się z liczbą danych:
+- get_user_habits_with_completions - lista nawyków (GET /api/habits)
+- check_habit_completed_today - sprawdzenie wykonania
+- update_habit_statistics - aktualizacja statystyk po wykonaniu (UPSERT)
+- get_user_habit_statistics - statystyki nawyków użytkownika
+- habit_calendar - zapytanie kalendarza miesiąca (HABIT_CALENDAR_SQL)
+
+Bazy są generowane przez benchmarks.seed i zachowywane w --data-dir, więc
+kolejne uruchomienia (np. przed i po zmianie zapytania) mierzą te same dane.
+Odczyty idą przez pulę połączeń tak jak w aplikacji; zapis statystyk jest
+wykonywany w SAVEPOINT wycofywanym po każdym pomiarze - baza się nie zmienia.
+
+Wynik to JSON z metadanymi środowiska, percentylami czasu (w mikrosekundach)
+dla każdej funkcji i wielkości bazy oraz szczytową pamięcią procesu.
+
+Użycie (z katalogu backend):
+    python -m benchmarks.microbench
+    python -m benchmarks.microbench --sizes 1000,100000 --iterations 500 --json micro.json
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+from datetime import date
+
+from benchmarks.common import percentile, environment_metadata, own_peak_rss_mb
+
+
+# Domyślne wielkości baz (liczba wykonań nawyków)
+DEFAULT_SIZES = "1000,100000,10000000"
+
+
+# ============================================
+# DANE
+# ============================================
+
+def dataset_path(data_dir: str, size: int, seed: int) -> str:
+    """
+    Zwraca ścieżkę bazy o zadanej liczbie wykonań, generując ją przy pierwszym użyciu.
+
+    Małe bazy mają roczną historię (kilku użytkowników), większe - trzyletnią.
+    """
+    from benchmarks.seed import seed_database
+
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"completions-{size}-seed{seed}.db")
+    if not os.path.exists(path):
+        print(f"Generowanie bazy {path}...")
+        seed_database(path, users=size, years=3.0 if size >= 100_000 else 1.0,
+                      seed=seed, max_completions=size, progress=size >= 1_000_000)
+    return path
+
+
+def dataset_rows(db_path: str) -> dict:
+    """Liczby wierszy głównych tabel i rozmiar pliku bazy."""
+    import sqlite3
+
+    db = sqlite3.connect(db_path)
+    try:
+        rows = {
+            table: db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("users", "habits", "habit_completions", "habit_statistics")
+        }
+    finally:
+        db.close()
+    rows["file_mb"] = round(os.path.getsize(db_path) / 1024 / 1024, 1)
+    return rows
+
+
+# ============================================
+# POMIAR
+# ============================================
+
+def summarize(samples_ns: list) -> dict:
+    """Percentyle i średnia czasu wywołania (w mikrosekundach)."""
+    samples = sorted(sample / 1000 for sample in samples_ns)
+    mean = statistics.fmean(samples)
+    return {
+        "iterations": len(samples),
+        "min_us": round(samples[0], 2),
+        "mean_us": round(mean, 2),
+        "p50_us": round(percentile(samples, 50), 2),
+        "p95_us": round(percentile(samples, 95), 2),
+        "p99_us": round(percentile(samples, 99), 2),
+        "max_us": round(samples[-1], 2),
+        "ops_per_s": round(1_000_000 / mean, 1) if mean else 0.0,
+    }
+
+
+async def measure(call, targets: list, iterations: int, warmup: int) -> dict:
+    """
+    Wywołuje call(user_id, habit_id) dla kolejnych celów i mierzy każde wywołanie.
+
+    Cele są losowane raz (z ziarna), więc każda funkcja dostaje tę samą sekwencję.
+    """
+    for index in range(warmup):
+        await call(*targets[index % len(targets)])
+
+    samples = []
+    for index in range(iterations):
+        user_id, habit_id = targets[index % len(targets)]
+        started = time.perf_counter_ns()
+        await call(user_id, habit_id)
+        samples.append(time.perf_counter_ns() - started)
+    return summarize(samples)
+
+
+async def bench_dataset(db_path: str, iterations: int, warmup: int, seed: int) -> dict:
+    """Uruchamia wszystkie mikrobenchmarki na jednej bazie."""
+    import aiosqlite
+    import database
+    from main import HABIT_CALENDAR_SQL
+
+    database.DATABASE_PATH = db_path
+    await database.init_pool()
+    write_db = await aiosqlite.connect(db_path)
+    try:
+        async with database.get_connection() as db:
+            cursor = await db.execute("SELECT user_id, id FROM habits WHERE is_active = 1 ORDER BY id")
+            habits = [(row["user_id"], row["id"]) for row in await cursor.fetchall()]
+        targets = random.Random(seed).choices(habits, k=max(iterations, warmup))
+
+        today = date.today()
+        today_iso = today.isoformat()
+        month_start = today.replace(day=1).isoformat()
+
+        async def habits_list(user_id, habit_id):
+            await database.get_user_habits_with_completions(user_id)
+
+        async def completed_today(user_id, habit_id):
+            await database.check_habit_completed_today(habit_id, user_id, today_iso)
+
+        async def habit_statistics(user_id, habit_id):
+            await database.get_user_habit_statistics(user_id)
+
+        async def calendar(user_id, habit_id):
+            await database.fetch_all(HABIT_CALENDAR_SQL, (habit_id, user_id, month_start, today_iso))
+
+        async def statistics_update(user_id, habit_id):
+            # Pomiar obejmuje też SAVEPOINT i wycofanie - ich koszt jest stały,
+            # niezależny od wielkości bazy, a baza po pomiarze pozostaje bez zmian
+            await write_db.execute("SAVEPOINT bench")
+            await database.update_habit_statistics(user_id, habit_id, today_iso, write_db)
+            await write_db.execute("ROLLBACK TO bench")
+            await write_db.execute("RELEASE bench")
+
+        results = {}
+        for name, call in (
+            ("get_user_habits_with_completions", habits_list),
+            ("check_habit_completed_today", completed_today),
+            ("update_habit_statistics", statistics_update),
+            ("get_user_habit_statistics", habit_statistics),
+            ("habit_calendar", calendar),
+        ):
+            results[name] = await measure(call, targets, iterations, warmup)
+        return results
+    finally:
+        await write_db.close()
+        await database.close_pool()
+
+
+def print_report(datasets: list):
+    """Wypisuje tabelę wyników dla każdej bazy."""
+    for dataset in datasets:
+        rows = dataset["rows"]
+        print(f"\nBaza: {rows['habit_completions']:,} wykonan, {rows['users']:,} uzytkownikow, "
+              f"{rows['habits']:,} nawykow ({rows['file_mb']} MB)")
+        print(f"{'funkcja':<36} {'p50 us':>10} {'p95 us':>10} {'p99 us':>10} {'sr. us':>10} {'op/s':>10}")
+        for name, result in dataset["benchmarks"].items():
+            print(f"{name:<36} {result['p50_us']:>10.1f} {result['p95_us']:>10.1f} "
+                  f"{result['p99_us']:>10.1f} {result['mean_us']:>10.1f} {result['ops_per_s']:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mikrobenchmarki warstwy danych Habi")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="wielkosci baz (liczba wykonan), po przecinku")
+    parser.add_argument("--iterations", type=int, default=1000, help="pomiary na funkcje")
+    parser.add_argument("--warmup", type=int, default=100, help="wywolania rozgrzewajace na funkcje")
+    parser.add_argument("--seed", type=int, default=42, help="ziarno danych i wyboru celow")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "habi-bench"),
+                        help="katalog generowanych baz (zachowywane miedzy uruchomieniami)")
+    parser.add_argument("--json", help="zapisz wyniki do pliku JSON")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    datasets = []
+    for size in sizes:
+        path = dataset_path(args.data_dir, size, args.seed)
+        print(f"Pomiary: {path}")
+        datasets.append({
+            "size": size,
+            "path": path,
+            "rows": dataset_rows(path),
+            "benchmarks": asyncio.run(bench_dataset(path, args.iterations, args.warmup, args.seed)),
+        })
+
+    results = {
+        "environment": environment_metadata(),
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "datasets": datasets,
+        "peak_rss_mb": own_peak_rss_mb(),
+    }
+    print_report(datasets)
+    print(f"\nSzczytowa pamiec procesu: {results['peak_rss_mb']} MB")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWyniki zapisane: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+============================================
+BRAMKA REGRESJI WYDAJNOŚCI
+============================================
+Porównuje wyniki testów wydajności (JSON z benchmarks.loadtest lub
+benchmarks.microbench) z linią bazową i kończy się kodem 1, gdy któraś
+metryka pogorszyła się ponad próg:
+- percentyle czasu odpowiedzi każdego endpointu / funkcji (p50, p95, p99)
+- średnia liczba zapytań SQL na żądanie (loadtest)
+- szczytowa pamięć procesu serwera (loadtest) lub benchmarku (microbench)
+
+Progi uwzględniają szum pomiaru:
+- każdy rodzaj metryki ma względną tolerancję (p99 większą niż p50) i minimalną
+  różnicę bezwzględną - zmiana o 0.3 ms przy p50 = 1 ms to jeszcze nie regresja
+- percentyle z małej liczby próbek (np. p99 ze 40 żądań) są pomijane
+- linia bazowa przechowuje kilka ostatnich przebiegów; odniesieniem jest ich
+  mediana, a gdy przebiegi różnią się między sobą, tolerancja rośnie do
+  wielokrotności tego rozrzutu
+- porównywany wynik może składać się z kilku plików (mediana przebiegów)
+
+Linia bazowa zależy od maszyny - należy ją tworzyć i porównywać na tym samym
+sprzęcie i z tą samą konfiguracją testu (ostrzeżenie, gdy się różnią).
+
+Użycie (z katalogu backend):
+    python -m benchmarks.loadtest --json przed.json
+    python -m benchmarks.regress save przed.json --baseline baseline-loadtest.json
+    ... zmiana w main.py / database.py ...
+    python -m benchmarks.loadtest --json po.json
+    python -m benchmarks.regress compare po.json --baseline baseline-loadtest.json
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+from datetime import datetime
+
+
+# Tolerancja względna i minimalna różnica bezwzględna dla rodzaju metryki
+TOLERANCES = {
+    "p50": (0.25, None),
+    "p95": (0.35, None),
+    "p99": (0.50, None),
+    "queries_per_request": (0.10, 0.5),
+    "peak_rss_mb": (0.15, 10.0),
+}
+
+# Minimalna różnica bezwzględna czasu wg jednostki metryki
+LATENCY_FLOORS = {"ms": 1.0, "us": 20.0}
+
+# Minimalna liczba próbek, przy której percentyl jest porównywany
+MIN_SAMPLES = {"p50": 5, "p95": 20, "p99": 100}
+
+# Tolerancja rośnie do NOISE_FACTOR x rozrzut przebiegów linii bazowej
+NOISE_FACTOR = 1.5
+
+# Liczba przebiegów przechowywanych w linii bazowej
+DEFAULT_KEEP = 5
+
+# Klucze konfiguracji, które nie wpływają na wynik
+IGNORED_CONFIG_KEYS = {"keep_db", "data_dir"}
+
+# Pola środowiska, których różnica czyni porównanie niewiarygodnym
+ENVIRONMENT_KEYS = ("python", "sqlite", "platform", "machine", "cpu_count")
+
+
+# ============================================
+# METRYKI
+# ============================================
+
+def metric_kind(metric: str) -> str:
+    """Rodzaj metryki (klucz TOLERANCES): "p95_ms" -> "p95"."""
+    return metric.split("_", 1)[0] if metric[:1] == "p" and metric[1:3].isdigit() else metric
+
+
+def _percentiles(group: str, stats: dict, samples: int, unit: str) -> dict:
+    """Percentyle z wystarczającej liczby próbek, jako {"grupa|metryka": wartość}."""
+    metrics = {}
+    for kind in ("p50", "p95", "p99"):
+        metric = f"{kind}_{unit}"
+        if metric in stats and samples >= MIN_SAMPLES[kind]:
+            metrics[f"{group}|{metric}"] = stats[metric]
+    return metrics
+
+
+def extract_metrics(result: dict) -> dict:
+    """
+    Spłaszcza wynik loadtest lub microbench do słownika porównywalnych metryk.
+
+    Args:
+        result: Wczytany JSON wyniku testu
+
+    Returns:
+        dict: {"grupa|metryka": wartość}, np. {"steady GET /api/habits|p95_ms": 4.2,
+        "GET /api/habits|queries_per_request": 2.0}
+
+    Raises:
+        ValueError: Gdy JSON nie pochodzi z loadtest ani microbench
+    """
+    metrics = {}
+    if "phases" in result:
+        for phase, summary in result["phases"].items():
+            for endpoint, stats in summary["endpoints"].items():
+                group = f"{phase} {endpoint}"
+                metrics.update(_percentiles(group, stats, stats["count"], "ms"))
+        server = result.get("server", {})
+        for endpoint, queries in server.get("queries_per_request", {}).items():
+            metrics[f"{endpoint}|queries_per_request"] = queries
+        peak = server.get("peak_rss_mb")
+        if peak is not None:
+            metrics["server|peak_rss_mb"] = peak
+    elif "datasets" in result:
+        for dataset in result["datasets"]:
+            for name, stats in dataset["benchmarks"].items():
+                metrics.update(_percentiles(f"{dataset['size']} {name}", stats, stats["iterations"], "us"))
+        if result.get("peak_rss_mb") is not None:
+            metrics["microbench|peak_rss_mb"] = result["peak_rss_mb"]
+    else:
+        raise ValueError("Nieznany format wyniku (oczekiwano JSON z loadtest lub microbench)")
+    return metrics
+
+
+def comparable_config(result: dict) -> dict:
+    """Konfiguracja testu bez kluczy, które nie wpływają na wynik."""
+    return {key: value for key, value in result.get("config", {}).items() if key not in IGNORED_CONFIG_KEYS}
+
+
+def load_results(paths: list) -> tuple:
+    """
+    Wczytuje jeden lub więcej wyników tego samego testu.
+
+    Returns:
+        tuple: (metryki - mediana przebiegów, konfiguracja, środowisko)
+
+    Raises:
+        ValueError: Gdy pliki mają różną konfigurację lub nieznany format
+    """
+    runs = []
+    config = environment = None
+    for path in paths:
+        with open(path) as f:
+            result = json.load(f)
+        if config is not None and comparable_config(result) != config:
+            raise ValueError(f"{path}: inna konfiguracja testu niz w {paths[0]}")
+        config = comparable_config(result)
+        environment = result.get("environment", {})
+        runs.append(extract_metrics(result))
+    return median_metrics(runs), config, environment
+
+
+def median_metrics(runs: list) -> dict:
+    """Mediana każdej metryki z przebiegów, w których występuje."""
+    keys = {key for run in runs for key in run}
+    return {key: statistics.median(run[key] for run in runs if key in run) for key in keys}
+
+
+# ============================================
+# LINIA BAZOWA
+# ============================================
+
+def load_baseline(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(paths: list, baseline_path: str, keep: int, reset: bool):
+    """
+    Dopisuje przebiegi do linii bazowej (zachowując `keep` ostatnich).
+
+    Zmiana konfiguracji testu zaczyna linię bazową od nowa - przebiegów
+    z różnymi parametrami nie da się porównywać.
+    """
+    baseline = None
+    if os.path.exists(baseline_path) and not reset:
+        baseline = load_baseline(baseline_path)
+
+    for path in paths:
+        with open(path) as f:
+            result = json.load(f)
+        config = comparable_config(result)
+        if baseline is None or baseline["config"] != config:
+            if baseline is not None:
+                print(f"{path}: konfiguracja inna niz w linii bazowej - linia bazowa od nowa")
+            baseline = {"config": config, "runs": []}
+        baseline["environment"] = result.get("environment", {})
+        baseline["runs"].append({
+            "timestamp": result.get("environment", {}).get("timestamp"),
+            "git_commit": result.get("environment", {}).get("git_commit"),
+            "metrics": extract_metrics(result),
+        })
+        baseline["runs"] = baseline["runs"][-keep:]
+
+    baseline["updated"] = datetime.now().isoformat(timespec="seconds")
+    with open(baseline_path, "w") as f:
+        json.dump(baseline, f, indent=2)
+    print(f"Linia bazowa zapisana: {baseline_path} ({len(baseline['runs'])} przebiegow, "
+          f"{len(median_metrics([run['metrics'] for run in baseline['runs']]))} metryk)")
+
+
+# ============================================
+# PORÓWNANIE
+# ============================================
+
+def threshold(metric: str, reference: float, spread: float, scale: float) -> float:
+    """
+    Dopuszczalna różnica bezwzględna metryki względem wartości odniesienia.
+
+    Args:
+        metric: Nazwa metryki (np. "p95_ms")
+        reference: Wartość z linii bazowej (mediana przebiegów)
+        spread: Względny rozrzut przebiegów linii bazowej ((max - min) / mediana)
+        scale: Mnożnik wszystkich tolerancji (--tolerance-scale)
+    """
+    relative, floor = TOLERANCES[metric_kind(metric)]
+    if floor is None:
+        floor = LATENCY_FLOORS[metric.rsplit("_", 1)[1]]
+    relative = max(relative, NOISE_FACTOR * spread) * scale
+    return max(reference * relative, floor * scale)
+
+
+def compare(baseline: dict, current: dict, scale: float) -> list:
+    """
+    Porównuje metryki z linią bazową.
+
+    Returns:
+        list: Wiersze (grupa, metryka, baza, teraz, limit, wynik) posortowane
+        wg grupy; wynik to "ok", "poprawa", "REGRESJA", "brak" lub "nowa"
+    """
+    runs = [run["metrics"] for run in baseline["runs"]]
+    reference = median_metrics(runs)
+    rows = []
+    for key in sorted(set(reference) | set(current)):
+        group, metric = key.split("|", 1)
+        if key not in current:
+            rows.append((group, metric, reference[key], None, None, "brak"))
+            continue
+        if key not in reference:
+            rows.append((group, metric, None, current[key], None, "nowa"))
+            continue
+
+        base = reference[key]
+        values = [run[key] for run in runs if key in run]
+        spread = (max(values) - min(values)) / base if len(values) > 1 and base else 0.0
+        allowed = threshold(metric, base, spread, scale)
+        value = current[key]
+        if value > base + allowed:
+            status = "REGRESJA"
+        elif value < base - allowed:
+            status = "poprawa"
+        else:
+            status = "ok"
+        rows.append((group, metric, base, value, base + allowed, status))
+    return rows
+
+
+def environment_warnings(baseline: dict, environment: dict, config: dict) -> list:
+    """Różnice środowiska i konfiguracji, przy których porównanie jest niewiarygodne."""
+    warnings = []
+    for key in ENVIRONMENT_KEYS:
+        before, after = baseline.get("environment", {}).get(key), environment.get(key)
+        if before != after:
+            warnings.append(f"srodowisko: {key} {before} -> {after}")
+    if baseline["config"] != config:
+        changed = sorted(key for key in set(baseline["config"]) | set(config)
+                         if baseline["config"].get(key) != config.get(key))
+        warnings.append(f"konfiguracja testu rozni sie: {', '.join(changed)}")
+    return warnings
+
+
+def _format(value) -> str:
+    return "-" if value is None else f"{value:.2f}"
+
+
+def print_table(rows: list):
+    """Wypisuje tabelę różnic per endpoint / funkcja."""
+    width = max([len("endpoint")] + [len(row[0]) for row in rows])
+    print(f"{'endpoint':<{width}} {'metryka':<20} {'baza':>10} {'teraz':>10} {'zmiana':>8} {'limit':>10}  wynik")
+    previous = None
+    for group, metric, base, value, limit, status in rows:
+        change = f"{(value - base) / base * 100:+.1f}%" if base and value is not None else "-"
+        label = group if group != previous else ""
+        previous = group
+        print(f"{label:<{width}} {metric:<20} {_format(base):>10} {_format(value):>10} "
+              f"{change:>8} {_format(limit):>10}  {status}")
+
+
+# ============================================
+# URUCHOMIENIE
+# ============================================
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Bramka regresji wydajnosci Habi")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    save = commands.add_parser("save", help="dopisz wyniki do linii bazowej")
+    save.add_argument("results", nargs="+", help="pliki JSON z loadtest lub microbench")
+    save.add_argument("--baseline", required=True, help="plik linii bazowej")
+    save.add_argument("--keep", type=int, default=DEFAULT_KEEP, help="liczba przechowywanych przebiegow")
+    save.add_argument("--reset", action="store_true", help="zacznij linie bazowa od nowa")
+
+    check = commands.add_parser("compare", help="porownaj wyniki z linia bazowa")
+    check.add_argument("results", nargs="+", help="pliki JSON z loadtest lub microbench (mediana)")
+    check.add_argument("--baseline", required=True, help="plik linii bazowej")
+    check.add_argument("--tolerance-scale", type=float, default=1.0,
+                       help="mnoznik wszystkich tolerancji (np. 2 na glosnej maszynie CI)")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "save":
+            save_baseline(args.results, args.baseline, args.keep, args.reset)
+            return 0
+
+        baseline = load_baseline(args.baseline)
+        current, config, environment = load_results(args.results)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Blad: {e}", file=sys.stderr)
+        return 2
+
+    for warning in environment_warnings(baseline, environment, config):
+        print(f"UWAGA: {warning}")
+
+    rows = compare(baseline, current, args.tolerance_scale)
+    print_table(rows)
+
+    regressions = [row for row in rows if row[5] == "REGRESJA"]
+    missing = [row for row in rows if row[5] == "brak"]
+    print(f"\nLinia bazowa: {len(baseline['runs'])} przebiegow, porownano {len(rows) - len(missing)} metryk"
+          + (f", brak {len(missing)} metryk" if missing else ""))
+    if regressions:
+        print(f"REGRESJA: {len(regressions)} metryk ponad prog")
+        return 1
+    print("Brak regresji")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
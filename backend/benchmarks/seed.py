@@ -0,0 +1,361 @@
+"""
+============================================
+GENERATOR DANYCH DO TESTÓW WYDAJNOŚCI
+============================================
+Tworzy bazę z aktualnym schematem (migracje z database.py) i wypełnia ją
+realistycznymi danymi w skali milionów wierszy:
+- liczba nawyków na użytkownika ma rozkład skośny (większość ma kilka,
+  nieliczni kilkanaście lub więcej)
+- wykonania układają się w serie przerywane przerwami; każdy nawyk ma
+  własną regularność, część nawyków została porzucona (is_active = 0)
+- monety zdobyte za wykonania są częściowo wydane na nagrody (purchases)
+  i ubrania (user_clothing), saldo users.coins jest z nimi zgodne
+- habit_statistics jest liczone z wygenerowanych wykonań dokładnie tak,
+  jak utrzymuje je aplikacja (update_habit_statistics)
+
+Wiersze są zapisywane paczkami przez executemany w jednej dużej transakcji
+bez dziennika, więc baza z 10 mln wykonań powstaje w kilka minut. Przerwane
+generowanie zostawia niespójny plik - należy go usunąć (lub użyć --force).
+
+Dzisiejsze wykonania nie są generowane - scenariusze testu obciążeniowego
+wykonują nawyki "dziś". Wszyscy użytkownicy mają hasło BENCH_PASSWORD, a te
+same argumenty i ziarno dają zawsze te same dane.
+
+Użycie (z katalogu backend):
+    python -m benchmarks.seed /tmp/bench.db --users 200
+    python -m benchmarks.seed /tmp/big.db --completions 10000000 --years 3
+
+    from benchmarks.seed import seed_database
+    summary = seed_database("/tmp/bench.db", users=200, habits_per_user=5, years=1)
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import asyncio
+import sqlite3
+import argparse
+from datetime import date, timedelta
+
+
+# Hasło wszystkich wygenerowanych użytkowników
+BENCH_PASSWORD = "benchmark123"
+
+# Monety na start (jak przy rejestracji)
+STARTING_COINS = 20
+
+# Maksymalna liczba nawyków jednego użytkownika
+MAX_HABITS_PER_USER = 30
+
+# Odsetek nawyków porzuconych (is_active = 0, wykonania kończą się wcześniej)
+INACTIVE_HABIT_RATE = 0.1
+
+# Liczba wierszy jednego wywołania executemany
+CHUNK_ROWS = 200_000
+
+HABIT_TEMPLATES = [
+    ("Picie wody", "💧"), ("Spacer", "🚶"), ("Czytanie", "📚"), ("Medytacja", "🧘"),
+    ("Trening", "💪"), ("Nauka jezyka", "🗣️"), ("Sen przed 23", "😴"), ("Owoce", "🍎"),
+    ("Bez slodyczy", "🚫"), ("Dziennik", "📝"), ("Rozciaganie", "🤸"), ("Sprzatanie", "🧹"),
+]
+
+
+def create_schema(path: str):
+    """
+    Tworzy bazę pod wskazaną ścieżką i wykonuje wszystkie migracje.
+
+    Args:
+        path (str): Ścieżka pliku bazy danych
+    """
+    import database
+
+    database.DATABASE_PATH = path
+    asyncio.run(database.init_db())
+
+
+def habit_statistics(days: list) -> tuple:
+    """
+    Liczy statystyki nawyku z posortowanej listy dni wykonań.
+
+    Args:
+        days (list): Numery dni wykonań rosnąco, bez powtórzeń
+
+    Returns:
+        tuple: (total_completions, current_streak, longest_streak, ostatni dzień)
+               - current_streak to seria kończąca się w dniu ostatniego wykonania,
+               tak jak po kolejnych wywołaniach update_habit_statistics
+    """
+    if not days:
+        return 0, 0, 0, None
+
+    longest = streak = 1
+    for previous, current in zip(days, days[1:]):
+        streak = streak + 1 if current - previous == 1 else 1
+        longest = max(longest, streak)
+    return len(days), streak, longest, days[-1]
+
+
+# ============================================
+# ROZKŁADY
+# ============================================
+
+def habit_count(rng: random.Random, mean: float) -> int:
+    """Liczba nawyków użytkownika - rozkład logarytmiczno-normalny o zadanej średniej."""
+    sigma = 0.8
+    value = rng.lognormvariate(math.log(mean) - sigma * sigma / 2, sigma)
+    return max(1, min(MAX_HABITS_PER_USER, round(value)))
+
+
+def completion_days(rng: random.Random, first: int, last: int, adherence: float) -> list:
+    """
+    Dni wykonań nawyku w przedziale [first, last) jako naprzemienne serie i przerwy.
+
+    Długości serii i przerw mają rozkład wykładniczy; ich średnie dobrano tak,
+    aby odsetek dni z wykonaniem odpowiadał regularności (adherence) nawyku.
+    """
+    mean_gap = rng.uniform(1.5, 6.0)
+    mean_streak = max(1.0, adherence / (1 - adherence) * mean_gap)
+
+    days = []
+    day = first + int(rng.expovariate(1 / mean_gap))
+    while day < last:
+        end = min(day + 1 + int(rng.expovariate(1 / mean_streak)), last)
+        days.extend(range(day, end))
+        day = end + 1 + int(rng.expovariate(1 / mean_gap))
+    return days
+
+
+def timestamp(day: date, rng: random.Random) -> str:
+    """Znacznik czasu w formacie CURRENT_TIMESTAMP z losową godziną danego dnia."""
+    return f"{day.isoformat()} {rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}"
+
+
+# ============================================
+# GENERATOR
+# ============================================
+
+INSERT_USER_SQL = (
+    "INSERT INTO users (id, username, email, password_hash, coins, created_at, current_clothing_id) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+INSERT_HABIT_SQL = (
+    "INSERT INTO habits (id, user_id, name, description, reward_coins, icon, is_active, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+INSERT_COMPLETION_SQL = (
+    "INSERT INTO habit_completions (habit_id, user_id, completed_at, coins_earned) VALUES (?, ?, ?, ?)"
+)
+INSERT_STATISTICS_SQL = (
+    "INSERT INTO habit_statistics (user_id, habit_id, total_completions, current_streak, "
+    "longest_streak, last_completion_date) VALUES (?, ?, ?, ?, ?, ?)"
+)
+INSERT_PURCHASE_SQL = (
+    "INSERT INTO purchases (user_id, reward_id, coins_spent, purchased_at) VALUES (?, ?, ?, ?)"
+)
+INSERT_USER_CLOTHING_SQL = (
+    "INSERT INTO user_clothing (user_id, clothing_id, purchased_at) VALUES (?, ?, ?)"
+)
+
+
+class BulkWriter:
+    """Zbiera wiersze tabel i zapisuje je paczkami po CHUNK_ROWS przez executemany."""
+
+    def __init__(self, db: sqlite3.Connection, progress: bool):
+        self.db = db
+        self.progress = progress
+        self.pending = {}
+        self.totals = {}
+        self.started = time.monotonic()
+
+    def add(self, sql: str, rows: list):
+        pending = self.pending.setdefault(sql, [])
+        pending.extend(rows)
+        if len(pending) >= CHUNK_ROWS:
+            self.flush(sql)
+
+    def flush(self, sql: str = None):
+        for statement in ([sql] if sql else list(self.pending)):
+            rows = self.pending.pop(statement, [])
+            if not rows:
+                continue
+            self.db.executemany(statement, rows)
+            table = statement.split()[2]
+            self.totals[table] = self.totals.get(table, 0) + len(rows)
+            if self.progress and table == "habit_completions":
+                elapsed = time.monotonic() - self.started
+                print(f"  wykonania: {self.totals[table]:,} ({self.totals[table] / elapsed:,.0f}/s)")
+
+
+def seed_database(path: str, users: int = 200, habits_per_user: float = 5, years: float = 1.0,
+                  completion_rate: float = 0.7, seed: int = 42, max_completions: int = None,
+                  progress: bool = False) -> dict:
+    """
+    Tworzy i wypełnia bazę danymi do testów wydajności.
+
+    Args:
+        path (str): Ścieżka nowej bazy danych (plik nie może istnieć)
+        users (int, optional): Liczba użytkowników. Domyślnie 200.
+        habits_per_user (float, optional): Średnia liczba nawyków użytkownika. Domyślnie 5.
+        years (float, optional): Długość historii w latach. Domyślnie 1.0.
+        completion_rate (float, optional): Średnia regularność nawyków (odsetek
+            dni z wykonaniem). Domyślnie 0.7.
+        seed (int, optional): Ziarno generatora. Domyślnie 42.
+        max_completions (int, optional): Zakończ po użytkowniku, z którym liczba
+            wykonań osiągnęła ten próg (`users` jest wtedy górnym limitem). Domyślnie None.
+        progress (bool, optional): Wypisuj postęp. Domyślnie False.
+
+    Returns:
+        dict: Liczby wierszy (users, habits, completions, purchases, user_clothing)
+              oraz habits_by_user - słownik user_id -> lista ID aktywnych nawyków
+
+    Raises:
+        FileExistsError: Gdy plik bazy już istnieje
+    """
+    from auth import hash_password
+
+    if os.path.exists(path):
+        raise FileExistsError(f"Baza {path} juz istnieje")
+
+    create_schema(path)
+    rng = random.Random(seed)
+    password_hash = hash_password(BENCH_PASSWORD)
+    completion_rate = min(max(completion_rate, 0.02), 0.97)
+
+    db = sqlite3.connect(path, isolation_level=None)
+    rewards = db.execute("SELECT id, cost FROM rewards ORDER BY id").fetchall()
+    clothing = db.execute("SELECT id, cost FROM clothing_items ORDER BY id").fetchall()
+    cheapest_reward = min(cost for _, cost in rewards)
+
+    today = date.today()
+    history_days = max(2, int(years * 365))
+    start = today - timedelta(days=history_days)
+    day_strings = [(start + timedelta(days=offset)).isoformat() for offset in range(history_days)]
+
+    def moment(first_day: int) -> str:
+        return timestamp(start + timedelta(days=rng.randint(first_day, history_days - 1)), rng)
+
+    # Ładowanie bez dziennika i synchronizacji; tryb WAL jest przywracany po zatwierdzeniu
+    db.execute("PRAGMA journal_mode = OFF")
+    db.execute("PRAGMA synchronous = OFF")
+    db.execute("PRAGMA cache_size = -262144")
+    db.execute("PRAGMA temp_store = MEMORY")
+
+    writer = BulkWriter(db, progress)
+    habits_by_user = {}
+    completions_total = 0
+    habit_id = 0
+    user_id = 0
+
+    try:
+        db.execute("BEGIN")
+        while user_id < users and (max_completions is None or completions_total < max_completions):
+            user_id += 1
+            # Użytkownicy dołączali przez całą historię, częściej na jej początku
+            joined = int(history_days * rng.random() ** 1.5)
+            earned = 0
+            habits_by_user[user_id] = []
+
+            habit_rows, completion_rows, statistics_rows = [], [], []
+            for _ in range(habit_count(rng, habits_per_user)):
+                habit_id += 1
+                name, icon = rng.choice(HABIT_TEMPLATES)
+                reward = rng.choice((1, 1, 2, 2, 3, 5))
+                created = min(history_days - 1, joined + int(rng.expovariate(1 / 30)))
+                active = rng.random() >= INACTIVE_HABIT_RATE
+                last = history_days if active else rng.randint(created + 1, history_days)
+
+                adherence = rng.betavariate(completion_rate * 4, (1 - completion_rate) * 4)
+                days = completion_days(rng, created, last, min(max(adherence, 0.02), 0.97))
+
+                habit_rows.append((habit_id, user_id, name, "", reward, icon, int(active),
+                                   timestamp(start + timedelta(days=created), rng)))
+                completion_rows.extend((habit_id, user_id, day_strings[day], reward) for day in days)
+                if days:
+                    total, current, longest, last_day = habit_statistics(days)
+                    statistics_rows.append((user_id, habit_id, total, current, longest, day_strings[last_day]))
+                earned += reward * len(days)
+                if active:
+                    habits_by_user[user_id].append(habit_id)
+
+            # Wydatki: część monet na jedzenie dla Habi, potem ubrania z tego, co zostało
+            coins = STARTING_COINS + earned
+            food_budget = int(coins * rng.uniform(0.05, 0.5))
+            purchase_rows = []
+            while food_budget >= cheapest_reward:
+                reward_id, cost = rng.choice(rewards)
+                if cost <= food_budget:
+                    food_budget -= cost
+                    coins -= cost
+                    purchase_rows.append((user_id, reward_id, cost, moment(joined)))
+
+            owned = []
+            for clothing_id, cost in rng.sample(clothing, len(clothing)):
+                if cost <= coins and rng.random() < 0.6:
+                    coins -= cost
+                    owned.append(clothing_id)
+            clothing_rows = [(user_id, clothing_id, moment(joined)) for clothing_id in owned]
+            current_clothing = rng.choice(owned) if owned and rng.random() < 0.7 else None
+
+            writer.add(INSERT_USER_SQL, [(
+                user_id, f"bench{user_id}", f"bench{user_id}@example.com", password_hash, coins,
+                timestamp(start + timedelta(days=joined), rng), current_clothing
+            )])
+            writer.add(INSERT_HABIT_SQL, habit_rows)
+            writer.add(INSERT_COMPLETION_SQL, completion_rows)
+            writer.add(INSERT_STATISTICS_SQL, statistics_rows)
+            writer.add(INSERT_PURCHASE_SQL, purchase_rows)
+            writer.add(INSERT_USER_CLOTHING_SQL, clothing_rows)
+            completions_total += len(completion_rows)
+
+        writer.flush()
+        db.execute("COMMIT")
+        db.execute("PRAGMA journal_mode = WAL")
+    finally:
+        db.close()
+
+    return {
+        "users": writer.totals.get("users", 0),
+        "habits": writer.totals.get("habits", 0),
+        "completions": writer.totals.get("habit_completions", 0),
+        "purchases": writer.totals.get("purchases", 0),
+        "user_clothing": writer.totals.get("user_clothing", 0),
+        "habits_by_user": habits_by_user,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generator danych do testow wydajnosci Habi")
+    parser.add_argument("path", help="sciezka nowej bazy danych")
+    parser.add_argument("--users", type=int, default=None,
+                        help="liczba uzytkownikow (z --completions: gorny limit)")
+    parser.add_argument("--completions", type=int, default=None,
+                        help="docelowa liczba wykonan (generuj uzytkownikow az do jej osiagniecia)")
+    parser.add_argument("--habits", type=float, default=5, help="srednia liczba nawykow na uzytkownika")
+    parser.add_argument("--years", type=float, default=1.0, help="dlugosc historii (lata)")
+    parser.add_argument("--rate", type=float, default=0.7, help="srednia regularnosc nawykow (0-1)")
+    parser.add_argument("--seed", type=int, default=42, help="ziarno generatora")
+    parser.add_argument("--force", action="store_true", help="nadpisz istniejaca baze")
+    args = parser.parse_args()
+
+    if args.users is None and args.completions is None:
+        parser.error("podaj --users lub --completions")
+
+    if args.force:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.path + suffix):
+                os.remove(args.path + suffix)
+
+    started = time.monotonic()
+    summary = seed_database(
+        args.path, users=args.users or sys.maxsize, habits_per_user=args.habits, years=args.years,
+        completion_rate=args.rate, seed=args.seed, max_completions=args.completions, progress=True
+    )
+    summary.pop("habits_by_user")
+    size_mb = os.path.getsize(args.path) / 1024 / 1024
+    print(f"Baza gotowa w {time.monotonic() - started:.1f} s ({size_mb:.0f} MB): {summary}")
+
+
+if __name__ == "__main__":
+    main()
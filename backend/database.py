@@ -6,25 +6,37 @@ oraz pomocnicze funkcje do wykonywania zapytań SQL.
 """
 
 import os
+import json
+import time
+import hashlib
 import sqlite3
 import asyncio
 import aiosqlite
 from pathlib import Path
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, date
+from typing import Optional
+
+from utils.logger import get_logger
+from utils.metrics import TimedConnection, timed_work, record_query, register_query_label
+
+logger = get_logger("database")
 
 # ============================================
 # KONFIGURACJA ŚCIEŻKI BAZY DANYCH
 # ============================================
 
-# Użyj Persistent Disk (/var/data) jeśli dostępny (Render),
-# w przeciwnym razie użyj lokalnej ścieżki (development)
-DATABASE_PATH = "/var/data/database.db" if os.path.exists("/var/data") else "database.db"
+# Ścieżka z DATABASE_PATH (np. tymczasowa baza testów obciążeniowych); w przeciwnym razie
+# Persistent Disk (/var/data) jeśli dostępny (Render), a lokalnie plik w katalogu roboczym
+DATABASE_PATH = os.environ.get("DATABASE_PATH") or (
+    "/var/data/database.db" if os.path.exists("/var/data") else "database.db"
+)
 
-print("=" * 40)
-print("KONFIGURACJA BAZY DANYCH:")
-print(f"   Sciezka: {DATABASE_PATH}")
-print(f"   Typ: {'Persistent Disk (Render)' if '/var/data' in DATABASE_PATH else 'Local Development'}")
-print("=" * 40)
+logger.info(
+    "Konfiguracja bazy danych: sciezka %s (%s)",
+    DATABASE_PATH,
+    "Persistent Disk (Render)" if "/var/data" in DATABASE_PATH else "Local Development",
+)
 
 # ============================================
 # DEFINICJE SQL
@@ -125,6 +137,10 @@ CREATE TABLE IF NOT EXISTS habit_statistics (
     FOREIGN KEY (habit_id) REFERENCES habits(id) ON DELETE CASCADE,
     UNIQUE (user_id, habit_id)
 );
+
+-- Indeksy pomocnicze (pozostałe dodaje migracja secondary_indexes)
+CREATE INDEX IF NOT EXISTS idx_habits_user_active_created
+    ON habits (user_id, is_active, created_at);
 """
 
 # ============================================
@@ -154,6 +170,283 @@ DEFAULT_CLOTHING = [
 ]
 
 
+# ============================================
+# MIGRACJE SCHEMATU
+# ============================================
+
+# Jak długo (w sekundach) proces czeka na blokadę zapisu, gdy migracje
+# wykonuje równolegle inny proces (np. drugi worker uvicorna)
+DB_MIGRATION_LOCK_TIMEOUT = float(os.environ.get("DB_MIGRATION_LOCK_TIMEOUT", "30"))
+
+SCHEMA_VERSION_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+def _split_statements(script: str) -> list:
+    """
+    Dzieli skrypt SQL na pojedyncze polecenia.
+
+    executescript() zatwierdza otwartą transakcję przed wykonaniem skryptu,
+    więc wewnątrz migracji polecenia trzeba wykonywać pojedynczo.
+
+    Args:
+        script (str): Skrypt SQL z poleceniami rozdzielonymi średnikami
+
+    Returns:
+        list: Lista niepustych poleceń SQL
+    """
+    return [statement.strip() for statement in script.split(";") if statement.strip()]
+
+
+async def _add_column_if_missing(db: aiosqlite.Connection, table: str, column: str, definition: str):
+    """
+    Dodaje kolumnę do tabeli, jeśli jeszcze jej nie ma.
+
+    Bazy sprzed wprowadzenia schema_version mogą już mieć kolumnę dodaną
+    przez stary kod startowy, dlatego migracje kolumn są idempotentne.
+
+    Args:
+        db (aiosqlite.Connection): Połączenie z otwartą transakcją migracji
+        table (str): Nazwa tabeli
+        column (str): Nazwa dodawanej kolumny
+        definition (str): Typ i wartość domyślna kolumny
+    """
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    column_names = [column_info[1] for column_info in await cursor.fetchall()]
+
+    if column not in column_names:
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        logger.info("Kolumna %s.%s dodana pomyslnie", table, column)
+
+
+async def _migrate_create_tables(db: aiosqlite.Connection):
+    """Tworzy wszystkie tabele i indeksy aplikacji."""
+    for statement in _split_statements(CREATE_TABLES_SQL):
+        await db.execute(statement)
+
+
+async def _migrate_current_clothing(db: aiosqlite.Connection):
+    """Dodaje kolumnę aktualnie noszonego ubrania."""
+    await _add_column_if_missing(db, "users", "current_clothing_id", "INTEGER DEFAULT NULL")
+
+
+async def _migrate_last_slot_play(db: aiosqlite.Connection):
+    """Dodaje historyczną kolumnę last_slot_play (zachowana dla zgodności starych baz)."""
+    await _add_column_if_missing(db, "users", "last_slot_play", "TEXT DEFAULT NULL")
+
+
+async def _migrate_last_slot_machine_play(db: aiosqlite.Connection):
+    """Dodaje kolumnę z datą ostatniej gry w automat."""
+    await _add_column_if_missing(db, "users", "last_slot_machine_play", "DATE DEFAULT NULL")
+
+
+async def _migrate_seed_defaults(db: aiosqlite.Connection):
+    """Dodaje domyślne nagrody i ubrania, jeśli tabele są puste."""
+    cursor = await db.execute("SELECT COUNT(*) FROM rewards")
+    if (await cursor.fetchone())[0] == 0:
+        await db.executemany(
+            "INSERT INTO rewards (name, cost, nutrition_value, icon, type) VALUES (?, ?, ?, ?, ?)",
+            DEFAULT_REWARDS
+        )
+        logger.info("Domyslne nagrody dodane")
+
+    cursor = await db.execute("SELECT COUNT(*) FROM clothing_items")
+    if (await cursor.fetchone())[0] == 0:
+        await db.executemany(
+            "INSERT INTO clothing_items (name, cost, icon, category) VALUES (?, ?, ?, ?)",
+            DEFAULT_CLOTHING
+        )
+        logger.info("Domyslne ubrania dodane")
+
+
+async def _migrate_completions_user_index(db: aiosqlite.Connection):
+    """
+    Dodaje indeks wykonań nawyków po użytkowniku.
+
+    Kolejność (habit_id, completed_at DESC) odpowiada oknu ROW_NUMBER()
+    w zapytaniu statystyk, więc okno nie wymaga sortowania.
+    """
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_habit_completions_user_habit_date
+            ON habit_completions (user_id, habit_id, completed_at DESC)
+    """)
+
+
+async def _migrate_users_data_version(db: aiosqlite.Connection):
+    """Dodaje licznik wersji danych użytkownika (podstawa ETagów)."""
+    await _add_column_if_missing(db, "users", "data_version", "INTEGER NOT NULL DEFAULT 0")
+
+
+async def _migrate_sync_idempotency_keys(db: aiosqlite.Connection):
+    """
+    Dodaje tabelę kluczy idempotencji synchronizacji offline.
+
+    Klucz zapisuje wynik pierwszego przetworzenia wykonania, więc ponowne
+    wysłanie tej samej kolejki (np. po zerwanym połączeniu) zwraca ten sam
+    wynik zamiast drugi raz przyznawać monety.
+    """
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS sync_idempotency_keys (
+            user_id INTEGER NOT NULL,
+            idempotency_key TEXT NOT NULL,
+            habit_id INTEGER NOT NULL,
+            completed_at DATE NOT NULL,
+            status TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, idempotency_key),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """)
+
+
+async def _migrate_user_changes(db: aiosqlite.Connection):
+    """
+    Dodaje dziennik zmian użytkownika (synchronizacja delta) i próg jego kompakcji.
+
+    Dotychczasowa historia nie jest w dzienniku, więc próg startuje od bieżącej
+    wersji danych - starsze kursory dostaną pełny snapshot.
+    """
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_changes (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            entity_id INTEGER,
+            data TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_user_changes_user_version
+            ON user_changes (user_id, version)
+    """)
+    await _add_column_if_missing(db, "users", "change_log_floor", "INTEGER NOT NULL DEFAULT 0")
+    await db.execute("UPDATE users SET change_log_floor = data_version")
+
+
+async def _migrate_secondary_indexes(db: aiosqlite.Connection):
+    """
+    Dodaje indeksy wykonań po (habit_id, completed_at) i ubrań po user_id.
+
+    Indeks nawyków zastępuje wersją pokrywającą listę nawyków
+    (USER_HABITS_WITH_COMPLETIONS_SQL), więc lista nie czyta wierszy tabeli
+    habits. Ma ten sam prefiks co poprzedni indeks, więc pozostałe zapytania
+    po (user_id, is_active) dalej z niego korzystają.
+    """
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_habit_completions_habit_date
+            ON habit_completions (habit_id, completed_at)
+    """)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_user_clothing_user
+            ON user_clothing (user_id)
+    """)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_habits_user_active_created_cover
+            ON habits (user_id, is_active, created_at, name, description, reward_coins, icon)
+    """)
+    await db.execute("DROP INDEX IF EXISTS idx_habits_user_active_created")
+
+
+# Uporządkowana lista migracji: (wersja, nazwa, funkcja).
+# Nowe zmiany schematu dopisuj na końcu z kolejnym numerem - nigdy nie
+# modyfikuj migracji, które mogły już zostać wykonane na produkcji.
+MIGRATIONS = [
+    (1, "create_tables", _migrate_create_tables),
+    (2, "users_current_clothing_id", _migrate_current_clothing),
+    (3, "users_last_slot_play", _migrate_last_slot_play),
+    (4, "users_last_slot_machine_play", _migrate_last_slot_machine_play),
+    (5, "seed_defaults", _migrate_seed_defaults),
+    (6, "idx_habit_completions_user_habit_date", _migrate_completions_user_index),
+    (7, "users_data_version", _migrate_users_data_version),
+    (8, "sync_idempotency_keys", _migrate_sync_idempotency_keys),
+    (9, "user_changes", _migrate_user_changes),
+    (10, "secondary_indexes", _migrate_secondary_indexes),
+]
+
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+async def _read_schema_version(db: aiosqlite.Connection) -> int:
+    """
+    Odczytuje numer ostatniej wykonanej migracji.
+
+    Args:
+        db (aiosqlite.Connection): Połączenie z bazą danych
+
+    Returns:
+        int: Wersja schematu (0 dla bazy bez tabeli schema_version)
+    """
+    try:
+        cursor = await db.execute("SELECT MAX(version) FROM schema_version")
+        row = await cursor.fetchone()
+    except sqlite3.OperationalError:
+        # Tabela nie istnieje - nowa baza lub baza sprzed wersjonowania
+        return 0
+    return row[0] or 0
+
+
+async def migrate(db: aiosqlite.Connection) -> int:
+    """
+    Doprowadza schemat bazy do najnowszej wersji.
+
+    Szybka ścieżka to jeden odczyt wersji. Jeśli są zaległe migracje,
+    funkcja bierze blokadę zapisu (BEGIN IMMEDIATE), która serializuje
+    równoległe procesy, ponownie czyta wersję (inny proces mógł już
+    zakończyć migracje) i wykonuje brakujące kroki w jednej transakcji.
+    Błąd dowolnego kroku wycofuje całą transakcję.
+
+    Args:
+        db (aiosqlite.Connection): Połączenie otwarte z isolation_level=None
+
+    Returns:
+        int: Wersja schematu po migracji
+
+    Raises:
+        sqlite3.Error: Gdy migracja się nie powiedzie
+    """
+    version = await _read_schema_version(db)
+    if version >= LATEST_SCHEMA_VERSION:
+        logger.info("Schemat bazy aktualny (wersja %s)", version)
+        return version
+
+    await db.execute("BEGIN IMMEDIATE")
+    try:
+        await db.execute(SCHEMA_VERSION_TABLE_SQL)
+        version = await _read_schema_version(db)
+        applied = 0
+
+        for migration_version, name, migration in MIGRATIONS:
+            if migration_version <= version:
+                continue
+            logger.info("Migracja %s: %s...", migration_version, name)
+            await migration(db)
+            await db.execute(
+                "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                (migration_version, name)
+            )
+            version = migration_version
+            applied += 1
+
+        await db.execute("COMMIT")
+    except BaseException:
+        await db.execute("ROLLBACK")
+        raise
+
+    if applied:
+        logger.info("Schemat bazy zaktualizowany do wersji %s (migracje: %s)", version, applied)
+    else:
+        logger.info("Schemat bazy aktualny (wersja %s, migracje wykonal inny proces)", version)
+    return version
+
+
 # ============================================
 # INICJALIZACJA BAZY DANYCH
 # ============================================
@@ -162,97 +455,616 @@ async def init_db():
     """
     Inicjalizuje bazę danych SQLite.
 
-    Funkcja tworzy wszystkie wymagane tabele dla aplikacji Habi i dodaje
-    domyślne nagrody oraz ubrania jeśli baza danych jest pusta. Włącza również obsługę
-    kluczy obcych dla zachowania integralności danych.
+    Funkcja przełącza bazę w tryb WAL i wykonuje zaległe migracje schematu
+    (tabele, kolumny, dane domyślne), a następnie unieważnia pamięć podręczną
+    katalogów. Przy ciepłym starcie kończy się na jednym odczycie wersji schematu.
 
     Raises:
-        sqlite3.Error: Gdy wystąpi błąd podczas tworzenia tabel
+        sqlite3.Error: Gdy wystąpi błąd podczas migracji
         aiosqlite.Error: Gdy wystąpi błąd połączenia z bazą danych
 
     Example:
         await init_db()
         Baza danych została zainicjalizowana pomyślnie
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async with aiosqlite.connect(DATABASE_PATH, timeout=DB_MIGRATION_LOCK_TIMEOUT,
+                                 isolation_level=None) as db:
+        # Tryb WAL - odczyty nie blokują się na zapisach (ustawienie trwałe w pliku bazy)
+        cursor = await db.execute("PRAGMA journal_mode = WAL")
+        journal_mode = await cursor.fetchone()
+        logger.info("Tryb dziennika bazy: %s", journal_mode[0])
+
         # Włączenie obsługi kluczy obcych
         await db.execute("PRAGMA foreign_keys = ON")
 
-        # Utworzenie wszystkich tabel
-        await db.executescript(CREATE_TABLES_SQL)
-        print("Tabele utworzone")
+        await migrate(db)
 
-        # ============================================
-        # MIGRACJE - Dodanie nowych kolumn
-        # ============================================
+    # Migracje mogły zmienić dane domyślne katalogów
+    catalog_cache.invalidate()
+    logger.info("Baza danych zostala zainicjalizowana pomyslnie")
 
-        # Pobierz listę kolumn w tabeli users
-        cursor = await db.execute("PRAGMA table_info(users)")
-        columns = await cursor.fetchall()
-        column_names = [column[1] for column in columns]
 
-        # MIGRACJA 1: Dodaj kolumnę current_clothing_id
-        if 'current_clothing_id' not in column_names:
-            print("Dodawanie kolumny current_clothing_id...")
-            try:
-                await db.execute("""
-                    ALTER TABLE users 
-                    ADD COLUMN current_clothing_id INTEGER DEFAULT NULL
-                """)
-                await db.commit()
-                print("Kolumna current_clothing_id dodana pomyslnie")
-            except Exception as e:
-                print(f"Blad przy dodawaniu kolumny current_clothing_id: {e}")
-        else:
-            print("Kolumna current_clothing_id juz istnieje")
+# ============================================
+# PULA POŁĄCZEŃ
+# ============================================
+
+# Liczba stale otwartych połączeń w puli
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+
+# Maksymalny czas oczekiwania na wolne połączenie (w sekundach)
+DB_POOL_ACQUIRE_TIMEOUT = float(os.environ.get("DB_POOL_ACQUIRE_TIMEOUT", "5"))
+
+# Po ilu sekundach bezczynności połączenie jest sprawdzane przed wydaniem
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))
+
+# Maksymalna liczba operacji zapisu czekających w kolejce (0 = bez limitu)
+DB_WRITE_QUEUE_SIZE = int(os.environ.get("DB_WRITE_QUEUE_SIZE", "1000"))
+
+# Tryb synchronizacji połączenia zapisującego (NORMAL jest bezpieczny w trybie WAL)
+DB_SYNCHRONOUS = os.environ.get("DB_SYNCHRONOUS", "NORMAL")
+
+# Jak długo (w milisekundach) writer zbiera kolejne zapisy do wspólnej transakcji
+DB_WRITE_BATCH_WINDOW_MS = float(os.environ.get("DB_WRITE_BATCH_WINDOW_MS", "3"))
+
+# Maksymalna liczba operacji zatwierdzanych jednym commitem
+DB_WRITE_BATCH_MAX = int(os.environ.get("DB_WRITE_BATCH_MAX", "64"))
+
+
+class PoolTimeoutError(Exception):
+    """Brak wolnego połączenia w puli w wyznaczonym czasie."""
+
+
+async def _open_connection(read_only: bool = False) -> aiosqlite.Connection:
+    """
+    Otwiera nowe połączenie skonfigurowane tak jak wszystkie połączenia aplikacji.
+
+    Args:
+        read_only (bool, optional): Czy otworzyć połączenie tylko do odczytu
+            (mode=ro). Domyślnie False.
+
+    Returns:
+        aiosqlite.Connection: Połączenie z włączonymi kluczami obcymi i row_factory
+    """
+    if read_only:
+        uri = f"{Path(DATABASE_PATH).resolve().as_uri()}?mode=ro"
+        db = await aiosqlite.connect(uri, uri=True)
+    else:
+        db = await aiosqlite.connect(DATABASE_PATH)
+    await db.execute("PRAGMA foreign_keys = ON")
+    db.row_factory = aiosqlite.Row
+    return db
+
+
+class ConnectionPool:
+    """
+    Pula długo żyjących połączeń aiosqlite.
+
+    Połączenia są otwierane raz przy starcie aplikacji (w lifespan) i wielokrotnie
+    wykorzystywane, dzięki czemu żądanie nie płaci za utworzenie wątku, otwarcie
+    pliku i parsowanie schematu. Połączenie bezczynne dłużej niż
+    health_check_interval jest sprawdzane zapytaniem SELECT 1 i w razie błędu
+    zastępowane nowym. Pula aplikacji składa się z połączeń tylko do odczytu -
+    zapisy przechodzą przez DatabaseWriter.
+
+    Example:
+        pool = ConnectionPool(size=5)
+        await pool.open()
+        async with pool.acquire() as db:
+            cursor = await db.execute("SELECT 1")
+        await pool.close()
+    """
 
-        # MIGRACJA 2: Dodaj kolumnę last_slot_play
-        if 'last_slot_play' not in column_names:
-            print("Dodawanie kolumny last_slot_play...")
+    def __init__(self, size: int = DB_POOL_SIZE,
+                 acquire_timeout: float = DB_POOL_ACQUIRE_TIMEOUT,
+                 health_check_interval: float = DB_POOL_HEALTH_CHECK_INTERVAL,
+                 read_only: bool = False):
+        if size < 1:
+            raise ValueError("Rozmiar puli musi byc wiekszy od 0")
+
+        self.size = size
+        self.read_only = read_only
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._connections: list = []
+        self._closed = True
+
+        # Statystyki puli
+        self._waiting = 0
+        self._acquired_total = 0
+        self._timeouts_total = 0
+        self._replaced_total = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    async def open(self):
+        """Otwiera wszystkie połączenia puli (rozgrzewa pulę)."""
+        for _ in range(self.size):
+            db = await _open_connection(self.read_only)
+            self._connections.append(db)
+            self._idle.put_nowait((db, time.monotonic()))
+        self._closed = False
+        logger.info("Pula polaczen otwarta: %s polaczen%s", self.size, " (tylko odczyt)" if self.read_only else "")
+
+    async def close(self):
+        """Zamyka wszystkie połączenia puli."""
+        self._closed = True
+        for db in self._connections:
             try:
-                await db.execute("""
-                    ALTER TABLE users 
-                    ADD COLUMN last_slot_play TEXT DEFAULT NULL
-                """)
-                await db.commit()
-                print("Kolumna last_slot_play dodana pomyslnie")
+                await db.close()
             except Exception as e:
-                print(f"Blad przy dodawaniu kolumny last_slot_play: {e}")
-        else:
-            print("Kolumna last_slot_play juz istnieje")
-
-        # ============================================
-        # INICJALIZACJA DANYCH DOMYŚLNYCH
-        # ============================================
-
-        # Sprawdzenie czy tabela rewards jest pusta
-        cursor = await db.execute("SELECT COUNT(*) FROM rewards")
-        count = await cursor.fetchone()
-
-        # Dodanie domyślnych nagród jeśli tabela jest pusta
-        if count[0] == 0:
-            print("Dodawanie domyslnych nagrod...")
-            await db.executemany(
-                "INSERT INTO rewards (name, cost, nutrition_value, icon, type) VALUES (?, ?, ?, ?, ?)",
-                DEFAULT_REWARDS
-            )
-            print("Domyslne nagrody dodane")
-
-        # Sprawdzenie czy tabela clothing_items jest pusta
-        cursor = await db.execute("SELECT COUNT(*) FROM clothing_items")
-        count = await cursor.fetchone()
-
-        # Dodanie domyślnych ubrań jeśli tabela jest pusta
-        if count[0] == 0:
-            print("Dodawanie domyslnych ubran...")
-            await db.executemany(
-                "INSERT INTO clothing_items (name, cost, icon, category) VALUES (?, ?, ?, ?)",
-                DEFAULT_CLOTHING
+                logger.warning("Blad zamykania polaczenia z puli: %s", e)
+        self._connections.clear()
+        self._idle = asyncio.Queue()
+        logger.info("Pula polaczen zamknieta")
+
+    async def _replace(self, db: aiosqlite.Connection) -> aiosqlite.Connection:
+        """Zamyka uszkodzone połączenie i otwiera w jego miejsce nowe."""
+        try:
+            await db.close()
+        except Exception:
+            pass
+
+        new_db = await _open_connection(self.read_only)
+        self._connections[self._connections.index(db)] = new_db
+        self._replaced_total += 1
+        return new_db
+
+    async def _health_check(self, db: aiosqlite.Connection, last_used: float) -> aiosqlite.Connection:
+        """Sprawdza długo nieużywane połączenie i w razie potrzeby je wymienia."""
+        if time.monotonic() - last_used < self.health_check_interval:
+            return db
+
+        try:
+            await db.execute("SELECT 1")
+            return db
+        except Exception as e:
+            logger.warning("Polaczenie z puli nie odpowiada, wymieniam: %s", e)
+            return await self._replace(db)
+
+    @asynccontextmanager
+    async def acquire(self):
+        """
+        Wypożycza połączenie z puli na czas bloku async with.
+
+        Po zwróceniu połączenia niezatwierdzona transakcja jest wycofywana,
+        aby kolejne żądanie dostało czyste połączenie.
+
+        Yields:
+            aiosqlite.Connection: Połączenie z puli
+
+        Raises:
+            PoolTimeoutError: Gdy żadne połączenie nie zwolniło się w acquire_timeout sekund
+        """
+        if self._closed:
+            raise RuntimeError("Pula polaczen jest zamknieta")
+
+        started = time.monotonic()
+        self._waiting += 1
+        try:
+            db, last_used = await asyncio.wait_for(self._idle.get(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self._timeouts_total += 1
+            raise PoolTimeoutError(
+                f"Brak wolnego polaczenia w puli po {self.acquire_timeout}s"
             )
-            print("Domyslne ubrania dodane")
+        finally:
+            self._waiting -= 1
+
+        waited = time.monotonic() - started
+        self._acquired_total += 1
+        self._wait_time_total += waited
+        self._wait_time_max = max(self._wait_time_max, waited)
+
+        try:
+            db = await self._health_check(db, last_used)
+        except Exception:
+            # Nie udało się nawet otworzyć nowego połączenia - oddaj stare do puli
+            self._idle.put_nowait((db, last_used))
+            raise
+
+        try:
+            yield db
+        finally:
+            await self._release(db)
+
+    async def _release(self, db: aiosqlite.Connection):
+        """Oddaje połączenie do puli, wycofując niezakończoną transakcję."""
+        if self._closed:
+            return
+
+        try:
+            if db.in_transaction:
+                await db.rollback()
+        except Exception as e:
+            logger.warning("Blad przy zwalnianiu polaczenia, wymieniam: %s", e)
+            db = await self._replace(db)
+
+        self._idle.put_nowait((db, time.monotonic()))
+
+    def stats(self) -> dict:
+        """
+        Zwraca statystyki puli.
+
+        Returns:
+            dict: Rozmiar puli, liczba wolnych/zajętych połączeń, liczba oczekujących
+                  oraz liczniki wypożyczeń, timeoutów i wymian połączeń
+        """
+        available = self._idle.qsize()
+        return {
+            "size": self.size,
+            "read_only": self.read_only,
+            "available": available,
+            "in_use": len(self._connections) - available,
+            "waiting": self._waiting,
+            "acquired_total": self._acquired_total,
+            "timeouts_total": self._timeouts_total,
+            "replaced_total": self._replaced_total,
+            "avg_wait_ms": round(self._wait_time_total / self._acquired_total * 1000, 3)
+            if self._acquired_total else 0.0,
+            "max_wait_ms": round(self._wait_time_max * 1000, 3),
+        }
+
+
+# Globalna pula tworzona w lifespan aplikacji
+_pool: Optional[ConnectionPool] = None
+
+
+async def init_pool(size: int = DB_POOL_SIZE):
+    """
+    Tworzy i rozgrzewa globalną pulę połączeń tylko do odczytu.
+
+    Wywoływane w lifespan aplikacji po inicjalizacji bazy danych i uruchomieniu
+    DatabaseWriter (połączenia tylko do odczytu wymagają istniejących plików WAL).
+
+    Args:
+        size (int, optional): Liczba połączeń w puli. Domyślnie DB_POOL_SIZE.
+    """
+    global _pool
+    if _pool is not None:
+        return
+
+    pool = ConnectionPool(size=size, read_only=True)
+    await pool.open()
+    _pool = pool
+
+
+async def close_pool():
+    """Zamyka globalną pulę połączeń (przy zamykaniu aplikacji)."""
+    global _pool
+    if _pool is None:
+        return
+
+    pool, _pool = _pool, None
+    await pool.close()
+
+
+def get_pool_stats() -> Optional[dict]:
+    """
+    Zwraca statystyki globalnej puli połączeń.
+
+    Returns:
+        dict | None: Statystyki puli lub None jeśli pula nie została utworzona
+    """
+    return _pool.stats() if _pool is not None else None
+
+
+@asynccontextmanager
+async def get_connection():
+    """
+    Wypożycza połączenie do odczytu z puli.
+
+    Jeśli pula nie została utworzona (np. uruchomienie skryptu poza aplikacją),
+    otwiera jednorazowe połączenie z taką samą konfiguracją. Czas zapytań
+    jest mierzony (TimedConnection) na potrzeby /api/metrics.
 
+    Yields:
+        TimedConnection: Połączenie z bazą danych (interfejs aiosqlite.Connection)
+
+    Example:
+        async with get_connection() as db:
+            cursor = await db.execute("SELECT * FROM users")
+    """
+    if _pool is not None:
+        async with _pool.acquire() as db:
+            yield TimedConnection(db)
+        return
+
+    db = await _open_connection()
+    try:
+        yield TimedConnection(db)
+    finally:
+        await db.close()
+
+
+# ============================================
+# KOLEJKA ZAPISÓW (POJEDYNCZY WRITER)
+# ============================================
+
+class DatabaseWriter:
+    """
+    Jedyne połączenie zapisujące aplikacji, zasilane kolejką asyncio.
+
+    Każda operacja zapisu to funkcja async przyjmująca połączenie (nie może sama
+    wywoływać commit). Writer stosuje group commit: operacje, które napłyną w ciągu
+    batch_window_ms od rozpoczęcia transakcji (maksymalnie batch_max), wykonuje
+    w jednej transakcji, każdą we własnym SAVEPOINT. Wyjątek wycofuje tylko
+    operację, która go zgłosiła. Po jednym wspólnym commicie writer przekazuje
+    wyniki i wyjątki do oczekujących żądań - liczba fsync przy szczycie ruchu
+    zależy od liczby partii, a nie od liczby żądań.
+
+    Dzięki pojedynczemu writerowi zapisy w procesie nigdy nie rywalizują o blokadę
+    bazy, a odczyty (na połączeniach z puli, w trybie WAL) nie czekają na zapisy.
+
+    Example:
+        writer = DatabaseWriter()
+        await writer.start()
+
+        async def add_coins(db):
+            await db.execute("UPDATE users SET coins = coins + 1 WHERE id = ?", (1,))
+
+        await writer.submit(add_coins)
+        await writer.stop()
+    """
+
+    def __init__(self, queue_size: int = DB_WRITE_QUEUE_SIZE,
+                 batch_window_ms: float = DB_WRITE_BATCH_WINDOW_MS,
+                 batch_max: int = DB_WRITE_BATCH_MAX):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._db: Optional[aiosqlite.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batch_window = batch_window_ms / 1000
+        self.batch_max = max(1, batch_max)
+
+        # Statystyki writera
+        self._completed_total = 0
+        self._failed_total = 0
+        self._batches_total = 0
+        self._batch_size_max = 0
+        self._busy_time_total = 0.0
+
+    async def start(self):
+        """Otwiera połączenie zapisujące i uruchamia zadanie obsługi kolejki."""
+        self._db = await _open_connection()
+        await self._db.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+        self._task = asyncio.create_task(self._run())
+        logger.info("Writer bazy danych uruchomiony")
+
+    async def stop(self):
+        """Czeka na wykonanie zakolejkowanych zapisów i zamyka połączenie."""
+        if self._task is None:
+            return
+
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        await self._db.close()
+        self._db = None
+        logger.info("Writer bazy danych zatrzymany")
+
+    async def submit(self, work):
+        """
+        Dodaje operację zapisu do kolejki i czeka na jej wynik.
+
+        Args:
+            work: Funkcja async przyjmująca aiosqlite.Connection
+
+        Returns:
+            Any: Wartość zwrócona przez work (po zatwierdzeniu transakcji)
+
+        Raises:
+            Exception: Wyjątek zgłoszony przez work (transakcja jest wtedy wycofana)
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((work, future))
+        return await future
+
+    async def _run(self):
+        """Pętla obsługi kolejki - każda partia operacji kończy się jednym commitem."""
+        while True:
+            first_job = await self._queue.get()
+            batch = []
+            try:
+                await self._run_batch(first_job, batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _next_job(self, deadline: float):
+        """Pobiera kolejną operację do bieżącej partii lub None po upływie okna."""
+        try:
+            return self._queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            return None
+
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def _run_batch(self, first_job, batch: list):
+        """
+        Wykonuje partię operacji w jednej transakcji.
+
+        Operacje są wykonywane od razu po pobraniu z kolejki, a okno zbierania
+        liczy się od startu transakcji, więc pojedynczy zapis przy małym ruchu
+        czeka co najwyżej batch_window.
+        """
+        started = time.monotonic()
+        deadline = started + self.batch_window
+        outcomes = []
+
+        batch.append(first_job)
+        try:
+            await self._db.execute("BEGIN IMMEDIATE")
+            outcomes.append(await self._execute(first_job[0]))
+
+            while len(batch) < self.batch_max:
+                job = await self._next_job(deadline)
+                if job is None:
+                    break
+                batch.append(job)
+                outcomes.append(await self._execute(job[0]))
+
+            commit_started = time.perf_counter()
+            await self._db.commit()
+            record_query("COMMIT", time.perf_counter() - commit_started)
+        except Exception as e:
+            # Nieudany commit (lub błąd samej transakcji) - cała partia jest wycofana
+            logger.error("Blad zatwierdzania partii zapisow (%s operacji): %s", len(batch), e)
+            try:
+                await self._db.rollback()
+            except Exception as rollback_error:
+                logger.error("Blad wycofywania partii zapisow: %s", rollback_error)
+            outcomes = [(False, e)] * len(batch)
+        finally:
+            self._busy_time_total += time.monotonic() - started
+
+        self._batches_total += 1
+        self._batch_size_max = max(self._batch_size_max, len(batch))
+
+        # Wyniki są przekazywane dopiero po zatwierdzeniu transakcji
+        for (_, future), (succeeded, value) in zip(batch, outcomes):
+            if succeeded:
+                self._completed_total += 1
+            else:
+                self._failed_total += 1
+
+            if future.done():
+                continue
+            if succeeded:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    async def _execute(self, work) -> tuple:
+        """
+        Wykonuje jedną operację we własnym SAVEPOINT trwającej transakcji.
+
+        Returns:
+            tuple: (True, wynik) po sukcesie lub (False, wyjątek) gdy operacja
+                   zgłosiła wyjątek i jej zmiany zostały wycofane
+        """
+        await self._db.execute("SAVEPOINT write_operation")
+        try:
+            result = await work(self._db)
+        except Exception as e:
+            await self._db.execute("ROLLBACK TO SAVEPOINT write_operation")
+            await self._db.execute("RELEASE SAVEPOINT write_operation")
+            return False, e
+
+        await self._db.execute("RELEASE SAVEPOINT write_operation")
+        return True, result
+
+    def stats(self) -> dict:
+        """
+        Zwraca statystyki writera.
+
+        Returns:
+            dict: Długość kolejki, liczniki wykonanych i nieudanych operacji
+                  oraz statystyki partii (group commit)
+        """
+        executed = self._completed_total + self._failed_total
+        return {
+            "queue_depth": self._queue.qsize(),
+            "completed_total": self._completed_total,
+            "failed_total": self._failed_total,
+            "batches_total": self._batches_total,
+            "avg_batch_size": round(executed / self._batches_total, 2) if self._batches_total else 0.0,
+            "max_batch_size": self._batch_size_max,
+            "avg_batch_ms": round(self._busy_time_total / self._batches_total * 1000, 3)
+            if self._batches_total else 0.0,
+        }
+
+
+# Globalny writer tworzony w lifespan aplikacji
+_writer: Optional[DatabaseWriter] = None
+
+
+async def start_writer():
+    """Uruchamia globalny DatabaseWriter (w lifespan aplikacji)."""
+    global _writer
+    if _writer is not None:
+        return
+
+    writer = DatabaseWriter()
+    await writer.start()
+    _writer = writer
+
+
+async def stop_writer():
+    """Zatrzymuje globalny DatabaseWriter po opróżnieniu kolejki."""
+    global _writer
+    if _writer is None:
+        return
+
+    writer, _writer = _writer, None
+    await writer.stop()
+
+
+def get_writer_stats() -> Optional[dict]:
+    """
+    Zwraca statystyki globalnego writera.
+
+    Returns:
+        dict | None: Statystyki writera lub None jeśli writer nie został uruchomiony
+    """
+    return _writer.stats() if _writer is not None else None
+
+
+async def run_write(work):
+    """
+    Wykonuje operację zapisu atomowo na połączeniu zapisującym.
+
+    Operacja trafia do kolejki writera i może zostać zatwierdzona wspólnym commitem
+    z innymi operacjami (group commit); wynik jest zwracany dopiero po commicie.
+    Jeśli writer nie został uruchomiony (np. skrypt poza aplikacją), operacja
+    jest wykonywana na jednorazowym połączeniu z taką samą semantyką transakcji.
+
+    Args:
+        work: Funkcja async przyjmująca aiosqlite.Connection; może zarówno
+            czytać, jak i zapisywać - wszystko dzieje się atomowo. Nie może
+            wywoływać commit ani rollback.
+
+    Returns:
+        Any: Wartość zwrócona przez work
+
+    Raises:
+        Exception: Wyjątek zgłoszony przez work (zmiany są wtedy wycofane)
+
+    Example:
+        async def _transaction(db):
+            cursor = await db.execute("UPDATE users SET coins = coins + 5 WHERE id = ?", (1,))
+            return cursor.rowcount
+
+        changed = await run_write(_transaction)
+    """
+    # Zapytania operacji są mierzone i przypisywane żądaniu, które ją zleciło
+    work = timed_work(work)
+
+    if _writer is not None:
+        return await _writer.submit(work)
+
+    db = await _open_connection()
+    try:
+        result = await work(db)
         await db.commit()
-        print("Baza danych zostala zainicjalizowana pomyslnie")
+        return result
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
 
 
 # ============================================
@@ -263,23 +1075,101 @@ async def get_db():
     """
     Generator bazy danych dla dependency injection w FastAPI.
 
-    Tworzy połączenie z bazą danych z włączonymi kluczami obcymi
-    i konfiguracją row_factory dla łatwiejszego dostępu do kolumn
-    przez nazwę zamiast indeks.
+    Wypożycza połączenie tylko do odczytu z puli (z row_factory ustawionym na
+    aiosqlite.Row) na czas obsługi żądania i oddaje je po jego zakończeniu.
+    Zapisy należy wykonywać przez run_write.
 
     Yields:
         aiosqlite.Connection: Połączenie z bazą danych gotowe do użycia
 
     Example:
-        async for db in get_db():
-            result = await db.execute("SELECT * FROM users")
+        @app.get("/api/users")
+        async def get_users(db: aiosqlite.Connection = Depends(get_db)):
+            cursor = await db.execute("SELECT * FROM users")
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
-        db.row_factory = aiosqlite.Row
+    async with get_connection() as db:
         yield db
 
 
+# ============================================
+# DORADCA PLANÓW ZAPYTAŃ
+# ============================================
+
+# Czy sprawdzać plany zarejestrowanych zapytań przy starcie aplikacji
+DB_QUERY_PLAN_CHECK = os.environ.get("DB_QUERY_PLAN_CHECK", "1") != "0"
+
+# Zapytania produkcyjne: nazwa -> (sql, czy pełny skan tabeli jest dozwolony)
+QUERY_REGISTRY: dict = {}
+
+
+def register_query(name: str, sql: str, allow_scan: bool = False) -> str:
+    """
+    Rejestruje zapytanie produkcyjne do sprawdzenia przez check_query_plans.
+
+    Args:
+        name (str): Unikalna nazwa zapytania (używana w logach i jako etykieta metryk)
+        sql (str): Treść zapytania z parametrami "?"
+        allow_scan (bool, optional): Czy pełny skan jest zamierzony (np. mały
+            katalog). Domyślnie False.
+
+    Returns:
+        str: Niezmienione zapytanie - pozwala zarejestrować stałą w miejscu definicji
+
+    Example:
+        HABIT_OWNER_SQL = register_query(
+            "habit_owner",
+            "SELECT id FROM habits WHERE id = ? AND user_id = ?"
+        )
+    """
+    if name in QUERY_REGISTRY and QUERY_REGISTRY[name][0] != sql:
+        raise ValueError(f"Zapytanie '{name}' jest juz zarejestrowane")
+
+    QUERY_REGISTRY[name] = (sql, allow_scan)
+    register_query_label(sql, name)
+    return sql
+
+
+async def check_query_plans() -> dict:
+    """
+    Uruchamia EXPLAIN QUERY PLAN dla każdego zarejestrowanego zapytania.
+
+    Każdy krok planu typu SCAN (pełny przegląd tabeli lub indeksu) w zapytaniu,
+    które nie ma ustawionego allow_scan, jest logowany jako ostrzeżenie - nowe
+    zapytanie nie może więc niezauważenie dodać skanu tabeli rosnącej wraz z
+    liczbą wykonań.
+
+    Returns:
+        dict: Nazwa zapytania -> lista kroków SCAN (tylko zapytania z problemami)
+    """
+    problems = {}
+
+    async with get_connection() as db:
+        for name, (sql, allow_scan) in QUERY_REGISTRY.items():
+            try:
+                cursor = await db.execute(f"EXPLAIN QUERY PLAN {sql}", (None,) * sql.count("?"))
+                plan = [row[3] for row in await cursor.fetchall()]
+            except Exception as e:
+                logger.warning("Nie udalo sie sprawdzic planu zapytania '%s': %s", name, e)
+                continue
+
+            # SCAN (subquery-N) i SCAN <nazwa CTE> czytają wynik podzapytania
+            # (co-routine lub zmaterializowany), nie tabelę, a SCAN json_each -
+            # listę przekazaną w parametrze (np. ID nawyków)
+            subqueries = {step.split(" ", 1)[1] for step in plan
+                          if step.startswith(("CO-ROUTINE ", "MATERIALIZE "))}
+            scans = [step for step in plan
+                     if step.startswith("SCAN ") and step != "SCAN CONSTANT ROW"
+                     and not step.startswith("SCAN (subquery")
+                     and not step.startswith("SCAN json_each")
+                     and step[len("SCAN "):] not in subqueries]
+            if scans and not allow_scan:
+                problems[name] = scans
+                logger.warning("Zapytanie '%s' wykonuje pelny skan: %s", name, "; ".join(scans))
+
+    logger.info("Sprawdzono plany %s zapytan, problemy: %s", len(QUERY_REGISTRY), len(problems))
+    return problems
+
+
 # ============================================
 # FUNKCJE POMOCNICZE - ZAPYTANIA SQL
 # ============================================
@@ -289,7 +1179,7 @@ async def execute_query(query: str, params: tuple = ()) -> int:
     Wykonuje zapytanie SQL modyfikujące dane.
 
     Funkcja obsługuje zapytania typu INSERT, UPDATE, DELETE
-    i zwraca liczbę zmienionych wierszy.
+    i zwraca liczbę zmienionych wierszy. Zapytanie trafia do kolejki zapisów.
 
     Args:
         query (str): Zapytanie SQL do wykonania
@@ -308,12 +1198,12 @@ async def execute_query(query: str, params: tuple = ()) -> int:
         )
         print(f"Dodano {count} uzytkownika")
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
+    async def _transaction(db):
         cursor = await db.execute(query, params)
-        await db.commit()
         return cursor.rowcount
 
+    return await run_write(_transaction)
+
 
 async def fetch_one(query: str, params: tuple = ()):
     """
@@ -337,9 +1227,7 @@ async def fetch_one(query: str, params: tuple = ()):
         if user:
             print(f"Znaleziono uzytkownika: {user['username']}")
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
-        db.row_factory = aiosqlite.Row
+    async with get_connection() as db:
         cursor = await db.execute(query, params)
         return await cursor.fetchone()
 
@@ -363,9 +1251,7 @@ async def fetch_all(query: str, params: tuple = ()):
         for user in users:
             print(f"Uzytkownik {user['username']} ma {user['coins']} monet")
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
-        db.row_factory = aiosqlite.Row
+    async with get_connection() as db:
         cursor = await db.execute(query, params)
         return await cursor.fetchall()
 
@@ -391,8 +1277,7 @@ async def fetch_one_value(query: str, params: tuple = ()):
         total_users = await fetch_one_value("SELECT COUNT(*) FROM users")
         print(f"Lacznie uzytkownikow: {total_users}")
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
+    async with get_connection() as db:
         cursor = await db.execute(query, params)
         result = await cursor.fetchone()
         return result[0] if result else None
@@ -429,19 +1314,300 @@ async def create_user_habi_status(user_id: int):
     return await execute_query(query, (user_id,))
 
 
+USER_DATA_VERSION_SQL = register_query(
+    "user_data_version",
+    "SELECT data_version FROM users WHERE id = ?"
+)
+
+BUMP_DATA_VERSION_SQL = register_query(
+    "bump_data_version",
+    "UPDATE users SET data_version = data_version + 1 WHERE id = ?"
+)
+
+
+async def get_data_version(db: aiosqlite.Connection, user_id: int) -> Optional[int]:
+    """
+    Pobiera wersję danych użytkownika.
+
+    Wersja rośnie przy każdej zmianie danych użytkownika (nawyki, wykonania,
+    monety, ubrania, automat), więc nadaje się na podstawę ETagów.
+
+    Args:
+        db (aiosqlite.Connection): Połączenie z bazą danych
+        user_id (int): ID użytkownika
+
+    Returns:
+        Optional[int]: Wersja danych lub None gdy użytkownik nie istnieje
+    """
+    cursor = await db.execute(USER_DATA_VERSION_SQL, (user_id,))
+    row = await cursor.fetchone()
+    return row[0] if row else None
+
+
+async def bump_data_version(db: aiosqlite.Connection, user_id: int):
+    """
+    Zwiększa wersję danych użytkownika.
+
+    Wywoływana wewnątrz jednostki zapisu (run_write), więc nowa wersja staje
+    się widoczna razem ze zmianą, którą opisuje.
+
+    Args:
+        db (aiosqlite.Connection): Połączenie zapisujące
+        user_id (int): ID użytkownika
+
+    Example:
+        async def _transaction(db):
+            await db.execute("UPDATE users SET coins = coins + 5 WHERE id = ?", (1,))
+            await bump_data_version(db, 1)
+
+        await run_write(_transaction)
+    """
+    await db.execute(BUMP_DATA_VERSION_SQL, (user_id,))
+
+
+# ============================================
+# DZIENNIK ZMIAN (SYNCHRONIZACJA DELTA)
+# ============================================
+# Zmiany encji (nawyki, wykonania, zakupy ubrań) są zapisywane w user_changes
+# z wersją danych użytkownika po zmianie, w tej samej transakcji co zmiana -
+# kursorem synchronizacji jest więc data_version. Stan pojedynczy (saldo monet,
+# noszone ubranie) nie trafia do dziennika: odpowiedź synchronizacji zawsze
+# niesie jego bieżącą wartość.
+
+# Kompakcja: wpisy starsze niż SYNC_LOG_RETENTION_DAYS dni lub ponad
+# SYNC_LOG_MAX_ENTRIES najnowszych na użytkownika są usuwane co
+# SYNC_LOG_COMPACT_INTERVAL sekund (0 - wyłączona), a próg change_log_floor
+# rośnie do najwyższej usuniętej wersji
+SYNC_LOG_RETENTION_DAYS = int(os.environ.get("SYNC_LOG_RETENTION_DAYS", "30"))
+SYNC_LOG_MAX_ENTRIES = int(os.environ.get("SYNC_LOG_MAX_ENTRIES", "1000"))
+SYNC_LOG_COMPACT_INTERVAL = float(os.environ.get("SYNC_LOG_COMPACT_INTERVAL", "3600"))
+
+# Wersja jest czytana z wiersza użytkownika, więc wpis trzeba dodać po zwiększeniu
+# data_version w tej samej transakcji
+LOG_CHANGES_SQL = register_query("log_changes", """
+    INSERT INTO user_changes (user_id, version, kind, entity_id, data)
+    SELECT users.id, users.data_version, ?,
+           json_extract(json_each.value, '$[0]'), json_extract(json_each.value, '$[1]')
+    FROM users, json_each(?)
+    WHERE users.id = ?
+""")
+
+USER_SYNC_STATE_SQL = register_query("user_sync_state", """
+    SELECT coins, current_clothing_id, data_version, change_log_floor
+    FROM users
+    WHERE id = ?
+""")
+
+USER_CHANGES_SINCE_SQL = register_query("user_changes_since", """
+    SELECT version, kind, entity_id, data
+    FROM user_changes
+    WHERE user_id = ? AND version > ? AND version <= ?
+    ORDER BY version, id
+""")
+
+# Wpisy nawyku usuniętego później są zbędne - klient, który go zna, dostanie
+# habit_deleted, a klient, który go nie zna, nie potrzebuje jego historii
+COMPACT_DELETED_HABITS_SQL = register_query("compact_deleted_habits", """
+    DELETE FROM user_changes
+    WHERE kind IN ('habit_created', 'habit_completed')
+      AND EXISTS (
+          SELECT 1 FROM user_changes AS deleted
+          WHERE deleted.user_id = user_changes.user_id
+            AND deleted.kind = 'habit_deleted'
+            AND deleted.entity_id = user_changes.entity_id
+            AND deleted.id > user_changes.id
+      )
+""", allow_scan=True)
+
+# Wpisy do usunięcia: starsze niż okno retencji lub ponad limit najnowszych na
+# użytkownika. Zapytania zaczynają się od UPDATE / DELETE (a nie WITH), aby
+# sqlite3 raportował rowcount.
+_EXPIRED_CHANGES_SQL = """
+    SELECT id, user_id, version
+    FROM (
+        SELECT id, user_id, version, created_at,
+               ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY id DESC) AS newer
+        FROM user_changes
+    )
+    WHERE newer > ? OR created_at < datetime('now', ?)"""
+
+RAISE_CHANGE_LOG_FLOOR_SQL = register_query("raise_change_log_floor", f"""
+    UPDATE users
+    SET change_log_floor = MAX(change_log_floor, expired.version)
+    FROM (
+        SELECT user_id, MAX(version) AS version
+        FROM ({_EXPIRED_CHANGES_SQL})
+        GROUP BY user_id
+    ) AS expired
+    WHERE users.id = expired.user_id
+""", allow_scan=True)
+
+DELETE_EXPIRED_CHANGES_SQL = register_query("delete_expired_changes", f"""
+    DELETE FROM user_changes WHERE id IN (SELECT id FROM ({_EXPIRED_CHANGES_SQL}))
+""", allow_scan=True)
+
+
+async def log_changes(db: aiosqlite.Connection, user_id: int, kind: str, entries: list):
+    """
+    Dopisuje zmiany jednego rodzaju do dziennika zmian użytkownika (jednym zapytaniem).
+
+    Wywoływana wewnątrz jednostki zapisu (run_write), po zwiększeniu wersji
+    danych - wpisy dostają wersję, którą zobaczy klient.
+
+    Args:
+        db (aiosqlite.Connection): Połączenie zapisujące
+        user_id (int): ID użytkownika
+        kind (str): Rodzaj zmiany: "habit_created", "habit_deleted",
+            "habit_completed" lub "clothing_purchased"
+        entries (list): Pary (ID encji, słownik danych lub None)
+
+    Example:
+        async def _transaction(db):
+            await db.execute("UPDATE habits SET is_active = 0 WHERE id = ?", (5,))
+            await bump_data_version(db, 1)
+            await log_changes(db, 1, "habit_deleted", [(5, None)])
+
+        await run_write(_transaction)
+    """
+    if entries:
+        await db.execute(LOG_CHANGES_SQL, (kind, json.dumps([list(entry) for entry in entries]), user_id))
+
+
+async def get_user_changes(db: aiosqlite.Connection, user_id: int, since: int, until: int) -> list:
+    """
+    Pobiera zmiany użytkownika o wersjach z przedziału (since, until].
+
+    Args:
+        db (aiosqlite.Connection): Połączenie z bazą danych
+        user_id (int): ID użytkownika
+        since (int): Kursor klienta (wersja, którą już zna)
+        until (int): Bieżąca wersja danych (odczytana w tej samej transakcji)
+
+    Returns:
+        list: Słowniki z kluczami version, kind, entity_id i data (zdekodowany JSON)
+    """
+    cursor = await db.execute(USER_CHANGES_SINCE_SQL, (user_id, since, until))
+    return [
+        {
+            "version": row["version"],
+            "kind": row["kind"],
+            "entity_id": row["entity_id"],
+            "data": json.loads(row["data"]) if row["data"] else None
+        }
+        for row in await cursor.fetchall()
+    ]
+
+
+async def compact_change_log() -> dict:
+    """
+    Kompaktuje dziennik zmian wszystkich użytkowników.
+
+    Usuwa wpisy nawyków usuniętych później (bez wpływu na kursory), a następnie
+    wpisy starsze niż SYNC_LOG_RETENTION_DAYS dni lub ponad SYNC_LOG_MAX_ENTRIES
+    najnowszych na użytkownika - wtedy change_log_floor użytkownika rośnie
+    i kursory poniżej progu dostają pełny snapshot.
+
+    Returns:
+        dict: Liczba usuniętych wpisów (superseded, expired)
+    """
+    async def _transaction(db):
+        cursor = await db.execute(COMPACT_DELETED_HABITS_SQL)
+        superseded = cursor.rowcount
+        params = (SYNC_LOG_MAX_ENTRIES, f"-{SYNC_LOG_RETENTION_DAYS} days")
+        await db.execute(RAISE_CHANGE_LOG_FLOOR_SQL, params)
+        cursor = await db.execute(DELETE_EXPIRED_CHANGES_SQL, params)
+        return {"superseded": superseded, "expired": cursor.rowcount}
+
+    result = await run_write(_transaction)
+    logger.info("Kompakcja dziennika zmian: usunieto %s zbednych i %s starych wpisow",
+                result["superseded"], result["expired"])
+    return result
+
+
+_compaction_task: Optional[asyncio.Task] = None
+
+
+async def _compaction_loop():
+    """Uruchamia compact_change_log co SYNC_LOG_COMPACT_INTERVAL sekund."""
+    while True:
+        try:
+            await compact_change_log()
+        except Exception as e:
+            logger.error("Blad kompakcji dziennika zmian: %s", e)
+        await asyncio.sleep(SYNC_LOG_COMPACT_INTERVAL)
+
+
+def start_change_log_compaction():
+    """Uruchamia okresową kompakcję dziennika zmian (w lifespan, po start_writer)."""
+    global _compaction_task
+    if _compaction_task is None and SYNC_LOG_COMPACT_INTERVAL > 0:
+        _compaction_task = asyncio.create_task(_compaction_loop())
+
+
+async def stop_change_log_compaction():
+    """Zatrzymuje okresową kompakcję dziennika zmian (przed stop_writer)."""
+    global _compaction_task
+    if _compaction_task is None:
+        return
+
+    task, _compaction_task = _compaction_task, None
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
 # ============================================
 # FUNKCJE DLA NAWYKÓW
 # ============================================
 
-async def get_user_habits_with_completions(user_id: int):
+# Domyślne okno historii wykonań na liście nawyków (widok tygodnia w HabitTracker)
+HABITS_COMPLETION_WINDOW_DAYS = int(os.environ.get("HABITS_COMPLETION_WINDOW_DAYS", "7"))
+
+# Największa liczba nawyków w jednym wsadowym wykonaniu (kolejka offline frontendu)
+MAX_COMPLETION_BATCH_SIZE = int(os.environ.get("MAX_COMPLETION_BATCH_SIZE", "100"))
+
+# Synchronizacja offline: ile dni wstecz (i naprzód - strefa czasowa klienta
+# może wyprzedzać serwer) może mieć data wykonania, największy wsad oraz jak
+# długo pamiętane są klucze idempotencji (dłużej niż okno dat)
+SYNC_MAX_PAST_DAYS = int(os.environ.get("SYNC_MAX_PAST_DAYS", "7"))
+SYNC_MAX_FUTURE_DAYS = int(os.environ.get("SYNC_MAX_FUTURE_DAYS", "1"))
+MAX_SYNC_BATCH_SIZE = int(os.environ.get("MAX_SYNC_BATCH_SIZE", "500"))
+SYNC_KEY_RETENTION_DAYS = int(os.environ.get("SYNC_KEY_RETENTION_DAYS", "30"))
+
+# Daty wykonań tylko od podanej daty (zakres na indeksie UNIQUE habit_completions
+# (habit_id, user_id, completed_at)); liczba wszystkich wykonań pochodzi
+# z habit_statistics, więc koszt nie rośnie z wiekiem konta.
+USER_HABITS_WITH_COMPLETIONS_SQL = register_query("user_habits_with_completions", """
+    SELECT h.id, h.name, h.description, h.reward_coins, h.is_active, h.created_at,
+           COALESCE(h.icon, 'target') as icon,
+           COALESCE(hs.total_completions, 0) as completion_count,
+           GROUP_CONCAT(hc.completed_at) as completion_dates
+    FROM habits h
+    LEFT JOIN habit_statistics hs ON hs.user_id = h.user_id AND hs.habit_id = h.id
+    LEFT JOIN habit_completions hc
+           ON hc.habit_id = h.id
+          AND hc.user_id = h.user_id
+          AND hc.completed_at >= ?
+    WHERE h.user_id = ? AND h.is_active = 1
+    GROUP BY h.id
+    ORDER BY h.created_at DESC
+""")
+
+
+async def get_user_habits_with_completions(user_id: int, since: Optional[str] = None):
     """
-    Pobiera wszystkie aktywne nawyki użytkownika wraz z historią wykonań.
+    Pobiera wszystkie aktywne nawyki użytkownika wraz z wykonaniami z okna czasowego.
 
-    Funkcja łączy tabele habits i habit_completions, aby zwrócić
-    pełne informacje o nawykach wraz z datami ich wykonań.
+    Funkcja łączy tabele habits, habit_statistics i habit_completions, aby zwrócić
+    informacje o nawykach wraz z datami wykonań od podanej daty oraz łączną
+    liczbą wykonań.
 
     Args:
         user_id (int): ID użytkownika
+        since (str, optional): Najwcześniejsza data wykonania (YYYY-MM-DD).
+            Domyślnie ostatnie HABITS_COMPLETION_WINDOW_DAYS dni.
 
     Returns:
         List[aiosqlite.Row]: Lista nawyków z następującymi kolumnami:
@@ -452,27 +1618,26 @@ async def get_user_habits_with_completions(user_id: int):
             - is_active: Czy nawyk jest aktywny
             - created_at: Data utworzenia
             - icon: Ikona nawyku
-            - completion_dates: Daty wykonań (oddzielone przecinkami)
+            - completion_count: Łączna liczba wykonań
+            - completion_dates: Daty wykonań w oknie (oddzielone przecinkami)
 
     Raises:
         aiosqlite.Error: Gdy wystąpi błąd podczas pobierania danych
 
     Example:
-        habits = await get_user_habits_with_completions(1)
+        habits = await get_user_habits_with_completions(1, since="2024-01-01")
         for habit in habits:
             print(f"Nawyk: {habit['name']}, wykonania: {habit['completion_dates']}")
     """
-    query = """
-        SELECT h.id, h.name, h.description, h.reward_coins, h.is_active, h.created_at,
-               COALESCE(h.icon, 'target') as icon,
-               GROUP_CONCAT(hc.completed_at) as completion_dates
-        FROM habits h
-        LEFT JOIN habit_completions hc ON h.id = hc.habit_id
-        WHERE h.user_id = ? AND h.is_active = 1
-        GROUP BY h.id, h.name, h.description, h.reward_coins, h.is_active, h.created_at, h.icon
-        ORDER BY h.created_at DESC
-    """
-    return await fetch_all(query, (user_id,))
+    if since is None:
+        since = (date.today() - timedelta(days=HABITS_COMPLETION_WINDOW_DAYS - 1)).isoformat()
+    return await fetch_all(USER_HABITS_WITH_COMPLETIONS_SQL, (since, user_id))
+
+
+HABIT_COMPLETED_ON_DATE_SQL = register_query("habit_completed_on_date", """
+    SELECT 1 FROM habit_completions
+    WHERE habit_id = ? AND user_id = ? AND completed_at = ?
+""")
 
 
 async def check_habit_completed_today(habit_id: int, user_id: int, today: str) -> bool:
@@ -499,11 +1664,7 @@ async def check_habit_completed_today(habit_id: int, user_id: int, today: str) -
         else:
             print("Nawyk jeszcze nie wykonany.")
     """
-    query = """
-        SELECT 1 FROM habit_completions 
-        WHERE habit_id = ? AND user_id = ? AND completed_at = ?
-    """
-    result = await fetch_one_value(query, (habit_id, user_id, today))
+    result = await fetch_one_value(HABIT_COMPLETED_ON_DATE_SQL, (habit_id, user_id, today))
     return result is not None
 
 
@@ -511,14 +1672,48 @@ async def check_habit_completed_today(habit_id: int, user_id: int, today: str) -
 # FUNKCJE DLA STATYSTYK NAWYKÓW
 # ============================================
 
-async def update_habit_statistics(user_id: int, habit_id: int, completion_date: str):
+# Nowa długość serii po wykonaniu nawyku w dniu excluded.last_completion_date:
+# dzień po poprzednim wykonaniu - kontynuacja, późniejszy dzień - nowa seria,
+# ten sam lub wcześniejszy dzień - seria bez zmian
+_STREAK_AFTER_COMPLETION_SQL = """
+    CASE
+        WHEN last_completion_date IS NULL THEN 1
+        WHEN julianday(excluded.last_completion_date) - julianday(last_completion_date) = 1
+            THEN current_streak + 1
+        WHEN julianday(excluded.last_completion_date) - julianday(last_completion_date) > 1
+            THEN 1
+        ELSE current_streak
+    END"""
+
+UPSERT_HABIT_STATISTICS_SQL = register_query("upsert_habit_statistics", f"""
+    INSERT INTO habit_statistics
+        (user_id, habit_id, total_completions, current_streak, longest_streak, last_completion_date)
+    VALUES (?, ?, 1, 1, 1, ?)
+    ON CONFLICT (user_id, habit_id) DO UPDATE SET
+        total_completions = total_completions + 1,
+        current_streak = {_STREAK_AFTER_COMPLETION_SQL},
+        longest_streak = MAX(longest_streak, {_STREAK_AFTER_COMPLETION_SQL}),
+        last_completion_date = excluded.last_completion_date,
+        updated_at = CURRENT_TIMESTAMP
+""")
+
+
+async def update_habit_statistics(user_id: int, habit_id: int, completion_date: str,
+                                  db: Optional[aiosqlite.Connection] = None):
     """
     Aktualizuje statystyki nawyku po jego wykonaniu.
 
+    Statystyki są aktualizowane jednym zapytaniem INSERT ... ON CONFLICT, a seria
+    wykonań (streak) jest liczona po stronie SQL na podstawie poprzedniej daty
+    wykonania.
+
     Args:
         user_id (int): ID użytkownika
         habit_id (int): ID nawyku
         completion_date (str): Data wykonania w formacie ISO (YYYY-MM-DD)
+        db (aiosqlite.Connection, optional): Połączenie zapisujące, na którym wykonać
+            aktualizację w ramach trwającej transakcji. Domyślnie aktualizacja jest
+            wykonywana jako osobna operacja w kolejce zapisów.
 
     Returns:
         None
@@ -526,67 +1721,412 @@ async def update_habit_statistics(user_id: int, habit_id: int, completion_date:
     Raises:
         aiosqlite.Error: Gdy wystąpi błąd podczas aktualizacji
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
-        db.row_factory = aiosqlite.Row
+    if db is None:
+        async def _transaction(write_db):
+            await update_habit_statistics(user_id, habit_id, completion_date, write_db)
 
-        # Sprawdź czy statystyki dla tego nawyku już istnieją
-        cursor = await db.execute(
-            "SELECT * FROM habit_statistics WHERE user_id = ? AND habit_id = ?",
-            (user_id, habit_id)
-        )
-        stats = await cursor.fetchone()
+        await run_write(_transaction)
+        return
 
-        if not stats:
-            # Utwórz nowe statystyki
-            await db.execute(
-                """INSERT INTO habit_statistics 
-                   (user_id, habit_id, total_completions, current_streak, longest_streak, last_completion_date)
-                   VALUES (?, ?, 1, 1, 1, ?)""",
-                (user_id, habit_id, completion_date)
-            )
-            print(f"Utworzono nowe statystyki dla nawyku {habit_id}")
+    await db.execute(UPSERT_HABIT_STATISTICS_SQL, (user_id, habit_id, completion_date))
+
+
+INSERT_HABIT_COMPLETION_SQL = register_query("insert_habit_completion", """
+    INSERT INTO habit_completions (habit_id, user_id, completed_at, coins_earned)
+    SELECT id, user_id, ?, reward_coins
+    FROM habits
+    WHERE id = ? AND user_id = ? AND is_active = 1
+    RETURNING coins_earned,
+              (SELECT name FROM habits WHERE habits.id = habit_completions.habit_id) AS habit_name
+""")
+
+ADD_USER_COINS_SQL = register_query(
+    "add_user_coins",
+    "UPDATE users SET coins = coins + ?, data_version = data_version + 1 WHERE id = ? RETURNING coins"
+)
+
+
+async def record_habit_completion(db: aiosqlite.Connection, user_id: int, habit_id: int,
+                                  completion_date: str) -> Optional[dict]:
+    """
+    Zapisuje wykonanie nawyku, przyznaje monety i aktualizuje statystyki.
+
+    Cztery zapytania w ramach transakcji wywołującego (funkcja przeznaczona dla
+    run_write): wpis wykonania z monetami pobranymi z nawyku (tylko aktywnego
+    i należącego do użytkownika), upsert statystyk, aktualizacja monet
+    i wersji danych zwracająca nowe saldo przez RETURNING oraz wpis w dzienniku
+    zmian. Duplikat wykonania jest wykrywany przez ograniczenie UNIQUE tabeli
+    habit_completions.
+
+    Args:
+        db (aiosqlite.Connection): Połączenie zapisujące
+        user_id (int): ID użytkownika
+        habit_id (int): ID nawyku
+        completion_date (str): Data wykonania w formacie ISO (YYYY-MM-DD)
+
+    Returns:
+        dict | None: Klucze habit_name, coins_earned i total_coins
+                     lub None jeśli nawyk nie istnieje
+
+    Raises:
+        sqlite3.IntegrityError: Gdy nawyk został już wykonany w tym dniu
+
+    Example:
+        async def _transaction(db):
+            return await record_habit_completion(db, 1, 5, "2024-01-15")
+
+        completion = await run_write(_transaction)
+    """
+    cursor = await db.execute(INSERT_HABIT_COMPLETION_SQL, (completion_date, habit_id, user_id))
+    completion = await cursor.fetchone()
+
+    if not completion:
+        return None
+
+    await update_habit_statistics(user_id, habit_id, completion_date, db)
+
+    cursor = await db.execute(ADD_USER_COINS_SQL, (completion["coins_earned"], user_id))
+    user = await cursor.fetchone()
+
+    await log_changes(db, user_id, "habit_completed", [
+        (habit_id, {"date": completion_date, "coins_earned": completion["coins_earned"]})
+    ])
+
+    return {
+        "habit_name": completion["habit_name"],
+        "coins_earned": completion["coins_earned"],
+        "total_coins": user["coins"] if user else 0
+    }
+
+
+# Wersje wsadowe: lista ID nawyków jest przekazywana jako tablica JSON (json_each),
+# więc każda wielkość wsadu używa tego samego, sprawdzonego zapytania
+INSERT_HABIT_COMPLETIONS_BATCH_SQL = register_query("insert_habit_completions_batch", """
+    INSERT INTO habit_completions (habit_id, user_id, completed_at, coins_earned)
+    SELECT id, user_id, ?, reward_coins
+    FROM habits
+    WHERE id IN (SELECT value FROM json_each(?)) AND user_id = ? AND is_active = 1
+    ON CONFLICT DO NOTHING
+    RETURNING habit_id, coins_earned,
+              (SELECT name FROM habits WHERE habits.id = habit_completions.habit_id) AS habit_name
+""")
+
+# Tylko aktywne nawyki - usunięty nawyk trafia do not_found, jak w POST /api/habits/{id}/complete
+HABITS_COMPLETED_ON_DATE_SQL = register_query("habits_completed_on_date", """
+    SELECT habit_id FROM habit_completions
+    WHERE user_id = ? AND completed_at = ? AND habit_id IN (SELECT value FROM json_each(?))
+      AND habit_id IN (SELECT id FROM habits WHERE user_id = ? AND is_active = 1)
+""")
+
+UPSERT_HABIT_STATISTICS_BATCH_SQL = register_query("upsert_habit_statistics_batch", f"""
+    INSERT INTO habit_statistics
+        (user_id, habit_id, total_completions, current_streak, longest_streak, last_completion_date)
+    SELECT ?, value, 1, 1, 1, ?
+    FROM json_each(?)
+    WHERE true
+    ON CONFLICT (user_id, habit_id) DO UPDATE SET
+        total_completions = total_completions + 1,
+        current_streak = {_STREAK_AFTER_COMPLETION_SQL},
+        longest_streak = MAX(longest_streak, {_STREAK_AFTER_COMPLETION_SQL}),
+        last_completion_date = excluded.last_completion_date,
+        updated_at = CURRENT_TIMESTAMP
+""")
+
+USER_COINS_SQL = register_query("user_coins", "SELECT coins FROM users WHERE id = ?")
+
+
+async def record_habit_completions_batch(db: aiosqlite.Connection, user_id: int, habit_ids: list,
+                                         completion_date: str) -> dict:
+    """
+    Zapisuje wykonania wielu nawyków naraz, przyznaje monety i aktualizuje statystyki.
+
+    Wsadowy odpowiednik record_habit_completion (również dla run_write): jeden
+    INSERT wszystkich wykonań, jeden upsert statystyk, jedna aktualizacja monet
+    i jeden wpis dziennika zmian niezależnie od liczby nawyków. Nawyki już wykonane w tym dniu są pomijane
+    (ON CONFLICT DO NOTHING) zamiast przerywać cały wsad.
+
+    Args:
+        db (aiosqlite.Connection): Połączenie zapisujące
+        user_id (int): ID użytkownika
+        habit_ids (list): ID nawyków (powtórzenia są ignorowane)
+        completion_date (str): Data wykonania w formacie ISO (YYYY-MM-DD)
+
+    Returns:
+        dict: Klucze:
+            - results: Lista wyników w kolejności habit_ids, każdy z kluczami
+              habit_id i status ("completed", "already_completed", "not_found"),
+              a dla wykonanych także habit_name i coins_earned
+            - coins_earned: Suma przyznanych monet
+            - total_coins: Saldo monet po zapisie
+
+    Example:
+        async def _transaction(db):
+            return await record_habit_completions_batch(db, 1, [5, 6, 7], "2024-01-15")
+
+        batch = await run_write(_transaction)
+    """
+    habit_ids = list(dict.fromkeys(habit_ids))
+    ids_json = json.dumps(habit_ids)
+
+    cursor = await db.execute(INSERT_HABIT_COMPLETIONS_BATCH_SQL, (completion_date, ids_json, user_id))
+    completed = {row["habit_id"]: row for row in await cursor.fetchall()}
+
+    # nawyki bez nowego wpisu: wykonane już w tym dniu albo nieistniejące / nieaktywne
+    already_completed = set()
+    if len(completed) < len(habit_ids):
+        skipped = [habit_id for habit_id in habit_ids if habit_id not in completed]
+        cursor = await db.execute(HABITS_COMPLETED_ON_DATE_SQL,
+                                  (user_id, completion_date, json.dumps(skipped), user_id))
+        already_completed = {row["habit_id"] for row in await cursor.fetchall()}
+
+    coins_earned = sum(row["coins_earned"] for row in completed.values())
+    if completed:
+        await db.execute(UPSERT_HABIT_STATISTICS_BATCH_SQL, (user_id, completion_date, json.dumps(list(completed))))
+        cursor = await db.execute(ADD_USER_COINS_SQL, (coins_earned, user_id))
+    else:
+        cursor = await db.execute(USER_COINS_SQL, (user_id,))
+    user = await cursor.fetchone()
+
+    await log_changes(db, user_id, "habit_completed", [
+        (habit_id, {"date": completion_date, "coins_earned": row["coins_earned"]})
+        for habit_id, row in completed.items()
+    ])
+
+    results = []
+    for habit_id in habit_ids:
+        if habit_id in completed:
+            results.append({
+                "habit_id": habit_id,
+                "status": "completed",
+                "habit_name": completed[habit_id]["habit_name"],
+                "coins_earned": completed[habit_id]["coins_earned"]
+            })
+        elif habit_id in already_completed:
+            results.append({"habit_id": habit_id, "status": "already_completed"})
         else:
-            # Aktualizuj istniejące statystyki
-            total_completions = stats['total_completions'] + 1
-            current_streak = stats['current_streak']
-            longest_streak = stats['longest_streak']
-            last_date = stats['last_completion_date']
-
-            # Oblicz streak (seria wykonań)
-            from datetime import datetime as dt
-            if last_date:
-                last_date_obj = dt.fromisoformat(last_date).date()
-                current_date_obj = dt.fromisoformat(completion_date).date()
-                days_diff = (current_date_obj - last_date_obj).days
-
-                if days_diff == 1:
-                    # Kontynuacja streaka
-                    current_streak += 1
-                elif days_diff > 1:
-                    # Przerwany streak
-                    current_streak = 1
-                # days_diff == 0 oznacza że już było dzisiaj (nie powinno się zdarzyć)
-            else:
-                current_streak = 1
+            results.append({"habit_id": habit_id, "status": "not_found"})
 
-            # Aktualizuj najdłuższy streak
-            if current_streak > longest_streak:
-                longest_streak = current_streak
+    return {
+        "results": results,
+        "coins_earned": coins_earned,
+        "total_coins": user["coins"] if user else 0
+    }
 
-            await db.execute(
-                """UPDATE habit_statistics 
-                   SET total_completions = ?, 
-                       current_streak = ?, 
-                       longest_streak = ?,
-                       last_completion_date = ?,
-                       updated_at = CURRENT_TIMESTAMP
-                   WHERE user_id = ? AND habit_id = ?""",
-                (total_completions, current_streak, longest_streak, completion_date, user_id, habit_id)
-            )
-            print(f"Zaktualizowano statystyki dla nawyku {habit_id}: streak={current_streak}")
 
-        await db.commit()
+# ============================================
+# SYNCHRONIZACJA OFFLINE
+# ============================================
+
+SYNC_KEYS_SQL = register_query("sync_keys", """
+    SELECT idempotency_key, habit_id, completed_at, status
+    FROM sync_idempotency_keys
+    WHERE user_id = ? AND idempotency_key IN (SELECT value FROM json_each(?))
+""")
+
+# Pary [habit_id, data] jako tablica JSON; RETURNING zwraca tylko nowe wpisy
+INSERT_DATED_COMPLETIONS_SQL = register_query("insert_dated_completions", """
+    INSERT INTO habit_completions (habit_id, user_id, completed_at, coins_earned)
+    SELECT h.id, h.user_id, json_extract(json_each.value, '$[1]'), h.reward_coins
+    FROM json_each(?)
+    JOIN habits h ON h.id = json_extract(json_each.value, '$[0]')
+    WHERE h.user_id = ? AND h.is_active = 1
+    ON CONFLICT DO NOTHING
+    RETURNING habit_id, completed_at, coins_earned
+""")
+
+ACTIVE_USER_HABITS_IN_SQL = register_query("active_user_habits_in", """
+    SELECT id FROM habits
+    WHERE user_id = ? AND is_active = 1 AND id IN (SELECT value FROM json_each(?))
+""")
+
+INSERT_SYNC_KEY_SQL = register_query("insert_sync_key", """
+    INSERT INTO sync_idempotency_keys (user_id, idempotency_key, habit_id, completed_at, status)
+    VALUES (?, ?, ?, ?, ?)
+""")
+
+DELETE_EXPIRED_SYNC_KEYS_SQL = register_query("delete_expired_sync_keys", """
+    DELETE FROM sync_idempotency_keys
+    WHERE user_id = ? AND created_at < datetime('now', ?)
+""")
+
+# Statystyki od nowa dla wybranych nawyków (gaps-and-islands): kolejne dni
+# wykonań mają stałą różnicę julianday - numer wiersza, więc każda seria to
+# jedna grupa "island". Bieżąca seria to najnowsza grupa, najdłuższa - największa.
+# Potrzebne, gdy wykonania dochodzą z przeszłymi datami i przyrostowy upsert
+# (UPSERT_HABIT_STATISTICS_SQL) nie może już policzyć serii.
+RECOMPUTE_HABIT_STATISTICS_SQL = register_query("recompute_habit_statistics", """
+    WITH days AS (
+        SELECT habit_id, completed_at,
+               julianday(completed_at) - ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY completed_at) AS island
+        FROM habit_completions
+        WHERE user_id = ? AND habit_id IN (SELECT value FROM json_each(?))
+    ),
+    islands AS (
+        SELECT habit_id, COUNT(*) AS length, MAX(completed_at) AS last_day,
+               ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY MAX(completed_at) DESC) AS recency
+        FROM days
+        GROUP BY habit_id, island
+    )
+    INSERT INTO habit_statistics
+        (user_id, habit_id, total_completions, current_streak, longest_streak, last_completion_date)
+    SELECT ?, habit_id, SUM(length), MAX(CASE WHEN recency = 1 THEN length END), MAX(length), MAX(last_day)
+    FROM islands
+    WHERE true
+    GROUP BY habit_id
+    ON CONFLICT (user_id, habit_id) DO UPDATE SET
+        total_completions = excluded.total_completions,
+        current_streak = excluded.current_streak,
+        longest_streak = excluded.longest_streak,
+        last_completion_date = excluded.last_completion_date,
+        updated_at = CURRENT_TIMESTAMP
+""")
+
+
+async def recompute_habit_statistics(db: aiosqlite.Connection, user_id: int, habit_ids: list):
+    """
+    Przelicza od nowa statystyki (liczba wykonań, serie, ostatnia data) wskazanych nawyków.
+
+    Args:
+        db (aiosqlite.Connection): Połączenie zapisujące
+        user_id (int): ID użytkownika
+        habit_ids (list): ID nawyków do przeliczenia
+    """
+    await db.execute(RECOMPUTE_HABIT_STATISTICS_SQL, (user_id, json.dumps(list(habit_ids)), user_id))
+
+
+async def apply_offline_completions(db: aiosqlite.Connection, user_id: int, completions: list,
+                                    min_date: str, max_date: str) -> dict:
+    """
+    Zapisuje wykonania nawyków zebrane offline, z datami nadanymi przez klienta.
+
+    Wszystko w ramach transakcji wywołującego (run_write):
+    - wykonanie z kluczem już przetworzonym (również wcześniej w tym samym
+      wsadzie) nie jest zapisywane ponownie - zwracany jest zapamiętany wynik
+    - data spoza zakresu min_date..max_date jest odrzucana
+    - pozostałe wykonania są zapisywane jednym INSERT, monety jedną aktualizacją,
+      a statystyki przeliczane od nowa tylko dla nawyków z nowymi wykonaniami
+      (wykonanie z przeszłą datą może połączyć lub wydłużyć serie)
+
+    Args:
+        db (aiosqlite.Connection): Połączenie zapisujące
+        user_id (int): ID użytkownika
+        completions (list): Słowniki z kluczami habit_id, local_date (YYYY-MM-DD)
+            i idempotency_key
+        min_date (str): Najwcześniejsza akceptowana data (YYYY-MM-DD)
+        max_date (str): Najpóźniejsza akceptowana data (YYYY-MM-DD)
+
+    Returns:
+        dict: Klucze:
+            - results: Wyniki w kolejności completions, każdy z kluczami
+              idempotency_key, habit_id, local_date i status: "completed",
+              "already_completed", "not_found", "out_of_window" lub "duplicate"
+              (wtedy także original_status), a dla wykonanych coins_earned
+            - coins_earned: Suma przyznanych monet
+            - total_coins: Saldo monet po zapisie
+
+    Example:
+        async def _transaction(db):
+            return await apply_offline_completions(db, 1, [
+                {"habit_id": 5, "local_date": "2024-01-14", "idempotency_key": "a1"},
+            ], "2024-01-08", "2024-01-16")
+
+        sync = await run_write(_transaction)
+    """
+    keys = [completion["idempotency_key"] for completion in completions]
+    cursor = await db.execute(SYNC_KEYS_SQL, (user_id, json.dumps(keys)))
+    known = {row["idempotency_key"]: row for row in await cursor.fetchall()}
+
+    results = []
+    pending = []
+    first_by_key = {}
+    for completion in completions:
+        key = completion["idempotency_key"]
+        result = {
+            "idempotency_key": key,
+            "habit_id": completion["habit_id"],
+            "local_date": completion["local_date"],
+        }
+        results.append(result)
+        if key in known:
+            result["status"] = "duplicate"
+            result["original_status"] = known[key]["status"]
+        elif key in first_by_key:
+            result["status"] = "duplicate"
+        elif not min_date <= completion["local_date"] <= max_date:
+            result["status"] = "out_of_window"
+        else:
+            pending.append(result)
+        first_by_key.setdefault(key, result)
+
+    inserted = {}
+    if pending:
+        pairs = list(dict.fromkeys((result["habit_id"], result["local_date"]) for result in pending))
+        cursor = await db.execute(INSERT_DATED_COMPLETIONS_SQL, (json.dumps(pairs), user_id))
+        inserted = {(row["habit_id"], row["completed_at"]): row["coins_earned"]
+                    for row in await cursor.fetchall()}
+
+    # wpis niedodany: nawyk nieistniejący / nieaktywny albo wykonanie z tą datą już jest
+    active_habits = set()
+    if len(inserted) < len(pending):
+        habit_ids = list({result["habit_id"] for result in pending})
+        cursor = await db.execute(ACTIVE_USER_HABITS_IN_SQL, (user_id, json.dumps(habit_ids)))
+        active_habits = {row["id"] for row in await cursor.fetchall()}
+
+    credited = set()
+    for result in pending:
+        pair = (result["habit_id"], result["local_date"])
+        if pair in inserted and pair not in credited:
+            result["status"] = "completed"
+            result["coins_earned"] = inserted[pair]
+            credited.add(pair)
+        elif pair in inserted or result["habit_id"] in active_habits:
+            result["status"] = "already_completed"
+        else:
+            result["status"] = "not_found"
+
+    # powtórzony klucz w tym samym wsadzie dostaje wynik pierwszego wystąpienia
+    for result in results:
+        if result["status"] == "duplicate" and "original_status" not in result:
+            result["original_status"] = first_by_key[result["idempotency_key"]]["status"]
+
+    fresh = [result for result in results if result["status"] != "duplicate"]
+    if fresh:
+        await db.executemany(INSERT_SYNC_KEY_SQL, [
+            (user_id, result["idempotency_key"], result["habit_id"], result["local_date"], result["status"])
+            for result in fresh
+        ])
+    await db.execute(DELETE_EXPIRED_SYNC_KEYS_SQL, (user_id, f"-{SYNC_KEY_RETENTION_DAYS} days"))
+
+    coins_earned = sum(inserted.values())
+    if inserted:
+        await recompute_habit_statistics(db, user_id, {habit_id for habit_id, _ in inserted})
+        cursor = await db.execute(ADD_USER_COINS_SQL, (coins_earned, user_id))
+    else:
+        cursor = await db.execute(USER_COINS_SQL, (user_id,))
+    user = await cursor.fetchone()
+
+    await log_changes(db, user_id, "habit_completed", [
+        (habit_id, {"date": completed_at, "coins_earned": coins})
+        for (habit_id, completed_at), coins in inserted.items()
+    ])
+
+    return {
+        "results": results,
+        "coins_earned": coins_earned,
+        "total_coins": user["coins"] if user else 0
+    }
+
+
+USER_HABIT_STATISTICS_SQL = register_query("user_habit_statistics", """
+    SELECT hs.*,
+           h.name as habit_name,
+           h.icon as habit_icon,
+           h.reward_coins
+    FROM habit_statistics hs
+    JOIN habits h ON hs.habit_id = h.id
+    WHERE hs.user_id = ? AND h.is_active = 1
+    ORDER BY hs.total_completions DESC
+""")
 
 
 async def get_user_habit_statistics(user_id: int):
@@ -615,24 +2155,152 @@ async def get_user_habit_statistics(user_id: int):
         for stat in stats:
             print(f"{stat['habit_name']}: {stat['total_completions']} wykonan")
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            """SELECT 
-                   hs.*,
-                   h.name as habit_name,
-                   h.icon as habit_icon,
-                   h.reward_coins
-               FROM habit_statistics hs
-               JOIN habits h ON hs.habit_id = h.id
-               WHERE hs.user_id = ? AND h.is_active = 1
-               ORDER BY hs.total_completions DESC""",
-            (user_id,)
-        )
+    async with get_connection() as db:
+        cursor = await db.execute(USER_HABIT_STATISTICS_SQL, (user_id,))
         stats = await cursor.fetchall()
         return [dict(row) for row in stats]
 
 
+# ============================================
+# KATALOGI (UBRANIA I NAGRODY)
+# ============================================
+
+CLOTHING_CATALOG_SQL = register_query(
+    "clothing_catalog",
+    "SELECT id, name, cost, icon, category FROM clothing_items ORDER BY cost ASC",
+    allow_scan=True
+)
+
+REWARDS_CATALOG_SQL = register_query(
+    "rewards_catalog",
+    "SELECT id, name, cost, nutrition_value, icon, type FROM rewards ORDER BY cost ASC, id ASC",
+    allow_scan=True
+)
+
+
+class CatalogCache:
+    """
+    Pamięć podręczna katalogów ubrań i nagród.
+
+    Katalogi są małe i zmieniają się tylko przy migracjach (dane domyślne),
+    więc po wczytaniu są trzymane w pamięci procesu: jako słowniki po ID
+    (dla zakupów i zakładania ubrań), a katalog ubrań dodatkowo jako gotowe
+    bajty JSON z ETagiem (dla GET /api/clothing). Po zmianie katalogu należy wywołać
+    invalidate() - kolejne odwołanie wczyta dane ponownie.
+
+    Example:
+        await catalog_cache.load()
+        item = await catalog_cache.get_clothing(3)
+        body, etag = await catalog_cache.clothing_json()
+    """
+
+    def __init__(self):
+        self._clothing = None
+        self._rewards = None
+        self._lock = asyncio.Lock()
+        self.loads_total = 0
+        self.invalidations_total = 0
+
+    @staticmethod
+    def _encode(items: list) -> tuple:
+        """Koduje listę do bajtów JSON (format jak JSONResponse FastAPI) i liczy ETag."""
+        body = json.dumps(items, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return body, f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+
+    async def load(self):
+        """
+        Wczytuje oba katalogi z bazy danych.
+
+        Raises:
+            aiosqlite.Error: Gdy wystąpi błąd podczas odczytu katalogów
+        """
+        async with self._lock:
+            async with get_connection() as db:
+                cursor = await db.execute(CLOTHING_CATALOG_SQL)
+                clothing = [dict(row) for row in await cursor.fetchall()]
+                cursor = await db.execute(REWARDS_CATALOG_SQL)
+                rewards = [dict(row) for row in await cursor.fetchall()]
+
+            self._clothing = ({item["id"]: item for item in clothing}, *self._encode(clothing))
+            self._rewards = {item["id"]: item for item in rewards}
+            self.loads_total += 1
+
+        logger.info("Katalogi wczytane: %s ubran, %s nagrod", len(clothing), len(rewards))
+
+    def invalidate(self):
+        """Unieważnia wczytane katalogi (np. po migracji zmieniającej dane domyślne)."""
+        self._clothing = None
+        self._rewards = None
+        self.invalidations_total += 1
+
+    async def _clothing_entry(self) -> tuple:
+        if self._clothing is None:
+            await self.load()
+        return self._clothing
+
+    async def _rewards_entry(self) -> dict:
+        if self._rewards is None:
+            await self.load()
+        return self._rewards
+
+    async def clothing_json(self) -> tuple:
+        """
+        Zwraca katalog ubrań jako gotową odpowiedź.
+
+        Returns:
+            tuple: (bajty JSON, ETag)
+        """
+        _, body, etag = await self._clothing_entry()
+        return body, etag
+
+    async def get_clothing(self, clothing_id: int) -> Optional[dict]:
+        """
+        Zwraca ubranie o podanym ID.
+
+        Args:
+            clothing_id (int): ID ubrania
+
+        Returns:
+            Optional[dict]: Słownik z polami id, name, cost, icon, category
+                lub None gdy ubranie nie istnieje
+        """
+        by_id, _, _ = await self._clothing_entry()
+        return by_id.get(clothing_id)
+
+    async def get_reward(self, reward_id: int) -> Optional[dict]:
+        """
+        Zwraca nagrodę o podanym ID.
+
+        Args:
+            reward_id (int): ID nagrody
+
+        Returns:
+            Optional[dict]: Słownik z polami id, name, cost, nutrition_value, icon, type
+                lub None gdy nagroda nie istnieje
+        """
+        by_id = await self._rewards_entry()
+        return by_id.get(reward_id)
+
+    def stats(self) -> dict:
+        """
+        Zwraca statystyki pamięci podręcznej katalogów.
+
+        Returns:
+            dict: Stan wczytania, liczba pozycji, wczytań i unieważnień
+        """
+        return {
+            "loaded": self._clothing is not None and self._rewards is not None,
+            "clothing_items": len(self._clothing[0]) if self._clothing else 0,
+            "rewards": len(self._rewards) if self._rewards else 0,
+            "loads_total": self.loads_total,
+            "invalidations_total": self.invalidations_total,
+        }
+
+
+# Globalna pamięć podręczna katalogów (wczytywana w lifespan aplikacji)
+catalog_cache = CatalogCache()
+
+
 # ============================================
 # FUNKCJE TESTOWE
 # ============================================
@@ -1,160 +1,195 @@
 import os
 import sys
-from fastapi import FastAPI, HTTPException, Header
+import sqlite3
+import hashlib
+from fastapi import FastAPI, HTTPException, Header, Depends, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
-from datetime import datetime, date
-from typing import List
+from datetime import datetime, date, timedelta
+from typing import List, Optional
 import calendar
-import asyncio
+
+from utils.logger import get_logger, setup_logging, stop_logging, get_logging_stats, SAMPLED
+from utils.metrics import MetricsMiddleware, render_metrics, PROMETHEUS_CONTENT_TYPE, DB_POOL_TIMEOUTS
+
+logger = get_logger("main")
 
 # importowanie modułów aplikacji
 try:
-    from database import init_db, update_habit_statistics, DATABASE_PATH
+    from database import (
+        init_db, record_habit_completion, record_habit_completions_batch,
+        apply_offline_completions, log_changes, get_user_changes, DATABASE_PATH,
+        init_pool, close_pool, get_db, get_connection, get_pool_stats, PoolTimeoutError,
+        start_writer, stop_writer, run_write, execute_query, fetch_one, get_writer_stats,
+        start_change_log_compaction, stop_change_log_compaction,
+        register_query, check_query_plans, DB_QUERY_PLAN_CHECK, bump_data_version,
+        catalog_cache, USER_COINS_SQL, USER_SYNC_STATE_SQL,
+        USER_HABITS_WITH_COMPLETIONS_SQL, USER_HABIT_STATISTICS_SQL, HABITS_COMPLETION_WINDOW_DAYS,
+        MAX_COMPLETION_BATCH_SIZE, SYNC_MAX_PAST_DAYS, SYNC_MAX_FUTURE_DAYS
+    )
 
-    print("database.py imported successfully")
-    print(f"main.py uzywa bazy: {DATABASE_PATH}")
+    logger.info("database.py imported successfully, baza: %s", DATABASE_PATH)
 except Exception as e:
-    print(f"Failed to import database.py: {e}")
+    logger.error("Failed to import database.py: %s", e)
 
 try:
     import aiosqlite
 
-    print("aiosqlite imported successfully")
+    logger.debug("aiosqlite imported successfully")
 except Exception as e:
-    print(f"Failed to import aiosqlite: {e}")
+    logger.error("Failed to import aiosqlite: %s", e)
 
 try:
     from schemas import (
         UserRegister, UserLogin, UserResponse, LoginResponse,
-        HabitCreate, HabitResponse, HabitUpdate, HabitCompletionResponse
+        HabitCreate, HabitResponse, HabitUpdate, HabitCompletionResponse, HabitCompleteBatch,
+        OfflineSync
     )
 
-    print("schemas.py imported successfully")
+    logger.debug("schemas.py imported successfully")
 except Exception as e:
-    print(f"Failed to import schemas.py: {e}")
+    logger.error("Failed to import schemas.py: %s", e)
 
 try:
-    from auth import hash_password, verify_password, create_token, verify_token
+    from auth import (
+        hash_password_async, verify_and_update_password_async, init_password_hashing,
+        create_token, get_current_user_id,
+        get_token_cache_stats, get_password_pool_stats,
+        auth_admission, AdmissionRejectedError, get_auth_admission_stats
+    )
 
-    print("auth.py imported successfully")
+    logger.debug("auth.py imported successfully")
 except Exception as e:
-    print(f"Failed to import auth.py: {e}")
+    logger.error("Failed to import auth.py: %s", e)
 
 
-async def ensure_clothing_column_exists():
-    """
-    Sprawdza i dodaje kolumnę current_clothing_id do tabeli users jeśli nie istnieje.
+# ============================================
+# ZAPYTANIA SQL (sprawdzane przy starcie przez doradcę planów zapytań)
+# ============================================
 
-    Obsługuje race conditions gdy wiele procesów próbuje dodać kolumnę jednocześnie.
-    """
-    max_retries = 3
-    retry_count = 0
+USER_ID_BY_EMAIL_SQL = register_query("user_id_by_email", "SELECT id FROM users WHERE email = ?")
 
-    while retry_count < max_retries:
-        try:
-            async with aiosqlite.connect(DATABASE_PATH) as db:
-                # Sprawdź czy kolumna istnieje
-                cursor = await db.execute("PRAGMA table_info(users)")
-                columns = await cursor.fetchall()
-                column_names = [column[1] for column in columns]
-
-                if 'current_clothing_id' not in column_names:
-                    print("Dodawanie kolumny current_clothing_id...")
-
-                    try:
-                        # Próba dodania kolumny
-                        await db.execute("ALTER TABLE users ADD COLUMN current_clothing_id INTEGER DEFAULT NULL")
-                        await db.commit()
-                        print("Kolumna current_clothing_id dodana pomyslnie")
-                        return
-
-                    except Exception as alter_error:
-                        # Sprawdź czy kolumna została dodana przez inny proces
-                        cursor = await db.execute("PRAGMA table_info(users)")
-                        columns = await cursor.fetchall()
-                        column_names = [column[1] for column in columns]
-
-                        if 'current_clothing_id' in column_names:
-                            print("Kolumna current_clothing_id juz istnieje (dodana przez inny proces)")
-                            return
-                        else:
-                            # Jeśli kolumny nadal nie ma, spróbuj ponownie
-                            raise alter_error
-                else:
-                    print("Kolumna current_clothing_id juz istnieje")
-                    return
+USER_ID_BY_USERNAME_SQL = register_query("user_id_by_username", "SELECT id FROM users WHERE username = ?")
 
-        except Exception as e:
-            retry_count += 1
-            error_msg = str(e).lower()
+USER_LOGIN_SQL = register_query(
+    "user_login",
+    "SELECT id, username, email, password_hash, coins FROM users WHERE email = ?"
+)
 
-            # Jeśli błąd to "duplicate column name" - kolumna już istnieje, wszystko OK
-            if "duplicate column" in error_msg or "already exists" in error_msg:
-                print("Kolumna current_clothing_id juz istnieje")
-                return
+ALL_USERS_SQL = register_query(
+    "all_users",
+    "SELECT id, username, email, coins, created_at FROM users",
+    allow_scan=True
+)
 
-            if retry_count < max_retries:
-                print(f"Proba {retry_count} nie powiodla sie, ponawiam... ({e})")
-                await asyncio.sleep(0.5)  # Krótkie opóźnienie przed retry
-            else:
-                print(f"Nie udalo sie dodac kolumny current_clothing_id po {max_retries} probach: {e}")
-                # Nie przerywaj uruchamiania aplikacji - może kolumna już istnieje
-                return
+# Zmiana salda tylko gdy nie spadnie poniżej zera; brak wiersza w RETURNING = za mało monet
+CHANGE_USER_COINS_SQL = register_query(
+    "change_user_coins",
+    "UPDATE users SET coins = coins + ?, data_version = data_version + 1 "
+    "WHERE id = ? AND coins + ? >= 0 RETURNING coins"
+)
 
+UPDATE_PASSWORD_HASH_SQL = register_query(
+    "update_password_hash",
+    "UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?"
+)
 
-async def ensure_slot_machine_column_exists():
-    """
-    Sprawdza i dodaje kolumnę last_slot_machine_play do tabeli users jeśli nie istnieje.
-    """
-    max_retries = 3
-    retry_count = 0
+INSERT_USER_SQL = register_query(
+    "insert_user",
+    "INSERT INTO users (username, email, password_hash, coins) VALUES (?, ?, ?, ?)"
+)
 
-    while retry_count < max_retries:
-        try:
-            async with aiosqlite.connect(DATABASE_PATH) as db:
-                # Sprawdź czy kolumna istnieje
-                cursor = await db.execute("PRAGMA table_info(users)")
-                columns = await cursor.fetchall()
-                column_names = [column[1] for column in columns]
-
-                if 'last_slot_machine_play' not in column_names:
-                    print("Dodawanie kolumny last_slot_machine_play...")
-
-                    try:
-                        await db.execute("ALTER TABLE users ADD COLUMN last_slot_machine_play DATE DEFAULT NULL")
-                        await db.commit()
-                        print("Kolumna last_slot_machine_play dodana pomyslnie")
-                        return
-
-                    except Exception as alter_error:
-                        cursor = await db.execute("PRAGMA table_info(users)")
-                        columns = await cursor.fetchall()
-                        column_names = [column[1] for column in columns]
-
-                        if 'last_slot_machine_play' in column_names:
-                            print("Kolumna last_slot_machine_play juz istnieje (dodana przez inny proces)")
-                            return
-                        else:
-                            raise alter_error
-                else:
-                    print("Kolumna last_slot_machine_play juz istnieje")
-                    return
+NEW_USER_SQL = register_query("new_user", "SELECT id, username, email, coins FROM users WHERE id = ?")
 
-        except Exception as e:
-            retry_count += 1
-            error_msg = str(e).lower()
+SET_CURRENT_CLOTHING_SQL = register_query(
+    "set_current_clothing",
+    "UPDATE users SET current_clothing_id = ? WHERE id = ?"
+)
+
+CLEAR_CURRENT_CLOTHING_SQL = register_query(
+    "clear_current_clothing",
+    "UPDATE users SET current_clothing_id = NULL, data_version = data_version + 1 WHERE id = ?"
+)
 
-            if "duplicate column" in error_msg or "already exists" in error_msg:
-                print("Kolumna last_slot_machine_play juz istnieje")
-                return
+# Czyszczenie tylko gdy użytkownik nadal nosi to samo (nieposiadane) ubranie
+CLEAR_UNOWNED_CLOTHING_SQL = register_query(
+    "clear_unowned_clothing",
+    "UPDATE users SET current_clothing_id = NULL, data_version = data_version + 1 "
+    "WHERE id = ? AND current_clothing_id = ?"
+)
 
-            if retry_count < max_retries:
-                print(f"Proba {retry_count} nie powiodla sie, ponawiam... ({e})")
-                await asyncio.sleep(0.5)
-            else:
-                print(f"Nie udalo sie dodac kolumny last_slot_machine_play po {max_retries} probach: {e}")
-                return
+LAST_SLOT_MACHINE_PLAY_SQL = register_query(
+    "last_slot_machine_play",
+    "SELECT last_slot_machine_play FROM users WHERE id = ?"
+)
+
+SET_LAST_SLOT_MACHINE_PLAY_SQL = register_query(
+    "set_last_slot_machine_play",
+    "UPDATE users SET last_slot_machine_play = ? WHERE id = ?"
+)
+
+INSERT_HABIT_SQL = register_query("insert_habit", """
+    INSERT INTO habits (user_id, name, description, reward_coins, icon, is_active, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+""")
+
+NEW_HABIT_SQL = register_query(
+    "new_habit",
+    "SELECT id, user_id, name, description, reward_coins, is_active, created_at, icon FROM habits WHERE id = ?"
+)
+
+DEACTIVATE_HABIT_SQL = register_query("deactivate_habit", "UPDATE habits SET is_active = 0 WHERE id = ?")
+
+# Tylko aktywne nawyki - ponowne usunięcie zwraca 404 zamiast kolejnego wpisu
+# w dzienniku zmian i podbicia data_version. Nazwa i ikona na potrzeby kalendarza.
+HABIT_OWNER_SQL = register_query(
+    "habit_owner",
+    "SELECT id, name, icon FROM habits WHERE id = ? AND user_id = ? AND is_active = 1"
+)
+
+OWNED_CLOTHING_SQL = register_query(
+    "owned_clothing",
+    "SELECT clothing_id FROM user_clothing WHERE user_id = ?"
+)
+
+OWNED_CLOTHING_ITEM_SQL = register_query(
+    "owned_clothing_item",
+    "SELECT id FROM user_clothing WHERE user_id = ? AND clothing_id = ?"
+)
+
+INSERT_USER_CLOTHING_SQL = register_query(
+    "insert_user_clothing",
+    "INSERT INTO user_clothing (user_id, clothing_id) VALUES (?, ?)"
+)
+
+# Do 365 ostatnich wykonań każdego aktywnego nawyku użytkownika w jednym zapytaniu.
+# Zewnętrzne ORDER BY gwarantuje kolejność, na której polega grupowanie
+# (po habit_id, z datami malejąco w obrębie nawyku); usunięte nawyki są
+# odfiltrowane przed oknem, więc ich historia nie jest czytana.
+USER_RECENT_COMPLETIONS_SQL = register_query("user_recent_completions", """
+    SELECT habit_id, completed_at
+    FROM (
+        SELECT habit_id,
+               completed_at,
+               ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY completed_at DESC) AS rn
+        FROM habit_completions
+        WHERE user_id = ?
+          AND habit_id IN (SELECT id FROM habits WHERE user_id = ? AND is_active = 1)
+    )
+    WHERE rn <= 365
+    ORDER BY habit_id, completed_at DESC
+""")
+
+HABIT_CALENDAR_SQL = register_query("habit_calendar", """
+    SELECT completed_at
+    FROM habit_completions
+    WHERE habit_id = ?
+      AND user_id = ?
+      AND completed_at >= ?
+      AND completed_at <= ?
+    ORDER BY completed_at
+""")
 
 
 @asynccontextmanager
@@ -165,23 +200,42 @@ async def lifespan(app: FastAPI):
     Wykonuje inicjalizację bazy danych podczas uruchamiania
     i czyści zasoby podczas zamykania aplikacji.
     """
-    # uruchamianie aplikacji
+    # uruchamianie aplikacji (wątek logowania mógł zostać zatrzymany przez poprzedni cykl życia)
+    setup_logging()
     try:
         await init_db()
-        print("Database initialized")
+        logger.info("Database initialized")
+
+        # Writer (jedyne połączenie zapisujące) i pula połączeń tylko do odczytu
+        await start_writer()
+        await init_pool()
+
+        # Katalogi ubrań i nagród trzymane w pamięci procesu
+        await catalog_cache.load()
 
-        # Dodaj kolumny jeśli nie istnieją
-        await ensure_clothing_column_exists()
-        await ensure_slot_machine_column_exists()
+        # Okresowa kompakcja dziennika zmian (synchronizacja delta)
+        start_change_log_compaction()
+
+        # Ostrzeżenia o zapytaniach wykonujących pełny skan tabeli
+        if DB_QUERY_PLAN_CHECK:
+            await check_query_plans()
+
+        # Koszt bcrypt (ręczny, skalibrowany lub domyślny) i polityka przehashowania
+        await init_password_hashing()
 
     except Exception as e:
-        print(f"Database initialization failed: {e}")
+        logger.exception("Database initialization failed: %s", e)
         # Nie przerywaj - aplikacja może nadal działać
 
     yield
 
-    # Zamykanie aplikacji
-    print("Shutting down")
+    # Zamykanie aplikacji - najpierw dokończ zakolejkowane zapisy
+    await stop_change_log_compaction()
+    await stop_writer()
+    await close_pool()
+    logger.info("Shutting down")
+    # zapisz rekordy pozostałe w kolejce logowania
+    stop_logging()
 
 
 # inicjalizacja aplikacji FastAPI
@@ -204,8 +258,128 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+# metryki żądań HTTP i zapytań SQL (dodany jako ostatni - obejmuje cały stos, także CORS)
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    """Zwraca 503 gdy wszystkie połączenia z bazą są zajęte zbyt długo."""
+    # Sygnał przeciążenia - bez próbkowania; skalę pokazuje licznik w /api/metrics
+    DB_POOL_TIMEOUTS.inc(getattr(request.scope.get("route"), "path", None) or "unmatched")
+    logger.warning("Timeout puli polaczen dla %s: %s", request.url.path, exc)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Serwer jest przeciazony, sprobuj ponownie za chwile"},
+        headers={"Retry-After": "1"}
+    )
+
+
+@app.exception_handler(AdmissionRejectedError)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejectedError):
+    """Zwraca 503 gdy ogranicznik endpointów autoryzacji odrzucił żądanie."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Zbyt wiele prob logowania, sprobuj ponownie za chwile"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+# ============================================
+# AUTORYZACJA
+# ============================================
+
+CURRENT_USER_SQL = register_query("current_user", """
+    SELECT id, username, email, coins, current_clothing_id, last_slot_machine_play, data_version
+    FROM users
+    WHERE id = ?
+""")
+
+
+async def get_current_user(request: Request, authorization: str = Header(None)) -> aiosqlite.Row:
+    """
+    Uwierzytelnia żądanie i wczytuje wiersz zalogowanego użytkownika.
+
+    Dependency FastAPI: token jest weryfikowany przez auth.get_current_user_id
+    (wywoływane bezpośrednio, bez puli wątków), a użytkownik wczytywany jednym
+    zapytaniem na żądanie i zapisywany w request.state.user. Zapytanie idzie
+    przez fetch_one (a nie Depends(get_db)), więc połączenie wraca do puli od
+    razu - zależności z yield są zwalniane dopiero po wysłaniu odpowiedzi,
+    a endpointy zapisu czekają na writer i nie mogą przez ten czas blokować
+    puli. Połączenie dostają tylko endpointy odczytu, które deklarują get_db.
+
+    Args:
+        request (Request): Żądanie HTTP
+        authorization (str): Token autoryzacyjny w headerze
+
+    Returns:
+        aiosqlite.Row: Wiersz z kolumnami id, username, email, coins,
+            current_clothing_id, last_slot_machine_play, data_version
+
+    Raises:
+        HTTPException: 401 gdy token jest nieprawidłowy lub użytkownik nie istnieje
+
+    Example:
+        @app.get("/api/coins")
+        async def get_user_coins(user: aiosqlite.Row = Depends(get_current_user)):
+            return {"coins": user["coins"]}
+    """
+    user_id = get_current_user_id(authorization)
+
+    user = await fetch_one(CURRENT_USER_SQL, (user_id,))
+
+    if not user:
+        raise HTTPException(status_code=401, detail="Uzytkownik nie istnieje")
+
+    request.state.user = user
+    return user
+
+
+# ============================================
+# ODPOWIEDZI WARUNKOWE (ETag / 304)
+# ============================================
+
+def conditional_response(request: Request, response: Response, user: aiosqlite.Row) -> Optional[Response]:
+    """
+    Obsługuje nagłówek If-None-Match na podstawie wersji danych użytkownika.
+
+    ETag składa się z wersji danych użytkownika oraz skrótu z ID użytkownika,
+    ścieżki z parametrami zapytania i dzisiejszej daty (domyślne okna czasowe
+    przesuwają się codziennie). Wersja pochodzi z wiersza wczytanego przez
+    get_current_user, więc przy trafieniu ciężkie zapytania endpointu są
+    całkowicie pomijane.
+
+    Args:
+        request (Request): Żądanie HTTP
+        response (Response): Odpowiedź endpointu, do której dopisywany jest ETag
+        user (aiosqlite.Row): Zalogowany użytkownik (z get_current_user)
+
+    Returns:
+        Optional[Response]: Odpowiedź 304 gdy klient ma aktualne dane,
+            w przeciwnym razie None (endpoint buduje pełną odpowiedź)
+
+    Example:
+        not_modified = conditional_response(request, response, user)
+        if not_modified:
+            return not_modified
+    """
+    scope = f"{user['id']}|{request.url.path}?{request.url.query}|{date.today().isoformat()}"
+    etag = f'W/"{user["data_version"]}-{hashlib.sha1(scope.encode()).hexdigest()[:16]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        # porównanie słabe (RFC 9110) - prefiks W/ jest ignorowany
+        if "*" in candidates or etag[2:] in [tag.removeprefix("W/") for tag in candidates]:
+            return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
+
 
 # ============================================
 # PODSTAWOWE ENDPOINTY I TESTY
@@ -223,22 +397,40 @@ async def health():
     return {"status": "OK"}
 
 
+@app.get("/api/metrics")
+async def metrics():
+    """
+    Metryki procesu w formacie tekstowym Prometheusa.
+
+    Czas odpowiedzi per trasa, kody statusu, żądania w trakcie obsługi,
+    czas zapytań SQL per zapytanie oraz liczba zapytań na żądanie.
+    """
+    return Response(content=render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
 @app.get("/api/test-db")
 async def test_db():
     """
     Testuje połączenie z bazą danych.
 
     Returns:
-        dict: Status połączenia i lista tabel w bazie danych
+        dict: Status połączenia, lista tabel w bazie danych i statystyki puli połączeń
     """
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
+        async with get_connection() as db:
             cursor = await db.execute("SELECT name FROM sqlite_master WHERE type='table'")
             tables = await cursor.fetchall()
             return {
                 "message": "Database works!",
                 "tables": [table[0] for table in tables],
-                "database_path": DATABASE_PATH
+                "database_path": DATABASE_PATH,
+                "pool": get_pool_stats(),
+                "writer": get_writer_stats(),
+                "catalog_cache": catalog_cache.stats(),
+                "token_cache": get_token_cache_stats(),
+                "password_pool": get_password_pool_stats(),
+                "auth_admission": get_auth_admission_stats(),
+                "logging": get_logging_stats()
             }
     except Exception as e:
         return {
@@ -251,7 +443,7 @@ async def test_db():
 # ENDPOINTY UŻYTKOWNIKÓW
 # ============================================
 
-@app.post("/api/register", response_model=LoginResponse)
+@app.post("/api/register", response_model=LoginResponse, dependencies=[Depends(auth_admission)])
 async def register(user_data: UserRegister):
     """
     Rejestruje nowego użytkownika w systemie.
@@ -265,53 +457,55 @@ async def register(user_data: UserRegister):
     Raises:
         HTTPException: Gdy email lub username już istnieje
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
-        db.row_factory = aiosqlite.Row
+    # Zapytania przez fetch_one (a nie Depends(get_db)), żeby połączenie wróciło
+    # do puli przed hashowaniem - burza rejestracji nie może wyczerpać puli
 
-        # sprawdzenie unikalności emaila
-        cursor = await db.execute("SELECT id FROM users WHERE email = ?", (user_data.email,))
-        if await cursor.fetchone():
-            raise HTTPException(status_code=400, detail="Email juz jest zajety")
+    # sprawdzenie unikalności emaila
+    if await fetch_one(USER_ID_BY_EMAIL_SQL, (user_data.email,)):
+        raise HTTPException(status_code=400, detail="Email juz jest zajety")
 
-        # sprawdzenie czy nazwa użytkownika już istnieje w bazie
-        cursor = await db.execute("SELECT id FROM users WHERE username = ?", (user_data.username,))
-        if await cursor.fetchone():
-            raise HTTPException(status_code=400, detail="Username juz jest zajety")
+    # sprawdzenie czy nazwa użytkownika już istnieje w bazie
+    if await fetch_one(USER_ID_BY_USERNAME_SQL, (user_data.username,)):
+        raise HTTPException(status_code=400, detail="Username juz jest zajety")
 
-        # tworzenie nowego użytkownika z zahashowanym hasłem
-        hashed_password = hash_password(user_data.password)
-        cursor = await db.execute(
-            "INSERT INTO users (username, email, password_hash, coins) VALUES (?, ?, ?, ?)",
+    # tworzenie nowego użytkownika z zahashowanym hasłem
+    # (bcrypt w puli wątków - poza pętlą zdarzeń i poza kolejką zapisów)
+    hashed_password = await hash_password_async(user_data.password)
+
+    async def _transaction(write_db):
+        cursor = await write_db.execute(
+            INSERT_USER_SQL,
             (user_data.username, user_data.email, hashed_password, 20)
         )
-        await db.commit()
-
-        user_id = cursor.lastrowid
 
         # pobranie danych utworzonego użytkownika
-        cursor = await db.execute(
-            "SELECT id, username, email, coins FROM users WHERE id = ?",
-            (user_id,)
-        )
-        user = await cursor.fetchone()
+        cursor = await write_db.execute(NEW_USER_SQL, (cursor.lastrowid,))
+        return await cursor.fetchone()
 
-        # generowanie tokenu autoryzacyjnego i przypisanie id userowi
-        token = create_token(user_id)
-
-        return LoginResponse(
-            message="Rejestracja udana",
-            token=token,
-            user=UserResponse(
-                id=user["id"],
-                username=user["username"],
-                email=user["email"],
-                coins=user["coins"]
-            )
+    try:
+        user = await run_write(_transaction)
+    except sqlite3.IntegrityError:
+        # ten sam email lub username zarejestrowany równolegle przez inne żądanie
+        raise HTTPException(status_code=400, detail="Email lub username juz jest zajety")
+
+    user_id = user["id"]
+
+    # generowanie tokenu autoryzacyjnego i przypisanie id userowi
+    token = create_token(user_id)
+
+    return LoginResponse(
+        message="Rejestracja udana",
+        token=token,
+        user=UserResponse(
+            id=user["id"],
+            username=user["username"],
+            email=user["email"],
+            coins=user["coins"]
         )
+    )
 
 
-@app.post("/api/login", response_model=LoginResponse)
+@app.post("/api/login", response_model=LoginResponse, dependencies=[Depends(auth_admission)])
 async def login(login_data: UserLogin):
     """
     Loguje użytkownika do systemu.
@@ -325,46 +519,46 @@ async def login(login_data: UserLogin):
     Raises:
         HTTPException: Gdy dane logowania są nieprawidłowe
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
-        db.row_factory = aiosqlite.Row
+    # wyszukanie użytkownika po emailu (połączenie wraca do puli przed weryfikacją hasła)
+    user = await fetch_one(USER_LOGIN_SQL, (login_data.email,))
 
-        # wyszukanie użytkownika po emailu
-        cursor = await db.execute(
-            "SELECT id, username, email, password_hash, coins FROM users WHERE email = ?",
-            (login_data.email,)
-        )
-        user = await cursor.fetchone()
+    if not user:
+        raise HTTPException(status_code=401, detail="Nieprawidlowy email lub haslo")
 
-        if not user:
-            raise HTTPException(status_code=401, detail="Nieprawidlowy email lub haslo")
-
-        # weryfikacja hasła
-        if not verify_password(login_data.password, user["password_hash"]):
-            raise HTTPException(status_code=401, detail="Nieprawidlowy email lub haslo")
-
-        # generowanie tokenu autoryzacyjnego
-        token = create_token(user["id"])
-
-        return LoginResponse(
-            message="Logowanie udane",
-            token=token,
-            user=UserResponse(
-                id=user["id"],
-                username=user["username"],
-                email=user["email"],
-                coins=user["coins"]
-            )
+    # weryfikacja hasła (bcrypt w puli wątków, pętla zdarzeń obsługuje inne żądania)
+    valid, new_hash = await verify_and_update_password_async(login_data.password, user["password_hash"])
+    if not valid:
+        raise HTTPException(status_code=401, detail="Nieprawidlowy email lub haslo")
+
+    # hash z innym kosztem niż aktualny - zapisz nowy (tylko jeśli hasło nie zmieniło się w międzyczasie)
+    if new_hash:
+        try:
+            await execute_query(UPDATE_PASSWORD_HASH_SQL, (new_hash, user["id"], user["password_hash"]))
+        except Exception as e:
+            logger.warning("Nie udalo sie zaktualizowac hasha hasla dla user %s: %s", user["id"], e)
+
+    # generowanie tokenu autoryzacyjnego
+    token = create_token(user["id"])
+
+    return LoginResponse(
+        message="Logowanie udane",
+        token=token,
+        user=UserResponse(
+            id=user["id"],
+            username=user["username"],
+            email=user["email"],
+            coins=user["coins"]
         )
+    )
 
 
 @app.get("/api/profile", response_model=UserResponse)
-async def get_profile(authorization: str = Header(None)):
+async def get_profile(request: Request, response: Response, user: aiosqlite.Row = Depends(get_current_user)):
     """
     Pobiera profil zalogowanego użytkownika.
 
     Args:
-        authorization (str): Token autoryzacyjny w headerze
+        user (aiosqlite.Row): Zalogowany użytkownik (z get_current_user)
 
     Returns:
         UserResponse: Dane profilu użytkownika
@@ -372,41 +566,25 @@ async def get_profile(authorization: str = Header(None)):
     Raises:
         HTTPException: Gdy token jest nieprawidłowy lub użytkownik nie istnieje
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Brak tokenu autoryzacji")
-
-    token = authorization.replace("Bearer ", "")
-    user_id = verify_token(token)
-
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Nieprawidlowy token")
-
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT id, username, email, coins FROM users WHERE id = ?",
-            (user_id,)
-        )
-        user = await cursor.fetchone()
-
-        if not user:
-            raise HTTPException(status_code=404, detail="Uzytkownik nie znaleziony")
-
-        return UserResponse(
-            id=user["id"],
-            username=user["username"],
-            email=user["email"],
-            coins=user["coins"]
-        )
+    not_modified = conditional_response(request, response, user)
+    if not_modified:
+        return not_modified
+
+    return UserResponse(
+        id=user["id"],
+        username=user["username"],
+        email=user["email"],
+        coins=user["coins"]
+    )
 
 
 @app.get("/api/coins")
-async def get_user_coins(authorization: str = Header(None)):
+async def get_user_coins(request: Request, response: Response, user: aiosqlite.Row = Depends(get_current_user)):
     """
     Pobiera aktualną liczbę monet użytkownika.
 
     Args:
-        authorization (str): Token autoryzacyjny w headerze
+        user (aiosqlite.Row): Zalogowany użytkownik (z get_current_user)
 
     Returns:
         dict: Liczba monet i ID użytkownika
@@ -414,31 +592,15 @@ async def get_user_coins(authorization: str = Header(None)):
     Raises:
         HTTPException: Gdy token jest nieprawidłowy lub użytkownik nie istnieje
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Brak tokenu autoryzacji")
+    not_modified = conditional_response(request, response, user)
+    if not_modified:
+        return not_modified
 
-    token = authorization.replace("Bearer ", "")
-    user_id = verify_token(token)
-
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Nieprawidlowy token")
-
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT coins FROM users WHERE id = ?",
-            (user_id,)
-        )
-        user = await cursor.fetchone()
-
-        if not user:
-            raise HTTPException(status_code=404, detail="Uzytkownik nie znaleziony")
-
-        return {"coins": user["coins"], "user_id": user_id}
+    return {"coins": user["coins"], "user_id": user["id"]}
 
 
 @app.post("/api/coins/add")
-async def add_coins(data: dict, authorization: str = Header(None)):
+async def add_coins(data: dict, user: aiosqlite.Row = Depends(get_current_user)):
     """
     Dodaje lub odejmuje monety użytkownika.
 
@@ -446,7 +608,7 @@ async def add_coins(data: dict, authorization: str = Header(None)):
 
     Args:
         data (dict): Słownik zawierający pole 'amount' z liczbą monet
-        authorization (str): Token autoryzacyjny w headerze
+        user (aiosqlite.Row): Zalogowany użytkownik (z get_current_user)
 
     Returns:
         dict: Informacja o zmianie, nowa liczba monet i kwota zmiany
@@ -455,80 +617,49 @@ async def add_coins(data: dict, authorization: str = Header(None)):
         HTTPException: Gdy token jest nieprawidłowy, kwota to 0,
                       lub użytkownik ma niewystarczająco monet
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Brak tokenu autoryzacji")
-
-    token = authorization.replace("Bearer ", "")
-    user_id = verify_token(token)
-
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Nieprawidlowy token")
+    user_id = user["id"]
 
     amount = data.get('amount', 0)
 
     if amount == 0:
         raise HTTPException(status_code=400, detail="Kwota nie moze byc rowna 0")
 
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
-        db.row_factory = aiosqlite.Row
-
-        # sprawdzenie obecnej liczby monet
-        cursor = await db.execute(
-            "SELECT coins FROM users WHERE id = ?",
-            (user_id,)
-        )
-        user = await cursor.fetchone()
-
-        if not user:
-            raise HTTPException(status_code=404, detail="Uzytkownik nie znaleziony")
-
-        current_coins = user["coins"]
-        new_coins = current_coins + amount
+    # walidacja i aktualizacja jednym warunkowym UPDATE w transakcji zapisu
+    async def _transaction(db):
+        cursor = await db.execute(CHANGE_USER_COINS_SQL, (amount, user_id, amount))
+        updated = await cursor.fetchone()
 
-        # walidacja przy wydawaniu monet
-        if amount < 0 and current_coins < abs(amount):
+        if not updated:
+            # saldo pobierane tylko na potrzeby komunikatu błędu
+            cursor = await db.execute(USER_COINS_SQL, (user_id,))
+            current = await cursor.fetchone()
             raise HTTPException(
                 status_code=400,
-                detail=f"Niewystarczajaco monet. Potrzebujesz {abs(amount)}, masz {current_coins}"
+                detail=f"Niewystarczajaco monet. Potrzebujesz {abs(amount)}, masz {current['coins'] if current else 0}"
             )
 
-        # zabezpieczenie przed ujemną liczbą monet
-        if new_coins < 0:
-            raise HTTPException(status_code=400, detail="Liczba monet nie moze byc ujemna")
+        return updated
 
-        # aktualizacja liczby monet
-        await db.execute(
-            "UPDATE users SET coins = coins + ? WHERE id = ?",
-            (amount, user_id)
-        )
-        await db.commit()
-
-        # pobranie zaktualizowanej liczby monet
-        cursor = await db.execute(
-            "SELECT coins FROM users WHERE id = ?",
-            (user_id,)
-        )
-        updated_user = await cursor.fetchone()
+    updated_user = await run_write(_transaction)
 
-        action = "Dodano" if amount > 0 else "Wydano"
-        abs_amount = abs(amount)
+    action = "Dodano" if amount > 0 else "Wydano"
+    abs_amount = abs(amount)
 
-        return {
-            "message": f"{action} {abs_amount} monet",
-            "coins": updated_user["coins"],
-            "change": amount
-        }
+    return {
+        "message": f"{action} {abs_amount} monet",
+        "coins": updated_user["coins"],
+        "change": amount
+    }
 
 
 @app.post("/api/coins/spend")
-async def spend_coins(data: dict, authorization: str = Header(None)):
+async def spend_coins(data: dict, user: aiosqlite.Row = Depends(get_current_user)):
     """
     Wydaje monety użytkownika (dla funkcji FeedHabi).
 
     Args:
         data (dict): Słownik zawierający pole 'amount' z liczbą monet do wydania
-        authorization (str): Token autoryzacyjny w headerze
+        user (aiosqlite.Row): Zalogowany użytkownik (z get_current_user)
 
     Returns:
         dict: Informacja o wydatku, pozostała liczba monet
@@ -537,75 +668,50 @@ async def spend_coins(data: dict, authorization: str = Header(None)):
         HTTPException: Gdy token jest nieprawidłowy, kwota <= 0,
                       lub użytkownik ma niewystarczająco monet
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Brak tokenu autoryzacji")
-
-    token = authorization.replace("Bearer ", "")
-    user_id = verify_token(token)
-
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Nieprawidlowy token")
+    user_id = user["id"]
 
     amount = data.get('amount', 0)
     if amount <= 0:
         raise HTTPException(status_code=400, detail="Kwota musi byc wieksza od 0")
 
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
-        db.row_factory = aiosqlite.Row
-
-        # sprawdzenie czy użytkownik ma wystarczająco monet
-        cursor = await db.execute(
-            "SELECT coins FROM users WHERE id = ?",
-            (user_id,)
-        )
-        user = await cursor.fetchone()
-
-        if not user:
-            raise HTTPException(status_code=404, detail="Uzytkownik nie znaleziony")
+    # walidacja i odjęcie monet jednym warunkowym UPDATE w transakcji zapisu
+    async def _transaction(db):
+        cursor = await db.execute(CHANGE_USER_COINS_SQL, (-amount, user_id, -amount))
+        updated = await cursor.fetchone()
 
-        if user["coins"] < amount:
+        if not updated:
+            # saldo pobierane tylko na potrzeby komunikatu błędu
+            cursor = await db.execute(USER_COINS_SQL, (user_id,))
+            current = await cursor.fetchone()
             raise HTTPException(
                 status_code=400,
-                detail=f"Niewystarczajaco monet. Potrzebujesz {amount}, masz {user['coins']}"
+                detail=f"Niewystarczajaco monet. Potrzebujesz {amount}, masz {current['coins'] if current else 0}"
             )
 
-        # odjęcie monet
-        await db.execute(
-            "UPDATE users SET coins = coins - ? WHERE id = ?",
-            (amount, user_id)
-        )
-        await db.commit()
+        return updated
 
-        # pobranie nowej liczby monet
-        cursor = await db.execute(
-            "SELECT coins FROM users WHERE id = ?",
-            (user_id,)
-        )
-        updated_user = await cursor.fetchone()
+    updated_user = await run_write(_transaction)
 
-        return {
-            "message": f"Wydano {amount} monet",
-            "remaining_coins": updated_user["coins"],
-            "spent": amount
-        }
+    return {
+        "message": f"Wydano {amount} monet",
+        "remaining_coins": updated_user["coins"],
+        "spent": amount
+    }
 
 
 @app.get("/api/users")
-async def get_users():
+async def get_users(db: aiosqlite.Connection = Depends(get_db)):
     """
     Pobiera listę wszystkich użytkowników w systemie.
 
     Returns:
         dict: Lista użytkowników z ich podstawowymi danymi
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute("SELECT id, username, email, coins, created_at FROM users")
-        users = await cursor.fetchall()
-        return {
-            "users": [dict(user) for user in users]
-        }
+    cursor = await db.execute(ALL_USERS_SQL)
+    users = await cursor.fetchall()
+    return {
+        "users": [dict(user) for user in users]
+    }
 
 
 # ============================================
@@ -613,13 +719,13 @@ async def get_users():
 # ============================================
 
 @app.post("/api/habits")
-async def create_habit(habit_data: HabitCreate, authorization: str = Header(None)):
+async def create_habit(habit_data: HabitCreate, user: aiosqlite.Row = Depends(get_current_user)):
     """
     Tworzy nowy nawyk dla zalogowanego użytkownika.
 
     Args:
         habit_data (HabitCreate): Dane nowego nawyku
-        authorization (str): Token autoryzacyjny w headerze
+        user (aiosqlite.Row): Zalogowany użytkownik (z get_current_user)
 
     Returns:
         dict: Dane utworzonego nawyku
@@ -628,14 +734,7 @@ async def create_habit(habit_data: HabitCreate, authorization: str = Header(None
         HTTPException: Gdy token jest nieprawidłowy, nazwa nawyku jest pusta,
                       lub wartość monet jest poza zakresem 1-5
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Brak tokenu autoryzacji")
-
-    token = authorization.replace("Bearer ", "")
-    user_id = verify_token(token)
-
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Nieprawidlowy token")
+    user_id = user["id"]
 
     # walidacja danych nawyku
     if not habit_data.name.strip():
@@ -644,114 +743,121 @@ async def create_habit(habit_data: HabitCreate, authorization: str = Header(None
     if habit_data.coin_value < 1 or habit_data.coin_value > 5:
         raise HTTPException(status_code=400, detail="Wartosc monet musi byc miedzy 1 a 5")
 
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
-        db.row_factory = aiosqlite.Row
+    created_at = datetime.now().isoformat()
 
+    async def _transaction(db):
         # dodanie nowego nawyku do bazy danych
         cursor = await db.execute(
-            """INSERT INTO habits (user_id, name, description, reward_coins, icon, is_active, created_at)
-               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            INSERT_HABIT_SQL,
             (user_id, habit_data.name, habit_data.description, habit_data.coin_value,
-             habit_data.icon, True, datetime.now().isoformat())
+             habit_data.icon, True, created_at)
         )
-        await db.commit()
 
         habit_id = cursor.lastrowid
+        await bump_data_version(db, user_id)
+        await log_changes(db, user_id, "habit_created", [(habit_id, {
+            "name": habit_data.name,
+            "description": habit_data.description or "",
+            "coin_value": habit_data.coin_value,
+            "icon": habit_data.icon or "target",
+            "created_at": created_at
+        })])
 
         # pobranie utworzonego nawyku
-        cursor = await db.execute(
-            "SELECT id, user_id, name, description, reward_coins, is_active, created_at, icon FROM habits WHERE id = ?",
-            (habit_id,)
-        )
-        habit = await cursor.fetchone()
+        cursor = await db.execute(NEW_HABIT_SQL, (habit_id,))
+        return await cursor.fetchone()
 
-        return {
-            "id": habit["id"],
-            "name": habit["name"],
-            "description": habit["description"] or "",
-            "coin_value": habit["reward_coins"],
-            "icon": habit["icon"] or "target",
-            "is_active": bool(habit["is_active"]),
-            "created_at": habit["created_at"],
-            "completion_dates": []
-        }
+    habit = await run_write(_transaction)
+
+    return {
+        "id": habit["id"],
+        "name": habit["name"],
+        "description": habit["description"] or "",
+        "coin_value": habit["reward_coins"],
+        "icon": habit["icon"] or "target",
+        "is_active": bool(habit["is_active"]),
+        "created_at": habit["created_at"],
+        "completion_dates": []
+    }
 
 
 @app.get("/api/habits")
-async def get_user_habits(authorization: str = Header(None)):
+async def get_user_habits(request: Request, response: Response,
+                          since: Optional[date] = None,
+                          days: Optional[int] = Query(None, ge=1, le=366),
+                          user: aiosqlite.Row = Depends(get_current_user),
+                          db: aiosqlite.Connection = Depends(get_db)):
     """
     Pobiera wszystkie aktywne nawyki zalogowanego użytkownika wraz z datami ukończenia.
 
+    Zwracane są tylko daty wykonań z okna czasowego (domyślnie ostatnie
+    HABITS_COMPLETION_WINDOW_DAYS dni), a łączną liczbę wykonań podaje
+    pole completion_count.
+
     Args:
-        authorization (str): Token autoryzacyjny w headerze
+        since (date, optional): Najwcześniejsza zwracana data wykonania (YYYY-MM-DD)
+        days (int, optional): Długość okna w dniach wstecz od dzisiaj (1-366),
+            ignorowana gdy podano since
+        user (aiosqlite.Row): Zalogowany użytkownik (z get_current_user)
 
     Returns:
-        list: Lista nawyków użytkownika z datami ukończenia
+        list: Lista nawyków użytkownika z datami ukończenia w oknie
 
     Raises:
         HTTPException: Gdy token jest nieprawidłowy
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Brak tokenu autoryzacji")
+    user_id = user["id"]
 
-    token = authorization.replace("Bearer ", "")
-    user_id = verify_token(token)
+    not_modified = conditional_response(request, response, user)
+    if not_modified:
+        return not_modified
 
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Nieprawidlowy token")
+    # początek okna historii wykonań
+    if since is None:
+        since = date.today() - timedelta(days=(days or HABITS_COMPLETION_WINDOW_DAYS) - 1)
 
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    # pobranie nawyków użytkownika z datami ukończenia
+    cursor = await db.execute(USER_HABITS_WITH_COMPLETIONS_SQL, (since.isoformat(), user_id))
+    habits = await cursor.fetchall()
 
-        # pobranie nawyków użytkownika z datami ukończenia
-        cursor = await db.execute(
-            """SELECT h.id,
-                      h.name,
-                      h.description,
-                      h.reward_coins,
-                      h.is_active,
-                      h.created_at,
-                      COALESCE(h.icon, 'target')         as icon,
-                      GROUP_CONCAT(hc.completed_at) as completion_dates
-               FROM habits h
-                        LEFT JOIN habit_completions hc ON h.id = hc.habit_id
-               WHERE h.user_id = ?
-                 AND h.is_active = 1
-               GROUP BY h.id, h.name, h.description, h.reward_coins, h.is_active, h.created_at, h.icon
-               ORDER BY h.created_at DESC""",
-            (user_id,)
-        )
-        habits = await cursor.fetchall()
+    return [habit_with_completions(habit) for habit in habits]
 
-        result = []
-        for habit in habits:
-            completion_dates = []
-            if habit["completion_dates"]:
-                completion_dates = habit["completion_dates"].split(",")
 
-            result.append({
-                "id": habit["id"],
-                "name": habit["name"],
-                "description": habit["description"] or "",
-                "coin_value": habit["reward_coins"],
-                "icon": habit["icon"] or "target",
-                "is_active": bool(habit["is_active"]),
-                "created_at": habit["created_at"],
-                "completion_dates": completion_dates
-            })
+def habit_with_completions(habit: aiosqlite.Row) -> dict:
+    """
+    Zamienia wiersz USER_HABITS_WITH_COMPLETIONS_SQL na odpowiedź API nawyku.
 
-        return result
+    Args:
+        habit (aiosqlite.Row): Wiersz nawyku z completion_count i completion_dates
+
+    Returns:
+        dict: Nawyk z posortowanymi datami wykonań w oknie
+    """
+    completion_dates = []
+    if habit["completion_dates"]:
+        completion_dates = sorted(habit["completion_dates"].split(","))
+
+    return {
+        "id": habit["id"],
+        "name": habit["name"],
+        "description": habit["description"] or "",
+        "coin_value": habit["reward_coins"],
+        "icon": habit["icon"] or "target",
+        "is_active": bool(habit["is_active"]),
+        "created_at": habit["created_at"],
+        "completion_count": habit["completion_count"],
+        "completion_dates": completion_dates
+    }
 
 
 @app.post("/api/habits/{habit_id}/complete")
-async def complete_habit(habit_id: int, authorization: str = Header(None)):
+async def complete_habit(habit_id: int, user: aiosqlite.Row = Depends(get_current_user)):
     """
     Oznacza nawyk jako wykonany w dzisiejszym dniu i przyznaje monety.
 
     Args:
         habit_id (int): ID nawyku do wykonania
-        authorization (str): Token autoryzacyjny w headerze
+        user (aiosqlite.Row): Zalogowany użytkownik (z get_current_user)
 
     Returns:
         dict: Informacja o wykonaniu nawyku, zarobione monety i nowa suma monet
@@ -760,80 +866,87 @@ async def complete_habit(habit_id: int, authorization: str = Header(None)):
         HTTPException: Gdy token jest nieprawidłowy, nawyk nie istnieje,
                       lub nawyk już został wykonany dzisiaj
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Brak tokenu autoryzacji")
+    user_id = user["id"]
 
-    token = authorization.replace("Bearer ", "")
-    user_id = verify_token(token)
+    today = date.today().isoformat()
 
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Nieprawidlowy token")
+    # wpis wykonania, monety i statystyki w jednej transakcji zapisu
+    async def _transaction(db):
+        return await record_habit_completion(db, user_id, habit_id, today)
 
-    today = date.today().isoformat()
+    try:
+        completion = await run_write(_transaction)
+    except sqlite3.IntegrityError:
+        # ograniczenie UNIQUE (habit_id, user_id, completed_at)
+        raise HTTPException(status_code=400, detail="Nawyk juz wykonany dzisiaj")
 
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
-        db.row_factory = aiosqlite.Row
+    if not completion:
+        raise HTTPException(status_code=404, detail="Nawyk nie znaleziony")
 
-        # sprawdzenie czy nawyk istnieje i należy do użytkownika
-        cursor = await db.execute(
-            "SELECT id, name, reward_coins FROM habits WHERE id = ? AND user_id = ? AND is_active = 1",
-            (habit_id, user_id)
-        )
-        habit = await cursor.fetchone()
+    return {
+        "message": f"Brawo! Wykonano nawyk '{completion['habit_name']}'",
+        "coins_earned": completion["coins_earned"],
+        "total_coins": completion["total_coins"],
+        "completion_date": today
+    }
 
-        if not habit:
-            raise HTTPException(status_code=404, detail="Nawyk nie znaleziony")
 
-        # sprawdzenie czy nawyk nie został już wykonany
-        cursor = await db.execute(
-            "SELECT id FROM habit_completions WHERE habit_id = ? AND user_id = ? AND completed_at = ?",
-            (habit_id, user_id, today)
-        )
-        existing_completion = await cursor.fetchone()
+@app.post("/api/habits/complete-batch")
+async def complete_habits_batch(batch: HabitCompleteBatch, user: aiosqlite.Row = Depends(get_current_user)):
+    """
+    Oznacza wiele nawyków jako wykonane w dzisiejszym dniu jednym żądaniem.
 
-        if existing_completion:
-            raise HTTPException(status_code=400, detail="Nawyk juz wykonany dzisiaj")
+    Przeznaczone do wysłania kolejki wykonań zapisanych offline po odzyskaniu
+    połączenia: wszystkie wykonania, monety i statystyki są zapisywane w jednej
+    transakcji, a wynik jest zwracany osobno dla każdego nawyku - nawyk już
+    wykonany dzisiaj lub nieistniejący nie przerywa pozostałych.
 
-        coins_earned = habit["reward_coins"]
+    Args:
+        batch (HabitCompleteBatch): Lista ID nawyków (habit_ids)
+        user (aiosqlite.Row): Zalogowany użytkownik (z get_current_user)
 
-        # dodanie wpisu o wykonaniu nawyku
-        await db.execute(
-            "INSERT INTO habit_completions (habit_id, user_id, completed_at, coins_earned) VALUES (?, ?, ?, ?)",
-            (habit_id, user_id, today, coins_earned)
-        )
+    Returns:
+        dict: Wyniki per nawyk (results: habit_id, status - "completed",
+              "already_completed" lub "not_found", dla wykonanych także
+              habit_name i coins_earned), liczba wykonanych nawyków, suma
+              zarobionych monet i nowa suma monet
 
-        # dodanie monet do konta użytkownika
-        await db.execute(
-            "UPDATE users SET coins = coins + ? WHERE id = ?",
-            (coins_earned, user_id)
+    Raises:
+        HTTPException: Gdy token jest nieprawidłowy, lista jest pusta
+                      lub dłuższa niż MAX_COMPLETION_BATCH_SIZE
+    """
+    user_id = user["id"]
+
+    if not batch.habit_ids:
+        raise HTTPException(status_code=400, detail="Lista nawykow jest pusta")
+
+    if len(batch.habit_ids) > MAX_COMPLETION_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maksymalnie {MAX_COMPLETION_BATCH_SIZE} nawykow w jednym zadaniu"
         )
 
-        await db.commit()
+    today = date.today().isoformat()
 
-    # Aktualizacja statystyk (poza główną transakcją)
-    await update_habit_statistics(user_id, habit_id, today)
+    async def _transaction(db):
+        return await record_habit_completions_batch(db, user_id, batch.habit_ids, today)
 
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        # pobranie nowej liczby monet użytkownika
-        cursor = await db.execute(
-            "SELECT coins FROM users WHERE id = ?",
-            (user_id,)
-        )
-        user = await cursor.fetchone()
-        total_coins = user["coins"] if user else 0
+    completion = await run_write(_transaction)
 
-        return {
-            "message": f"Brawo! Wykonano nawyk '{habit['name']}'",
-            "coins_earned": coins_earned,
-            "total_coins": total_coins,
-            "completion_date": today
-        }
+    completed = sum(1 for item in completion["results"] if item["status"] == "completed")
+
+    return {
+        "message": f"Wykonano {completed} z {len(completion['results'])} nawykow",
+        "results": completion["results"],
+        "completed": completed,
+        "coins_earned": completion["coins_earned"],
+        "total_coins": completion["total_coins"],
+        "completion_date": today
+    }
 
 
 @app.delete("/api/habits/{habit_id}")
-async def delete_habit(habit_id: int, authorization: str = Header(None)):
+async def delete_habit(habit_id: int, user: aiosqlite.Row = Depends(get_current_user)):
     """
     Usuwa nawyk użytkownika (oznacza jako nieaktywny).
 
@@ -842,7 +955,7 @@ async def delete_habit(habit_id: int, authorization: str = Header(None)):
 
     Args:
         habit_id (int): ID nawyku do usunięcia
-        authorization (str): Token autoryzacyjny w headerze
+        user (aiosqlite.Row): Zalogowany użytkownik (z get_current_user)
 
     Returns:
         dict: Potwierdzenie usunięcia nawyku
@@ -850,59 +963,64 @@ async def delete_habit(habit_id: int, authorization: str = Header(None)):
     Raises:
         HTTPException: Gdy token jest nieprawidłowy lub nawyk nie istnieje
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Brak tokenu autoryzacji")
-
-    token = authorization.replace("Bearer ", "")
-    user_id = verify_token(token)
+    user_id = user["id"]
 
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Nieprawidlowy token")
-
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
-
-        # sprawdzenie czy nawyk istnieje i należy do użytkownika
-        cursor = await db.execute(
-            "SELECT id FROM habits WHERE id = ? AND user_id = ?",
-            (habit_id, user_id)
-        )
+    async def _transaction(db):
+        # sprawdzenie czy nawyk istnieje, jest aktywny i należy do użytkownika
+        cursor = await db.execute(HABIT_OWNER_SQL, (habit_id, user_id))
         if not await cursor.fetchone():
             raise HTTPException(status_code=404, detail="Nawyk nie znaleziony")
 
         # oznaczenie nawyku jako nieaktywny
-        await db.execute(
-            "UPDATE habits SET is_active = 0 WHERE id = ?",
-            (habit_id,)
-        )
-        await db.commit()
+        await db.execute(DEACTIVATE_HABIT_SQL, (habit_id,))
+        await bump_data_version(db, user_id)
+        await log_changes(db, user_id, "habit_deleted", [(habit_id, None)])
+
+    await run_write(_transaction)
 
-        return {"message": "Nawyk usuniety pomyslnie"}
+    return {"message": "Nawyk usuniety pomyslnie"}
 
 
 # ============================================
 # ENDPOINTY DLA UBRAŃ
 # ============================================
 
+def catalog_response(request: Request, body: bytes, etag: str) -> Response:
+    """
+    Buduje odpowiedź z gotowych bajtów JSON katalogu.
+
+    Args:
+        request (Request): Żądanie HTTP (sprawdzany nagłówek If-None-Match)
+        body (bytes): Zakodowany katalog
+        etag (str): ETag katalogu
+
+    Returns:
+        Response: 304 gdy klient ma aktualny katalog, w przeciwnym razie 200 z treścią
+    """
+    headers = {"ETag": etag, "Cache-Control": "public, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @app.get("/api/clothing")
-async def get_clothing_items():
+async def get_clothing_items(request: Request):
     """
     Pobiera wszystkie dostępne ubrania.
 
+    Katalog jest serwowany z pamięci podręcznej jako gotowe bajty JSON.
+
     Returns:
         list: Lista wszystkich ubrań w systemie
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
-            "SELECT id, name, cost, icon, category FROM clothing_items ORDER BY cost ASC"
-        )
-        items = await cursor.fetchall()
-        return [dict(item) for item in items]
+    body, etag = await catalog_cache.clothing_json()
+    return catalog_response(request, body, etag)
 
 
 @app.get("/api/clothing/owned")
-async def get_owned_clothing(authorization: str = Header(None)):
+async def get_owned_clothing(request: Request, response: Response, user: aiosqlite.Row = Depends(get_current_user),
+                             db: aiosqlite.Connection = Depends(get_db)):
     """
     Pobiera ubrania posiadane przez użytkownika + aktualnie noszone ubranie.
 
@@ -910,7 +1028,7 @@ async def get_owned_clothing(authorization: str = Header(None)):
     Jeśli nie - automatycznie czyści.
 
     Args:
-        authorization (str): Token autoryzacyjny w headerze
+        user (aiosqlite.Row): Zalogowany użytkownik (z get_current_user)
 
     Returns:
         dict: Lista ID posiadanych ubrań + ID aktualnie noszonego ubrania
@@ -918,69 +1036,50 @@ async def get_owned_clothing(authorization: str = Header(None)):
     Raises:
         HTTPException: Gdy token jest nieprawidłowy
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Brak tokenu autoryzacji")
+    user_id = user["id"]
 
-    token = authorization.replace("Bearer ", "")
-    user_id = verify_token(token)
+    not_modified = conditional_response(request, response, user)
+    if not_modified:
+        return not_modified
 
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Nieprawidlowy token")
+    # Pobierz posiadane ubrania
+    cursor = await db.execute(OWNED_CLOTHING_SQL, (user_id,))
+    owned = await cursor.fetchall()
+    owned_clothing_ids = [item["clothing_id"] for item in owned]
 
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
-        db.row_factory = aiosqlite.Row
+    # Aktualnie noszone ubranie (z wiersza użytkownika) - z walidacją
+    current_clothing_id = user["current_clothing_id"]
+    try:
+        # KLUCZOWA WALIDACJA: Sprawdź czy użytkownik faktycznie posiada to ubranie
+        if current_clothing_id and current_clothing_id not in owned_clothing_ids:
+            logger.warning(
+                "User %s ma current_clothing_id=%s ktorego nie posiada - CZYSZCZENIE", user_id, current_clothing_id)
 
-        # Pobierz posiadane ubrania
-        cursor = await db.execute(
-            "SELECT clothing_id FROM user_clothing WHERE user_id = ?",
-            (user_id,)
-        )
-        owned = await cursor.fetchall()
-        owned_clothing_ids = [item["clothing_id"] for item in owned]
+            # Automatycznie wyczyść nieprawidłowe ubranie (połączenie z puli jest tylko do odczytu)
+            await execute_query(CLEAR_UNOWNED_CLOTHING_SQL, (user_id, current_clothing_id))
+            current_clothing_id = None
+            # wersja danych właśnie wzrosła - ETag policzony przed czyszczeniem jest nieaktualny
+            response.headers.pop("ETag", None)
+            logger.info("Wyczyszczono nieprawidlowe current_clothing_id dla user %s", user_id)
 
-        # Pobierz aktualnie noszone ubranie - z walidacją
+    except Exception as e:
+        logger.error("Blad pobierania current_clothing_id: %s", e)
         current_clothing_id = None
-        try:
-            cursor = await db.execute(
-                "SELECT current_clothing_id FROM users WHERE id = ?",
-                (user_id,)
-            )
-            user = await cursor.fetchone()
-            current_clothing_id = user["current_clothing_id"] if user else None
-
-            # KLUCZOWA WALIDACJA: Sprawdź czy użytkownik faktycznie posiada to ubranie
-            if current_clothing_id and current_clothing_id not in owned_clothing_ids:
-                print(
-                    f"WARNING: User {user_id} ma current_clothing_id={current_clothing_id} ktorego nie posiada - CZYSZCZENIE")
-
-                # Automatycznie wyczyść nieprawidłowe ubranie
-                await db.execute(
-                    "UPDATE users SET current_clothing_id = NULL WHERE id = ?",
-                    (user_id,)
-                )
-                await db.commit()
-                current_clothing_id = None
-                print(f"Wyczyszczono nieprawidlowe current_clothing_id dla user {user_id}")
-
-        except Exception as e:
-            print(f"Blad pobierania current_clothing_id: {e}")
-            current_clothing_id = None
 
-        return {
-            "owned_clothing_ids": owned_clothing_ids,
-            "current_clothing_id": current_clothing_id
-        }
+    return {
+        "owned_clothing_ids": owned_clothing_ids,
+        "current_clothing_id": current_clothing_id
+    }
 
 
 @app.post("/api/clothing/purchase/{clothing_id}")
-async def purchase_clothing(clothing_id: int, authorization: str = Header(None)):
+async def purchase_clothing(clothing_id: int, user: aiosqlite.Row = Depends(get_current_user)):
     """
     Kupuje ubranie dla użytkownika.
 
     Args:
         clothing_id (int): ID ubrania do zakupu
-        authorization (str): Token autoryzacyjny w headerze
+        user (aiosqlite.Row): Zalogowany użytkownik (z get_current_user)
 
     Returns:
         dict: Potwierdzenie zakupu, pozostałe monety i nazwa przedmiotu
@@ -989,88 +1088,56 @@ async def purchase_clothing(clothing_id: int, authorization: str = Header(None))
         HTTPException: Gdy token jest nieprawidłowy, przedmiot nie istnieje,
                       użytkownik już posiada przedmiot, lub ma za mało monet
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Brak tokenu autoryzacji")
-
-    token = authorization.replace("Bearer ", "")
-    user_id = verify_token(token)
+    user_id = user["id"]
 
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Nieprawidlowy token")
-
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
-        db.row_factory = aiosqlite.Row
-
-        # Sprawdzenie czy przedmiot istnieje
-        cursor = await db.execute(
-            "SELECT id, name, cost, icon FROM clothing_items WHERE id = ?",
-            (clothing_id,)
-        )
-        clothing = await cursor.fetchone()
+    # Sprawdzenie czy przedmiot istnieje (katalog w pamięci)
+    clothing = await catalog_cache.get_clothing(clothing_id)
 
-        if not clothing:
-            raise HTTPException(status_code=404, detail="Przedmiot nie znaleziony")
+    if not clothing:
+        raise HTTPException(status_code=404, detail="Przedmiot nie znaleziony")
 
+    # sprawdzenia i zakup w jednej transakcji zapisu
+    async def _transaction(db):
         # Sprawdzenie czy użytkownik już posiada ten przedmiot
-        cursor = await db.execute(
-            "SELECT id FROM user_clothing WHERE user_id = ? AND clothing_id = ?",
-            (user_id, clothing_id)
-        )
+        cursor = await db.execute(OWNED_CLOTHING_ITEM_SQL, (user_id, clothing_id))
         if await cursor.fetchone():
             raise HTTPException(
                 status_code=400,
                 detail=f"Juz posiadasz {clothing['name']}!"
             )
 
-        # Sprawdzenie czy użytkownik ma wystarczająco monet
-        cursor = await db.execute(
-            "SELECT coins FROM users WHERE id = ?",
-            (user_id,)
-        )
-        user = await cursor.fetchone()
-
-        if not user:
-            raise HTTPException(status_code=404, detail="Uzytkownik nie znaleziony")
+        # Odjęcie monet (tylko gdy wystarczy) wraz ze zwiększeniem wersji danych
+        cursor = await db.execute(CHANGE_USER_COINS_SQL, (-clothing["cost"], user_id, -clothing["cost"]))
+        updated = await cursor.fetchone()
 
-        if user["coins"] < clothing["cost"]:
+        if not updated:
+            # saldo pobierane tylko na potrzeby komunikatu błędu
+            cursor = await db.execute(USER_COINS_SQL, (user_id,))
+            current = await cursor.fetchone()
             raise HTTPException(
                 status_code=400,
-                detail=f"Potrzebujesz {clothing['cost']} monet, ale masz tylko {user['coins']}!"
+                detail=f"Potrzebujesz {clothing['cost']} monet, ale masz tylko {current['coins'] if current else 0}!"
             )
 
-        # Odjęcie monet
-        await db.execute(
-            "UPDATE users SET coins = coins - ? WHERE id = ?",
-            (clothing["cost"], user_id)
-        )
-
         # Dodanie przedmiotu do garderoby użytkownika
-        await db.execute(
-            "INSERT INTO user_clothing (user_id, clothing_id) VALUES (?, ?)",
-            (user_id, clothing_id)
-        )
+        await db.execute(INSERT_USER_CLOTHING_SQL, (user_id, clothing_id))
+        await log_changes(db, user_id, "clothing_purchased", [(clothing_id, {"cost": clothing["cost"]})])
 
-        await db.commit()
+        return updated
 
-        # Pobranie nowej liczby monet
-        cursor = await db.execute(
-            "SELECT coins FROM users WHERE id = ?",
-            (user_id,)
-        )
-        updated_user = await cursor.fetchone()
+    updated_user = await run_write(_transaction)
 
-        return {
-            "message": f"Zakupiono {clothing['name']}!",
-            "item_name": clothing["name"],
-            "item_icon": clothing["icon"],
-            "cost": clothing["cost"],
-            "remaining_coins": updated_user["coins"]
-        }
+    return {
+        "message": f"Zakupiono {clothing['name']}!",
+        "item_name": clothing["name"],
+        "item_icon": clothing["icon"],
+        "cost": clothing["cost"],
+        "remaining_coins": updated_user["coins"]
+    }
 
 
 @app.post("/api/clothing/wear/{clothing_id}")
-async def wear_clothing(clothing_id: int, authorization: str = Header(None)):
+async def wear_clothing(clothing_id: int, user: aiosqlite.Row = Depends(get_current_user)):
     """
     Zmienia aktualnie noszone ubranie dla użytkownika.
 
@@ -1078,7 +1145,7 @@ async def wear_clothing(clothing_id: int, authorization: str = Header(None)):
 
     Args:
         clothing_id (int): ID ubrania do założenia
-        authorization (str): Token autoryzacyjny w headerze
+        user (aiosqlite.Row): Zalogowany użytkownik (z get_current_user)
 
     Returns:
         dict: Potwierdzenie zmiany ubrania
@@ -1086,24 +1153,12 @@ async def wear_clothing(clothing_id: int, authorization: str = Header(None)):
     Raises:
         HTTPException: Gdy token jest nieprawidłowy lub użytkownik nie posiada ubrania
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Brak tokenu autoryzacji")
-
-    token = authorization.replace("Bearer ", "")
-    user_id = verify_token(token)
-
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Nieprawidlowy token")
-
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
-        db.row_factory = aiosqlite.Row
+    user_id = user["id"]
 
+    # sprawdzenie posiadania i zmiana ubrania w jednej transakcji zapisu
+    async def _transaction(db):
         # Sprawdź czy użytkownik posiada to ubranie
-        cursor = await db.execute(
-            "SELECT id FROM user_clothing WHERE user_id = ? AND clothing_id = ?",
-            (user_id, clothing_id)
-        )
+        cursor = await db.execute(OWNED_CLOTHING_ITEM_SQL, (user_id, clothing_id))
         owned = await cursor.fetchone()
 
         if not owned:
@@ -1113,45 +1168,29 @@ async def wear_clothing(clothing_id: int, authorization: str = Header(None)):
             )
 
         # Zaktualizuj aktualnie noszone ubranie
-        try:
-            await db.execute(
-                "UPDATE users SET current_clothing_id = ? WHERE id = ?",
-                (clothing_id, user_id)
-            )
-            await db.commit()
-            print(f"User {user_id} zalozyl ubranie {clothing_id}")
-        except Exception as e:
-            print(f"Blad aktualizacji current_clothing_id: {e}")
-            # Jeśli kolumna nie istnieje, spróbuj ją dodać
-            await ensure_clothing_column_exists()
-            # Spróbuj ponownie
-            await db.execute(
-                "UPDATE users SET current_clothing_id = ? WHERE id = ?",
-                (clothing_id, user_id)
-            )
-            await db.commit()
+        await db.execute(SET_CURRENT_CLOTHING_SQL, (clothing_id, user_id))
+        await bump_data_version(db, user_id)
 
-        # Pobierz nazwę ubrania dla potwierdzenia
-        cursor = await db.execute(
-            "SELECT name FROM clothing_items WHERE id = ?",
-            (clothing_id,)
-        )
-        clothing = await cursor.fetchone()
+    await run_write(_transaction)
+    logger.info("User %s zalozyl ubranie %s", user_id, clothing_id, extra=SAMPLED)
 
-        return {
-            "message": f"Zalozono {clothing['name'] if clothing else 'ubranie'}",
-            "current_clothing_id": clothing_id,
-            "user_id": user_id
-        }
+    # Pobierz nazwę ubrania dla potwierdzenia (katalog w pamięci)
+    clothing = await catalog_cache.get_clothing(clothing_id)
+
+    return {
+        "message": f"Zalozono {clothing['name'] if clothing else 'ubranie'}",
+        "current_clothing_id": clothing_id,
+        "user_id": user_id
+    }
 
 
 @app.delete("/api/clothing/wear")
-async def remove_clothing(authorization: str = Header(None)):
+async def remove_clothing(user: aiosqlite.Row = Depends(get_current_user)):
     """
     Usuwa aktualnie noszone ubranie (wraca do domyślnego wyglądu).
 
     Args:
-        authorization (str): Token autoryzacyjny w headerze
+        user (aiosqlite.Row): Zalogowany użytkownik (z get_current_user)
 
     Returns:
         dict: Potwierdzenie zdjęcia ubrania
@@ -1159,34 +1198,16 @@ async def remove_clothing(authorization: str = Header(None)):
     Raises:
         HTTPException: Gdy token jest nieprawidłowy
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Brak tokenu autoryzacji")
-
-    token = authorization.replace("Bearer ", "")
-    user_id = verify_token(token)
+    user_id = user["id"]
 
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Nieprawidlowy token")
-
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
-
-        # Usuń aktualnie noszone ubranie
-        try:
-            await db.execute(
-                "UPDATE users SET current_clothing_id = NULL WHERE id = ?",
-                (user_id,)
-            )
-            await db.commit()
-            print(f"User {user_id} zdjal ubranie")
-        except Exception as e:
-            print(f"Blad usuwania current_clothing_id: {e}")
-            # Jeśli kolumna nie istnieje, to już domyślnie NULL
+    # Usuń aktualnie noszone ubranie
+    await execute_query(CLEAR_CURRENT_CLOTHING_SQL, (user_id,))
+    logger.info("User %s zdjal ubranie", user_id, extra=SAMPLED)
 
-        return {
-            "message": "Ubranie zdjete - powrot do domyslnego wygladu",
-            "current_clothing_id": None
-        }
+    return {
+        "message": "Ubranie zdjete - powrot do domyslnego wygladu",
+        "current_clothing_id": None
+    }
 
 
 # ============================================
@@ -1194,7 +1215,7 @@ async def remove_clothing(authorization: str = Header(None)):
 # ============================================
 
 @app.get("/api/slot-machine/check")
-async def check_slot_machine_limit(authorization: str = Header(None)):
+async def check_slot_machine_limit(user: aiosqlite.Row = Depends(get_current_user)):
     """
     Sprawdza czy użytkownik może dzisiaj grać w automat.
 
@@ -1204,57 +1225,24 @@ async def check_slot_machine_limit(authorization: str = Header(None)):
     Raises:
         HTTPException: Gdy token jest nieprawidłowy
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Brak tokenu autoryzacji")
-
-    token = authorization.replace("Bearer ", "")
-    user_id = verify_token(token)
-
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Nieprawidlowy token")
-
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-
-        try:
-            cursor = await db.execute(
-                "SELECT last_slot_machine_play FROM users WHERE id = ?",
-                (user_id,)
-            )
-            user = await cursor.fetchone()
-
-            if not user:
-                raise HTTPException(status_code=404, detail="Uzytkownik nie znaleziony")
-
-            last_play = user["last_slot_machine_play"]
-            today = date.today()
-
-            # Sprawdź czy ostatnia gra była dzisiaj
-            can_play = True
-            if last_play:
-                last_play_date = date.fromisoformat(last_play) if isinstance(last_play, str) else last_play
-                can_play = last_play_date < today
+    last_play = user["last_slot_machine_play"]
+    today = date.today()
 
-            return {
-                "can_play": can_play,
-                "last_play_date": str(last_play) if last_play else None,
-                "next_available": str(today) if can_play else str(today)
-            }
+    # Sprawdź czy ostatnia gra była dzisiaj
+    can_play = True
+    if last_play:
+        last_play_date = date.fromisoformat(last_play) if isinstance(last_play, str) else last_play
+        can_play = last_play_date < today
 
-        except Exception as e:
-            print(f"Blad sprawdzania limitu automatu: {e}")
-            # Jeśli kolumna nie istnieje, spróbuj ją dodać
-            await ensure_slot_machine_column_exists()
-            # Domyślnie pozwól grać
-            return {
-                "can_play": True,
-                "last_play_date": None,
-                "next_available": str(date.today())
-            }
+    return {
+        "can_play": can_play,
+        "last_play_date": str(last_play) if last_play else None,
+        "next_available": str(today) if can_play else str(today)
+    }
 
 
 @app.post("/api/slot-machine/play")
-async def record_slot_machine_play(authorization: str = Header(None)):
+async def record_slot_machine_play(user: aiosqlite.Row = Depends(get_current_user)):
     """
     Zapisuje że użytkownik zagrał dzisiaj w automat.
 
@@ -1264,74 +1252,39 @@ async def record_slot_machine_play(authorization: str = Header(None)):
     Raises:
         HTTPException: Gdy token jest nieprawidłowy lub użytkownik już dzisiaj grał
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Brak tokenu autoryzacji")
-
-    token = authorization.replace("Bearer ", "")
-    user_id = verify_token(token)
-
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Nieprawidlowy token")
+    user_id = user["id"]
 
     today = date.today()
 
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
-        db.row_factory = aiosqlite.Row
-
-        try:
-            # Sprawdź czy użytkownik już dzisiaj grał
-            cursor = await db.execute(
-                "SELECT last_slot_machine_play FROM users WHERE id = ?",
-                (user_id,)
-            )
-            user = await cursor.fetchone()
-
-            if not user:
-                raise HTTPException(status_code=404, detail="Uzytkownik nie znaleziony")
-
-            last_play = user["last_slot_machine_play"]
+    # sprawdzenie limitu i zapis gry w jednej transakcji zapisu
+    async def _transaction(db):
+        # Sprawdź czy użytkownik już dzisiaj grał
+        cursor = await db.execute(LAST_SLOT_MACHINE_PLAY_SQL, (user_id,))
+        user = await cursor.fetchone()
 
-            # Walidacja - czy już dzisiaj grał
-            if last_play:
-                last_play_date = date.fromisoformat(last_play) if isinstance(last_play, str) else last_play
-                if last_play_date == today:
-                    raise HTTPException(status_code=400, detail="Juz dzisiaj zagrales")
+        if not user:
+            raise HTTPException(status_code=404, detail="Uzytkownik nie znaleziony")
 
-            # Zapisz dzisiejszą datę
-            await db.execute(
-                "UPDATE users SET last_slot_machine_play = ? WHERE id = ?",
-                (today.isoformat(), user_id)
-            )
-            await db.commit()
+        last_play = user["last_slot_machine_play"]
 
-            print(f"User {user_id} zagral w automat dnia {today}")
+        # Walidacja - czy już dzisiaj grał
+        if last_play:
+            last_play_date = date.fromisoformat(last_play) if isinstance(last_play, str) else last_play
+            if last_play_date == today:
+                raise HTTPException(status_code=400, detail="Juz dzisiaj zagrales")
 
-            return {
-                "success": True,
-                "message": "Gra zapisana",
-                "play_date": str(today)
-            }
+        # Zapisz dzisiejszą datę
+        await db.execute(SET_LAST_SLOT_MACHINE_PLAY_SQL, (today.isoformat(), user_id))
+        await bump_data_version(db, user_id)
 
-        except HTTPException:
-            raise
-        except Exception as e:
-            print(f"Blad zapisywania gry w automat: {e}")
-            # Jeśli kolumna nie istnieje, spróbuj ją dodać
-            await ensure_slot_machine_column_exists()
-
-            # Spróbuj ponownie
-            await db.execute(
-                "UPDATE users SET last_slot_machine_play = ? WHERE id = ?",
-                (today.isoformat(), user_id)
-            )
-            await db.commit()
+    await run_write(_transaction)
+    logger.info("User %s zagral w automat dnia %s", user_id, today, extra=SAMPLED)
 
-            return {
-                "success": True,
-                "message": "Gra zapisana",
-                "play_date": str(today)
-            }
+    return {
+        "success": True,
+        "message": "Gra zapisana",
+        "play_date": str(today)
+    }
 
 
 # ============================================
@@ -1339,12 +1292,13 @@ async def record_slot_machine_play(authorization: str = Header(None)):
 # ============================================
 
 @app.get("/api/habits/statistics")
-async def get_habit_statistics(authorization: str = Header(None)):
+async def get_habit_statistics(request: Request, response: Response, user: aiosqlite.Row = Depends(get_current_user),
+                               db: aiosqlite.Connection = Depends(get_db)):
     """
     Pobiera statystyki nawyków użytkownika.
 
     Args:
-        authorization (str): Token autoryzacyjny w headerze
+        user (aiosqlite.Row): Zalogowany użytkownik (z get_current_user)
 
     Returns:
         dict: Statystyki wszystkich nawyków użytkownika
@@ -1352,68 +1306,48 @@ async def get_habit_statistics(authorization: str = Header(None)):
     Raises:
         HTTPException: Gdy token jest nieprawidłowy
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Brak tokenu autoryzacji")
-
-    token = authorization.replace("Bearer ", "")
-    user_id = verify_token(token)
-
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Nieprawidlowy token")
-
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-
-        # Pobierz statystyki
-        cursor = await db.execute(
-            """SELECT hs.*,
-                      h.name as habit_name,
-                      h.icon as habit_icon,
-                      h.reward_coins
-               FROM habit_statistics hs
-                        JOIN habits h ON hs.habit_id = h.id
-               WHERE hs.user_id = ?
-                 AND h.is_active = 1
-               ORDER BY hs.total_completions DESC""",
-            (user_id,)
-        )
-        stats = await cursor.fetchall()
-
-        # Pobierz wszystkie completion dates dla każdego nawyku
-        habits_with_completions = []
-        for stat in stats:
-            cursor = await db.execute(
-                """SELECT completed_at
-                   FROM habit_completions
-                   WHERE habit_id = ?
-                     AND user_id = ?
-                   ORDER BY completed_at DESC LIMIT 365""",
-                (stat['habit_id'], user_id)
-            )
-            completions = await cursor.fetchall()
-            completion_dates = [row['completed_at'] for row in completions]
-
-            habits_with_completions.append({
-                'habit_id': stat['habit_id'],
-                'habit_name': stat['habit_name'],
-                'habit_icon': stat['habit_icon'],
-                'reward_coins': stat['reward_coins'],
-                'total_completions': stat['total_completions'],
-                'current_streak': stat['current_streak'],
-                'longest_streak': stat['longest_streak'],
-                'last_completion_date': stat['last_completion_date'],
-                'completion_dates': completion_dates
-            })
-
-        return {
-            'statistics': habits_with_completions,
-            'total_habits': len(habits_with_completions),
-            'total_completions': sum(h['total_completions'] for h in habits_with_completions)
-        }
+    user_id = user["id"]
+
+    not_modified = conditional_response(request, response, user)
+    if not_modified:
+        return not_modified
+
+    # Pobierz statystyki
+    cursor = await db.execute(USER_HABIT_STATISTICS_SQL, (user_id,))
+    stats = await cursor.fetchall()
+
+    # Pobierz daty wykonań wszystkich nawyków jednym zapytaniem i pogrupuj po nawyku
+    cursor = await db.execute(USER_RECENT_COMPLETIONS_SQL, (user_id, user_id))
+    completion_dates_by_habit = {}
+    for row in await cursor.fetchall():
+        completion_dates_by_habit.setdefault(row['habit_id'], []).append(row['completed_at'])
+
+    habits_with_completions = []
+    for stat in stats:
+        completion_dates = completion_dates_by_habit.get(stat['habit_id'], [])
+
+        habits_with_completions.append({
+            'habit_id': stat['habit_id'],
+            'habit_name': stat['habit_name'],
+            'habit_icon': stat['habit_icon'],
+            'reward_coins': stat['reward_coins'],
+            'total_completions': stat['total_completions'],
+            'current_streak': stat['current_streak'],
+            'longest_streak': stat['longest_streak'],
+            'last_completion_date': stat['last_completion_date'],
+            'completion_dates': completion_dates
+        })
+
+    return {
+        'statistics': habits_with_completions,
+        'total_habits': len(habits_with_completions),
+        'total_completions': sum(h['total_completions'] for h in habits_with_completions)
+    }
 
 
 @app.get("/api/habits/{habit_id}/calendar")
-async def get_habit_calendar(habit_id: int, year: int, month: int, authorization: str = Header(None)):
+async def get_habit_calendar(habit_id: int, year: int, month: int, request: Request, response: Response,
+                             user: aiosqlite.Row = Depends(get_current_user), db: aiosqlite.Connection = Depends(get_db)):
     """
     Pobiera dane kalendarza dla konkretnego nawyku w danym miesiącu.
 
@@ -1421,7 +1355,7 @@ async def get_habit_calendar(habit_id: int, year: int, month: int, authorization
         habit_id (int): ID nawyku
         year (int): Rok
         month (int): Miesiąc (1-12)
-        authorization (str): Token autoryzacyjny w headerze
+        user (aiosqlite.Row): Zalogowany użytkownik (z get_current_user)
 
     Returns:
         dict: Dane kalendarza z wykonaniami nawyku
@@ -1429,56 +1363,176 @@ async def get_habit_calendar(habit_id: int, year: int, month: int, authorization
     Raises:
         HTTPException: Gdy token jest nieprawidłowy lub nawyk nie istnieje
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Brak tokenu autoryzacji")
+    user_id = user["id"]
 
-    token = authorization.replace("Bearer ", "")
-    user_id = verify_token(token)
+    not_modified = conditional_response(request, response, user)
+    if not_modified:
+        return not_modified
 
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Nieprawidlowy token")
+    # Sprawdź czy nawyk jest aktywny i należy do użytkownika
+    cursor = await db.execute(HABIT_OWNER_SQL, (habit_id, user_id))
+    habit = await cursor.fetchone()
 
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    if not habit:
+        raise HTTPException(status_code=404, detail="Nawyk nie znaleziony")
 
-        # Sprawdź czy nawyk należy do użytkownika
-        cursor = await db.execute(
-            "SELECT id, name, icon FROM habits WHERE id = ? AND user_id = ?",
-            (habit_id, user_id)
-        )
-        habit = await cursor.fetchone()
+    # Pobierz wykonania dla danego miesiąca
+    # Pierwszy i ostatni dzień miesiąca
+    first_day = date(year, month, 1)
+    last_day = date(year, month, calendar.monthrange(year, month)[1])
 
-        if not habit:
-            raise HTTPException(status_code=404, detail="Nawyk nie znaleziony")
+    cursor = await db.execute(
+        HABIT_CALENDAR_SQL,
+        (habit_id, user_id, first_day.isoformat(), last_day.isoformat())
+    )
+    completions = await cursor.fetchall()
+    completion_dates = [row['completed_at'] for row in completions]
 
-        # Pobierz wykonania dla danego miesiąca
-        # Pierwszy i ostatni dzień miesiąca
-        first_day = date(year, month, 1)
-        last_day = date(year, month, calendar.monthrange(year, month)[1])
+    return {
+        'habit_id': habit['id'],
+        'habit_name': habit['name'],
+        'habit_icon': habit['icon'],
+        'year': year,
+        'month': month,
+        'completion_dates': completion_dates,
+        'total_completions_this_month': len(completion_dates)
+    }
 
-        cursor = await db.execute(
-            """SELECT completed_at
-               FROM habit_completions
-               WHERE habit_id = ?
-                 AND user_id = ?
-                 AND completed_at >= ?
-                 AND completed_at <= ?
-               ORDER BY completed_at""",
-            (habit_id, user_id, first_day.isoformat(), last_day.isoformat())
-        )
-        completions = await cursor.fetchall()
-        completion_dates = [row['completed_at'] for row in completions]
 
-        return {
-            'habit_id': habit['id'],
-            'habit_name': habit['name'],
-            'habit_icon': habit['icon'],
-            'year': year,
-            'month': month,
-            'completion_dates': completion_dates,
-            'total_completions_this_month': len(completion_dates)
+# ============================================
+# ENDPOINTY SYNCHRONIZACJI OFFLINE
+# ============================================
+
+@app.post("/api/sync/completions")
+async def sync_offline_completions(sync: OfflineSync, user: aiosqlite.Row = Depends(get_current_user)):
+    """
+    Zapisuje wykonania nawyków zebrane offline, z datami nadanymi przez klienta.
+
+    Każde wykonanie ma klucz idempotencji nadany przez klienta - ponowne
+    wysłanie tej samej kolejki (np. gdy odpowiedź nie dotarła) nie przyznaje
+    monet drugi raz, tylko zwraca status "duplicate" z pierwotnym wynikiem.
+    Daty starsze niż SYNC_MAX_PAST_DAYS dni lub późniejsze niż
+    SYNC_MAX_FUTURE_DAYS dni od dzisiaj są odrzucane. Całość jest zapisywana
+    w jednej transakcji, a serie przeliczane tylko dla nawyków z nowymi wykonaniami.
+
+    Args:
+        sync (OfflineSync): Lista wykonań (habit_id, local_date, idempotency_key)
+        user (aiosqlite.Row): Zalogowany użytkownik (z get_current_user)
+
+    Returns:
+        dict: Wyniki per wykonanie (results: idempotency_key, habit_id,
+              local_date, status - "completed", "already_completed",
+              "not_found", "out_of_window" lub "duplicate" z original_status,
+              dla wykonanych także coins_earned), liczba zapisanych wykonań,
+              suma zarobionych monet i nowa suma monet
+
+    Raises:
+        HTTPException: Gdy token jest nieprawidłowy. Pusta lub dłuższa niż
+                      MAX_SYNC_BATCH_SIZE lista albo klucz idempotencji spoza
+                      1-128 znaków odrzuca walidacja OfflineSync (422).
+    """
+    user_id = user["id"]
+
+    today = date.today()
+    min_date = (today - timedelta(days=SYNC_MAX_PAST_DAYS)).isoformat()
+    max_date = (today + timedelta(days=SYNC_MAX_FUTURE_DAYS)).isoformat()
+    completions = [
+        {"habit_id": item.habit_id, "local_date": item.local_date.isoformat(),
+         "idempotency_key": item.idempotency_key}
+        for item in sync.completions
+    ]
+
+    async def _transaction(db):
+        return await apply_offline_completions(db, user_id, completions, min_date, max_date)
+
+    result = await run_write(_transaction)
+
+    completed = sum(1 for item in result["results"] if item["status"] == "completed")
+
+    return {
+        "message": f"Zsynchronizowano {completed} z {len(result['results'])} wykonan",
+        "results": result["results"],
+        "completed": completed,
+        "coins_earned": result["coins_earned"],
+        "total_coins": result["total_coins"]
+    }
+
+
+@app.get("/api/sync")
+async def get_changes(since: Optional[int] = Query(None, ge=0),
+                      user: aiosqlite.Row = Depends(get_current_user),
+                      db: aiosqlite.Connection = Depends(get_db)):
+    """
+    Zwraca zmiany danych użytkownika od podanego kursora (synchronizacja delta).
+
+    Kursorem jest wersja danych użytkownika (data_version) zwrócona przez
+    poprzednie wywołanie. Odpowiedź zawiera tylko zmiany po kursorze
+    (changes: version, type, habit_id lub clothing_id i dane zmiany) oraz
+    bieżące saldo monet i noszone ubranie. Gdy kursora brak, jest starszy niż
+    najstarszy zachowany wpis dziennika (po kompakcji) albo nowszy niż wersja
+    danych, zwracany jest pełny snapshot (full: true) - nawyki jak w
+    GET /api/habits oraz posiadane ubrania. Odczyt odbywa się w jednej
+    transakcji, więc kursor dokładnie odpowiada zwróconym danym.
+
+    Args:
+        since (int, optional): Kursor z poprzedniej synchronizacji
+        user (aiosqlite.Row): Zalogowany użytkownik (z get_current_user)
+
+    Returns:
+        dict: full, cursor, coins, current_clothing_id oraz changes (delta)
+              lub habits i owned_clothing_ids (snapshot, z polem reason)
+
+    Raises:
+        HTTPException: Gdy token jest nieprawidłowy
+    """
+    user_id = user["id"]
+
+    # spójny obraz bazy dla wersji, dziennika i snapshotu (transakcja tylko do odczytu)
+    await db.execute("BEGIN")
+    try:
+        cursor = await db.execute(USER_SYNC_STATE_SQL, (user_id,))
+        state = await cursor.fetchone()
+        version = state["data_version"]
+
+        result = {
+            "cursor": version,
+            "coins": state["coins"],
+            "current_clothing_id": state["current_clothing_id"]
         }
 
+        if since is not None and state["change_log_floor"] <= since <= version:
+            changes = await get_user_changes(db, user_id, since, version)
+            result["full"] = False
+            result["changes"] = [
+                {
+                    "version": change["version"],
+                    "type": change["kind"],
+                    ("clothing_id" if change["kind"].startswith("clothing_") else "habit_id"): change["entity_id"],
+                    **(change["data"] or {})
+                }
+                for change in changes
+            ]
+            return result
+
+        since_date = (date.today() - timedelta(days=HABITS_COMPLETION_WINDOW_DAYS - 1)).isoformat()
+        cursor = await db.execute(USER_HABITS_WITH_COMPLETIONS_SQL, (since_date, user_id))
+        habits = await cursor.fetchall()
+        cursor = await db.execute(OWNED_CLOTHING_SQL, (user_id,))
+        owned = await cursor.fetchall()
+    finally:
+        await db.rollback()
+
+    result["full"] = True
+    if since is None:
+        result["reason"] = "no_cursor"
+    elif since > version:
+        result["reason"] = "cursor_ahead"
+    else:
+        result["reason"] = "cursor_expired"
+    result["habits"] = [habit_with_completions(habit) for habit in habits]
+    result["owned_clothing_ids"] = [item["clothing_id"] for item in owned]
+    return result
+
 
 # ============================================
 # URUCHOMIENIE APLIKACJI
@@ -1,5 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
+from datetime import date
+
+from database import MAX_SYNC_BATCH_SIZE
 
 # User schemas
 class UserRegister(BaseModel):
@@ -37,11 +40,23 @@ class HabitResponse(BaseModel):
     icon: str
     is_active: bool
     created_at: str
+    completion_count: int = 0
     completion_dates: List[str] = []
 
 class HabitComplete(BaseModel):
     habit_id: int
 
+class HabitCompleteBatch(BaseModel):
+    habit_ids: List[int]
+
+class OfflineCompletion(BaseModel):
+    habit_id: int
+    local_date: date
+    idempotency_key: str = Field(..., min_length=1, max_length=128)
+
+class OfflineSync(BaseModel):
+    completions: List[OfflineCompletion] = Field(..., min_length=1, max_length=MAX_SYNC_BATCH_SIZE)
+
 class HabitUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
@@ -0,0 +1,230 @@
+"""
+============================================
+LOGOWANIE APLIKACJI HABI
+============================================
+Asynchroniczne logowanie dla backendu:
+- Rekordy trafiają do ograniczonej kolejki (QueueHandler) bez blokowania
+  wywołującego - zapis na stdout wykonuje osobny wątek (QueueListener)
+- Poziomy ustawiane per moduł (LOG_LEVELS), wyłączone poziomy nie tworzą
+  nawet rekordu
+- Próbkowanie komunikatów o dużej częstotliwości (extra=SAMPLED)
+- Format tekstowy lub JSON (LOG_FORMAT)
+
+Użycie:
+    from utils.logger import get_logger, SAMPLED
+
+    logger = get_logger("database")
+    logger.info("Pula polaczen otwarta: %s polaczen", 5)
+    logger.info("User %s zdjal ubranie", user_id, extra=SAMPLED)
+"""
+
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+
+# ============================================
+# KONFIGURACJA
+# ============================================
+
+# Domyślny poziom logowania wszystkich modułów aplikacji
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+
+# Poziomy per moduł, np. "auth=WARNING,database=DEBUG"
+LOG_LEVELS = os.environ.get("LOG_LEVELS", "")
+
+# Format wyjścia: "text" (czytelny dla człowieka) lub "json" (jeden obiekt na linię)
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")
+
+# Jaka część komunikatów oznaczonych extra=SAMPLED jest zapisywana (1.0 = wszystkie)
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "0.01"))
+
+# Maksymalna liczba rekordów czekających na zapis (nadmiarowe są odrzucane i liczone)
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+
+# Nazwa nadrzędnego loggera aplikacji (loggery uvicorna i bibliotek nie są zmieniane)
+ROOT_LOGGER_NAME = "habi"
+
+# Znacznik komunikatów o dużej częstotliwości (próbkowanych)
+SAMPLED = {"sample_rate": LOG_SAMPLE_RATE}
+
+
+# ============================================
+# FILTRY, FORMATERY I HANDLER
+# ============================================
+
+class SamplingFilter(logging.Filter):
+    """
+    Przepuszcza co N-ty rekord oznaczony sample_rate (N = 1 / sample_rate).
+
+    Liczniki są prowadzone osobno dla każdego loggera i szablonu komunikatu,
+    więc rzadkie komunikaty nie giną przez częste. Pierwszy rekord danego
+    rodzaju zawsze przechodzi. Przepuszczony rekord dostaje pole sample_every.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample_rate", None)
+        if rate is None or rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+
+        every = max(1, round(1 / rate))
+        key = (record.name, record.msg)
+        with self._lock:
+            count = self._counters.get(key, 0)
+            self._counters[key] = count + 1
+
+        if count % every:
+            return False
+        record.sample_every = every
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatuje rekord jako jeden obiekt JSON w linii."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "sample_every", None):
+            entry["sample_every"] = record.sample_every
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler, który nigdy nie blokuje wywołującego.
+
+    Gdy kolejka jest pełna (wątek zapisujący nie nadąża), rekord jest
+    odrzucany i liczony w dropped_total zamiast spowalniać obsługę żądań.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.enqueued_total = 0
+        self.dropped_total = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued_total += 1
+        except queue.Full:
+            self.dropped_total += 1
+
+
+# ============================================
+# KONFIGURACJA LOGGERÓW
+# ============================================
+
+_handler = None
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def _parse_levels(spec: str) -> dict:
+    """Zamienia "auth=WARNING,database=DEBUG" na słownik moduł -> poziom."""
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            module, level = item.split("=", 1)
+            levels[module.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging():
+    """
+    Konfiguruje logger aplikacji (idempotentnie).
+
+    Wywoływana automatycznie przez get_logger(). Podłącza do loggera "habi"
+    handler kolejki z filtrem próbkującym, ustawia poziomy z LOG_LEVEL
+    i LOG_LEVELS oraz uruchamia wątek zapisujący rekordy na stdout.
+    """
+    global _handler, _listener
+
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        if LOG_FORMAT == "json":
+            stream_handler.setFormatter(JsonFormatter())
+        else:
+            stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+        _handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        _handler.addFilter(SamplingFilter())
+
+        root = logging.getLogger(ROOT_LOGGER_NAME)
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(_handler)
+        root.propagate = False
+
+        for module, level in _parse_levels(LOG_LEVELS).items():
+            logging.getLogger(f"{ROOT_LOGGER_NAME}.{module}").setLevel(level)
+
+        _listener = QueueListener(_handler.queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Zapisuje rekordy pozostałe w kolejce i zatrzymuje wątek zapisujący."""
+    global _listener
+
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+            logging.getLogger(ROOT_LOGGER_NAME).removeHandler(_handler)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Zwraca logger modułu aplikacji.
+
+    Args:
+        name (str): Nazwa modułu (np. "database") - poziom można ustawić
+            przez LOG_LEVELS="database=DEBUG"
+
+    Returns:
+        logging.Logger: Logger "habi.<name>"
+
+    Example:
+        logger = get_logger("auth")
+        logger.warning("Nieprawidlowy token: %s", error)
+    """
+    setup_logging()
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+def get_logging_stats() -> dict:
+    """
+    Zwraca statystyki kolejki logowania.
+
+    Returns:
+        dict: Liczba rekordów w kolejce, przekazanych i odrzuconych
+    """
+    if _handler is None:
+        return {"queue_depth": 0, "enqueued_total": 0, "dropped_total": 0}
+    return {
+        "queue_depth": _handler.queue.qsize(),
+        "enqueued_total": _handler.enqueued_total,
+        "dropped_total": _handler.dropped_total,
+    }
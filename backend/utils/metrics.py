@@ -0,0 +1,488 @@
+"""
+============================================
+METRYKI APLIKACJI HABI (FORMAT PROMETHEUS)
+============================================
+Metryki zbierane w pamięci procesu, bez zewnętrznych usług:
+- MetricsMiddleware - czas odpowiedzi per trasa (histogram), kody statusu
+  i liczba żądań w trakcie obsługi
+- TimedConnection - czas zapytań SQL per zarejestrowane zapytanie oraz
+  liczba i łączny czas zapytań w obsłudze jednego żądania
+- render_metrics() - tekst w formacie ekspozycji Prometheusa (/api/metrics)
+- tryb śledzenia SQL (SQL_TRACE=1) - lista zapytań każdego żądania z czasami
+  i liczbą wierszy, nagłówek Server-Timing oraz log żądań z nadmiarem zapytań
+
+Przy kilku workerach uvicorna każdy proces ma własne liczniki - Prometheus
+odróżnia je etykietą instance (osobny port lub scrape per proces).
+"""
+
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+
+from utils.logger import get_logger
+
+logger = get_logger("sql_trace")
+
+
+# Nagłówek Content-Type formatu tekstowego Prometheusa
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Przedziały histogramów (w sekundach dla czasów, w sztukach dla liczby zapytań)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+# Tryb śledzenia: każde żądanie zbiera listę swoich zapytań SQL (debug - koszt pamięci i czasu)
+SQL_TRACE = os.environ.get("SQL_TRACE", "0") == "1"
+
+# Żądania z większą liczbą zapytań są logowane z pełną listą (wzorce N+1)
+SQL_TRACE_QUERY_THRESHOLD = int(os.environ.get("SQL_TRACE_QUERY_THRESHOLD", "10"))
+
+
+# ============================================
+# TYPY METRYK
+# ============================================
+
+def _escape(value) -> str:
+    """Escapuje wartość etykiety zgodnie z formatem ekspozycji."""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    """Zwraca etykiety w postaci {a="1",b="2"} (lub pusty napis)."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    """Formatuje liczbę tak, aby całkowite nie miały części ułamkowej."""
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+class Counter:
+    """
+    Licznik rosnący monotonicznie, z opcjonalnymi etykietami.
+
+    Wszystkie metryki są aktualizowane z pętli zdarzeń (jeden wątek),
+    więc nie wymagają blokad.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """Wartość, która może rosnąć i maleć (np. liczba żądań w trakcie obsługi)."""
+
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def render(self) -> list:
+        if not self.labelnames and not self._values:
+            self._values[()] = 0
+        return super().render()
+
+
+class Histogram:
+    """
+    Histogram o stałych przedziałach (kumulatywne kubełki le, _sum i _count).
+
+    Każda seria przechowuje liczniki poszczególnych przedziałów; sumy
+    kumulatywne są liczone dopiero przy renderowaniu.
+    """
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+# Wszystkie metryki procesu w kolejności definicji
+REGISTRY = []
+
+
+def render_metrics() -> str:
+    """
+    Zwraca wszystkie metryki w formacie tekstowym Prometheusa.
+
+    Returns:
+        str: Tekst ekspozycji (zakończony znakiem nowej linii)
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ============================================
+# DEFINICJE METRYK
+# ============================================
+
+HTTP_REQUESTS = Counter(
+    "habi_http_requests_total", "Liczba obsluzonych zadan HTTP.", ("method", "route", "status"))
+HTTP_REQUEST_DURATION = Histogram(
+    "habi_http_request_duration_seconds", "Czas obslugi zadania HTTP.", ("method", "route"), HTTP_BUCKETS)
+HTTP_IN_FLIGHT = Gauge(
+    "habi_http_requests_in_flight", "Liczba zadan HTTP w trakcie obslugi.")
+
+DB_QUERY_DURATION = Histogram(
+    "habi_db_query_duration_seconds", "Czas wykonania zapytania SQL.", ("query",), DB_BUCKETS)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "habi_db_queries_per_request", "Liczba zapytan SQL w obsludze jednego zadania.", ("route",),
+    QUERY_COUNT_BUCKETS)
+DB_TIME_PER_REQUEST = Histogram(
+    "habi_db_time_per_request_seconds", "Laczny czas zapytan SQL w obsludze jednego zadania.", ("route",),
+    HTTP_BUCKETS)
+DB_POOL_TIMEOUTS = Counter(
+    "habi_db_pool_timeouts_total", "Liczba zadan odrzuconych (503) po timeoucie puli polaczen.", ("route",))
+
+AUTH_TOKENS_REJECTED = Counter(
+    "habi_auth_tokens_rejected_total", "Liczba odrzuconych tokenow JWT.", ("reason",))
+
+
+# ============================================
+# POMIAR ZAPYTAŃ SQL
+# ============================================
+
+# Etykiety zapytań zarejestrowanych w database.register_query: sql -> nazwa
+_query_labels = {}
+
+
+class TracedStatement:
+    """Jedno zapytanie zapisane w trybie śledzenia: etykieta, treść, czas i wiersze."""
+
+    __slots__ = ("label", "sql", "seconds", "fetched", "cursor")
+
+    def __init__(self, label: str, sql: str, seconds: float):
+        self.label = label
+        self.sql = sql
+        self.seconds = seconds
+        self.fetched = 0
+        self.cursor = None
+
+    @property
+    def rows(self) -> int:
+        """Pobrane wiersze (SELECT, RETURNING) lub liczba zmienionych wierszy."""
+        if self.fetched or self.cursor is None:
+            return self.fetched
+        return max(self.cursor.rowcount, 0)
+
+
+class RequestDbStats:
+    """
+    Liczba i łączny czas zapytań SQL wykonanych w obsłudze jednego żądania.
+
+    W trybie śledzenia statements zawiera wszystkie zapytania żądania
+    (TracedStatement); poza nim jest None.
+    """
+
+    __slots__ = ("queries", "seconds", "statements")
+
+    def __init__(self, trace: bool = False):
+        self.queries = 0
+        self.seconds = 0.0
+        self.statements = [] if trace else None
+
+
+# Statystyki bieżącego żądania (ustawiane przez MetricsMiddleware)
+_request_db_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("request_db_stats", default=None)
+
+
+def register_query_label(sql: str, name: str):
+    """Przypisuje zapytaniu etykietę query w metrykach czasu zapytań."""
+    _query_labels[sql] = name
+
+
+def query_label(sql: str) -> str:
+    """
+    Zwraca etykietę zapytania dla metryk.
+
+    Zapytania zarejestrowane mają własną nazwę; pozostałe są grupowane po
+    pierwszym słowie (np. "other_select"), aby liczba serii była ograniczona.
+    """
+    label = _query_labels.get(sql)
+    if label is not None:
+        return label
+    words = sql.split(None, 1)
+    return f"other_{words[0].lower()}" if words else "other"
+
+
+def record_query(sql: str, seconds: float,
+                 request_stats: Optional[RequestDbStats] = None) -> Optional[TracedStatement]:
+    """
+    Zapisuje czas zapytania w histogramie i w statystykach żądania.
+
+    Args:
+        sql (str): Treść zapytania (do wyznaczenia etykiety)
+        seconds (float): Czas wykonania
+        request_stats (RequestDbStats, optional): Statystyki żądania; domyślnie
+            bieżące żądanie z kontekstu (brak poza obsługą żądania)
+
+    Returns:
+        TracedStatement | None: Wpis śledzenia, jeśli żądanie jest śledzone
+    """
+    label = query_label(sql)
+    DB_QUERY_DURATION.observe(seconds, label)
+    if request_stats is None:
+        request_stats = _request_db_stats.get()
+    if request_stats is None:
+        return None
+
+    request_stats.queries += 1
+    request_stats.seconds += seconds
+    if request_stats.statements is None:
+        return None
+
+    statement = TracedStatement(label, sql, seconds)
+    request_stats.statements.append(statement)
+    return statement
+
+
+class TracedCursor:
+    """
+    Nakładka na kursor w trybie śledzenia - liczy pobrane wiersze i dolicza
+    czas pobierania do wpisu zapytania.
+    """
+
+    __slots__ = ("_cursor", "_statement")
+
+    def __init__(self, cursor, statement: TracedStatement):
+        self._cursor = cursor
+        self._statement = statement
+        statement.cursor = cursor
+
+    async def fetchone(self):
+        started = time.perf_counter()
+        row = await self._cursor.fetchone()
+        self._statement.seconds += time.perf_counter() - started
+        if row is not None:
+            self._statement.fetched += 1
+        return row
+
+    async def fetchall(self):
+        started = time.perf_counter()
+        rows = await self._cursor.fetchall()
+        self._statement.seconds += time.perf_counter() - started
+        self._statement.fetched += len(rows)
+        return rows
+
+    async def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = await (self._cursor.fetchmany() if size is None else self._cursor.fetchmany(size))
+        self._statement.seconds += time.perf_counter() - started
+        self._statement.fetched += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TimedConnection:
+    """
+    Nakładka na aiosqlite.Connection mierząca czas execute/executemany.
+
+    Pozostałe atrybuty i metody są przekazywane do opakowanego połączenia.
+    Mierzony jest czas do zwrócenia kursora - w SQLite obejmuje to wyliczenie
+    pierwszego wiersza, czyli sortowanie i grupowanie. W trybie śledzenia
+    zwracany jest TracedCursor, który dolicza też czas pobierania wierszy.
+
+    Args:
+        db (aiosqlite.Connection): Opakowywane połączenie
+        request_stats (RequestDbStats, optional): Statystyki żądania, któremu
+            przypisać zapytania (potrzebne, gdy zapytania wykonuje inne
+            zadanie - np. writer - niż obsługujące żądanie)
+    """
+
+    __slots__ = ("_db", "_request_stats")
+
+    def __init__(self, db, request_stats: Optional[RequestDbStats] = None):
+        self._db = db
+        self._request_stats = request_stats
+
+    async def execute(self, sql: str, parameters=None):
+        started = time.perf_counter()
+        try:
+            cursor = await self._db.execute(sql, parameters)
+        finally:
+            statement = record_query(sql, time.perf_counter() - started, self._request_stats)
+        return cursor if statement is None else TracedCursor(cursor, statement)
+
+    async def executemany(self, sql: str, parameters):
+        started = time.perf_counter()
+        try:
+            cursor = await self._db.executemany(sql, parameters)
+        finally:
+            statement = record_query(sql, time.perf_counter() - started, self._request_stats)
+        return cursor if statement is None else TracedCursor(cursor, statement)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+def timed_work(work):
+    """
+    Opakowuje operację zapisu tak, aby jej zapytania były mierzone.
+
+    Statystyki żądania są pobierane w chwili wywołania (w zadaniu obsługującym
+    żądanie), bo sama operacja wykonuje się później w zadaniu writera.
+
+    Args:
+        work: Funkcja async przyjmująca połączenie (jak dla run_write)
+
+    Returns:
+        Funkcja async przekazująca do work połączenie TimedConnection
+    """
+    request_stats = _request_db_stats.get()
+
+    async def _timed(db):
+        return await work(TimedConnection(db, request_stats))
+
+    return _timed
+
+
+# ============================================
+# ŚLEDZENIE ZAPYTAŃ SQL (TRYB DEBUG)
+# ============================================
+
+def server_timing(request_stats: RequestDbStats, elapsed: float) -> str:
+    """
+    Zwraca wartość nagłówka Server-Timing (widoczną w narzędziach przeglądarki).
+
+    Args:
+        request_stats (RequestDbStats): Statystyki zapytań żądania
+        elapsed (float): Czas obsługi żądania do wysłania nagłówków (w sekundach)
+
+    Returns:
+        str: Np. 'db;dur=3.21;desc="7 queries", app;dur=10.50'
+    """
+    return (
+        f'db;dur={request_stats.seconds * 1000:.2f};desc="{request_stats.queries} queries", '
+        f"app;dur={elapsed * 1000:.2f}"
+    )
+
+
+def log_query_list(method: str, path: str, request_stats: RequestDbStats, elapsed: float):
+    """Loguje żądanie, które przekroczyło próg liczby zapytań, z pełną listą zapytań."""
+    lines = []
+    for number, statement in enumerate(request_stats.statements, 1):
+        sql = " ".join(statement.sql.split())
+        if len(sql) > 200:
+            sql = sql[:200] + "..."
+        lines.append(
+            f"  {number:3d}. [{statement.label}] {statement.seconds * 1000:.2f} ms, "
+            f"wiersze: {statement.rows}: {sql}"
+        )
+
+    logger.warning(
+        "%s %s: %s zapytan SQL (prog %s), db %.2f ms, calosc %.2f ms\n%s",
+        method, path, request_stats.queries, SQL_TRACE_QUERY_THRESHOLD,
+        sum(statement.seconds for statement in request_stats.statements) * 1000, elapsed * 1000,
+        "\n".join(lines)
+    )
+
+
+# ============================================
+# MIDDLEWARE HTTP
+# ============================================
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI mierzący obsługę żądań HTTP.
+
+    Trasa jest brana z dopasowanego routingu (szablon ścieżki, np.
+    "/api/habits/{habit_id}/complete"), więc liczba serii nie zależy od
+    identyfikatorów w URL. Żądania bez dopasowanej trasy mają route="unmatched".
+
+    W trybie śledzenia (SQL_TRACE=1) dodaje nagłówek Server-Timing i loguje
+    żądania, które wykonały więcej niż SQL_TRACE_QUERY_THRESHOLD zapytań.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        request_stats = RequestDbStats(trace=SQL_TRACE)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SQL_TRACE:
+                    timing = server_timing(request_stats, time.perf_counter() - started)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", timing.encode("latin-1"))
+                    ]
+            await send(message)
+
+        token = _request_db_stats.set(request_stats)
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            _request_db_stats.reset(token)
+
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, route_path, str(status))
+            HTTP_REQUEST_DURATION.observe(elapsed, method, route_path)
+            DB_QUERIES_PER_REQUEST.observe(request_stats.queries, route_path)
+            DB_TIME_PER_REQUEST.observe(request_stats.seconds, route_path)
+
+            if SQL_TRACE and request_stats.queries > SQL_TRACE_QUERY_THRESHOLD:
+                log_query_list(method, scope["path"], request_stats, elapsed)
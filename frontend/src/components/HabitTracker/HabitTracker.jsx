@@ -258,19 +258,21 @@ const HabitTracker = ({ onBack, initialCoins = 0, onCoinsUpdate }) => {
         showNotification('info', 'Synchronizuję zmiany offline...', 'Synchronizacja');
       }
 
-      for (const completion of offlineCompletions) {
-        try {
-          await habitAPI.completeHabit(completion.habitId);
-        } catch (error) {
-          console.error('Blad synchronizacji completion:', error);
-        }
-      }
-
-      localStorage.removeItem('offline_completions');
+      // Kolejka w paczkach; nierozstrzygnięte wpisy zostają w localStorage
+      const results = await habitAPI.syncOfflineCompletions();
       await loadHabits();
 
-      if (offlineCompletions.length > 0) {
-        showNotification('success', 'Zmiany zsynchronizowane!', 'Synchronizacja');
+      if (results.length > 0) {
+        const pending = results.filter(r => r.pending).length;
+        const synced = results.filter(r => r.success).length;
+
+        if (pending > 0) {
+          showNotification('warning', `Nie zsynchronizowano ${pending} z ${results.length} zmian - spróbuję ponownie`, 'Synchronizacja');
+        } else if (synced < results.length) {
+          showNotification('warning', `Zsynchronizowano ${synced} z ${results.length} zmian`, 'Synchronizacja');
+        } else {
+          showNotification('success', 'Zmiany zsynchronizowane!', 'Synchronizacja');
+        }
       }
 
     } catch (error) {
@@ -1,5 +1,8 @@
 const API_BASE_URL = 'https://habi-backend.onrender.com';
 
+// Maksymalna liczba wykonań w jednym żądaniu synchronizacji (limit serwera: MAX_SYNC_BATCH_SIZE)
+const SYNC_BATCH_SIZE = 500;
+
 // ============================================
 // Utility do zarządzania tokenami
 // ============================================
@@ -66,13 +69,17 @@ const fetchWithAuth = async (url, options = {}) => {
     // Obsłuż błąd 401 (Unauthorized)
     if (response.status === 401) {
       handleUnauthorized();
-      throw new Error('Sesja wygasła. Zaloguj się ponownie.');
+      const authError = new Error('Sesja wygasła. Zaloguj się ponownie.');
+      authError.status = 401;
+      throw authError;
     }
 
     // Obsłuż inne błędy HTTP
     if (!response.ok) {
       const errorData = await response.json().catch(() => ({}));
-      throw new Error(errorData.detail || `HTTP error ${response.status}`);
+      const httpError = new Error(errorData.detail || `HTTP error ${response.status}`);
+      httpError.status = response.status;
+      throw httpError;
     }
 
     return response;
@@ -331,28 +338,93 @@ export const habitAPI = {
     return response.json();
   },
 
-  // Synchronizuj offline completion
+  // Synchronizuj offline completion - kolejka w paczkach po SYNC_BATCH_SIZE,
+  // z datą lokalną wykonania i kluczem idempotencji (bezpieczne ponowienie).
+  // W kolejce zostają tylko wpisy, których serwer nie rozstrzygnął.
   async syncOfflineCompletions() {
     const offlineCompletions = JSON.parse(localStorage.getItem('offline_completions') || '[]');
+
+    if (offlineCompletions.length === 0) {
+      return [];
+    }
+
+    const toSyncItem = (c) => {
+      const completedAt = new Date(c.completedAt);
+      const localDate = [
+        completedAt.getFullYear(),
+        String(completedAt.getMonth() + 1).padStart(2, '0'),
+        String(completedAt.getDate()).padStart(2, '0'),
+      ].join('-');
+
+      return {
+        habit_id: c.habitId,
+        local_date: localDate,
+        // Wpis w kolejce jest jednoznaczny przez nawyk i moment wykonania
+        idempotency_key: `${c.habitId}:${c.completedAt}`,
+      };
+    };
+
     const results = [];
+    const remaining = [];
+    let offline = false;
 
-    for (const completion of offlineCompletions) {
+    for (let i = 0; i < offlineCompletions.length; i += SYNC_BATCH_SIZE) {
+      const chunk = offlineCompletions.slice(i, i + SYNC_BATCH_SIZE);
+
+      // Po utracie połączenia reszta kolejki czeka na następną próbę
+      if (offline) {
+        remaining.push(...chunk);
+        results.push(...chunk.map(c => ({ success: false, pending: true, habitId: c.habitId, error: 'OFFLINE' })));
+        continue;
+      }
+
+      let sync;
       try {
-        const result = await this.completeHabit(completion.habitId);
-        results.push({ success: true, habitId: completion.habitId, result });
+        const response = await fetchWithAuth(`${API_BASE_URL}/api/sync/completions`, {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+            ...tokenUtils.getAuthHeaders(),
+          },
+          body: JSON.stringify({ completions: chunk.map(toSyncItem) }),
+        });
+        sync = await response.json();
       } catch (error) {
-        console.error(`Failed to sync completion for habit ${completion.habitId}:`, error);
-        results.push({ success: false, habitId: completion.habitId, error: error.message });
+        console.error('Failed to sync offline completions:', error);
+
+        // Sesja wygasła - handleUnauthorized wyczyścił już kolejkę
+        if (error.status === 401) {
+          return results;
+        }
+
+        // Żądanie nie doszło do serwera albo serwer go nie obsłużył (5xx) -
+        // paczka zostaje w kolejce. Odrzucenie (4xx) jest ostateczne, więc
+        // ponawianie tej samej paczki nic by nie dało.
+        const retry = error.message === 'OFFLINE' || error.status >= 500;
+        if (error.message === 'OFFLINE') {
+          offline = true;
+        }
+        if (retry) {
+          remaining.push(...chunk);
+        }
+        results.push(...chunk.map(c => ({ success: false, pending: retry, habitId: c.habitId, error: error.message })));
+        continue;
       }
-    }
 
-    // Zachowaj tylko te, które się nie udały
-    const failedCompletions = results
-      .filter(r => !r.success)
-      .map(r => offlineCompletions.find(c => c.habitId === r.habitId))
-      .filter(Boolean);
+      // Serwer rozstrzygnął każde wykonanie paczki (także powtórzone - status duplicate)
+      results.push(...sync.results.map(item => ({
+        success: item.status === 'completed'
+          || (item.status === 'duplicate' && item.original_status === 'completed'),
+        habitId: item.habit_id,
+        result: { ...item, total_coins: sync.total_coins },
+      })));
+    }
 
-    localStorage.setItem('offline_completions', JSON.stringify(failedCompletions));
+    if (remaining.length > 0) {
+      localStorage.setItem('offline_completions', JSON.stringify(remaining));
+    } else {
+      localStorage.removeItem('offline_completions');
+    }
 
     return results;
   },